@@ -1,8 +1,26 @@
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-import pandas as pd
+from datetime import datetime
+import json
+from fastapi import APIRouter, Header, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel, ValidationError
+from typing import Any, Dict, List, Literal, Optional
 import numpy as np
-from app.core.model import credit_model
+from app.core import config
+from app.core.model import ModelNotReady, credit_model, prediction_columns
+from app.core.batcher import prediction_batcher, score_row
+from app.core.executor import DeadlineExceeded, Overloaded, model_executor
+from app.core.rules import RULES_VERSION, RULE_FIELDS, evaluate as evaluate_rules
+from app.core.audit import audit_decision, audit_decisions, audit_log
+from app.core.fairness import fairness_monitor
+from app.core.evaluation import DECISIONS, DEFAULT_THRESHOLD, get_decision, get_risk_category, live_metrics
+from app.core.drift import drift_monitor
+from app.core.shadow import shadow_monitor
+from app.core.idempotency import IdempotencyConflict, idempotency
+from app.core.metrics import StageTimer, shap_fallbacks
+from app.core.features import FEATURES, FIELDS, feature_index, feature_pipeline
+from app.core.columnar import (ARROW_STREAM, NDJSON, PayloadError, encode_arrow, json_columns,
+                               read_arrow_columns, read_json_columns, read_ndjson_rows, validate_columns)
 
 router = APIRouter()
 
@@ -18,22 +36,6 @@ class CreditApplication(BaseModel):
     NumberOfTime6089DaysPastDueNotWorse: int # Renamed
     NumberOfDependents: int
 
-    # Helper to map back to original column names
-    def to_df(self):
-        data = self.dict()
-        # Remap keys to match training data columns
-        feature_map = {
-            'NumberOfTime3059DaysPastDueNotWorse': 'NumberOfTime30-59DaysPastDueNotWorse',
-            'NumberOfTime6089DaysPastDueNotWorse': 'NumberOfTime60-89DaysPastDueNotWorse'
-        }
-        
-        mapped_data = {}
-        for k, v in data.items():
-            new_key = feature_map.get(k, k)
-            mapped_data[new_key] = [v]
-            
-        return pd.DataFrame(mapped_data)
-
 class PredictionResponse(BaseModel):
     default_probability: float
     risk_category: str
@@ -42,141 +44,777 @@ class PredictionResponse(BaseModel):
     top_3_risk_factors: list
     explanation_text: str
 
-def get_risk_category(prob):
-    if prob < 0.2:
-        return "Low"
-    elif prob < 0.5:
-        return "Medium"
-    else:
-        return "High"
+# Used when SHAP fails so the response schema stays stable
+FALLBACK_FACTORS = [
+    {"feature": "DebtRatio", "impact": 1, "description": "High Debt Ratio"},
+    {"feature": "LatePayments", "impact": 1, "description": "History of late payments"},
+    {"feature": "CreditUtilization", "impact": 1, "description": "High credit utilization"}
+]
 
-def get_decision(prob):
-    if prob < 0.3:
-        return "Approve"
-    elif prob < 0.6:
-        return "Review"
-    else:
-        return "Reject"
+ExplainLevel = Literal["exact", "fast", "none"]
+
+def not_ready(e):
+    # Model still loading (or failed to load): tell clients to retry shortly
+    return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+
+def overloaded(e):
+    # Model queue full: shed the request at once rather than queue it
+    return HTTPException(status_code=429, detail=str(e),
+                         headers={"Retry-After": str(config.RETRY_AFTER_SECONDS)})
+
+def deadline_exceeded(e):
+    return HTTPException(status_code=503, detail=str(e),
+                         headers={"Retry-After": str(config.RETRY_AFTER_SECONDS)})
+
+def top_risk_factors(indices, values):
+    # indices/values come from credit_model.score, already ordered by |impact|
+    top = []
+    for i, val in zip(indices, values):
+        feat = FEATURES[i]
+        direction = "increases risk" if val > 0 else "decreases risk"
+        top.append({"feature": feat, "impact": float(val), "description": f"{feat} {direction}"})
+    return top
+
+def explanation_text(prob, top_3):
+    return f"Your default probability is {prob:.1%}. The main factors are: " + ", ".join([f"{x['feature']}" for x in top_3])
+
+def fallback_explanation_text(prob):
+    return f"Your default probability is {prob:.1%}. Risk factors include debt ratio and credit history."
+
+def probability_text(prob):
+    return f"Your default probability is {prob:.1%}."
+
+def describe_row(prob, factors, explain):
+    # Factors + explanation text for one scored row
+    if explain == "none":
+        return [], probability_text(prob)
+    if factors is None:
+        # Fallback if SHAP fails
+        shap_fallbacks.inc()
+        return FALLBACK_FACTORS, fallback_explanation_text(prob)
+    top_3 = top_risk_factors(*factors)
+    return top_3, explanation_text(prob, top_3)
+
+def build_prediction(prob, risk_index, top_3, explanation):
+    return {
+        "default_probability": float(prob),
+        "risk_category": get_risk_category(prob),
+        "decision": get_decision(prob),
+        "risk_index": float(risk_index),
+        "top_3_risk_factors": top_3,
+        "explanation_text": explanation
+    }
+
+def prediction_record(application, result):
+    # Audit record of one /predict decision (see AuditLog.record_many)
+    return (result["decision"], result["default_probability"], result["risk_category"], None,
+            credit_model.version, application.model_dump(), result)
+
+def audit_prediction(application, result):
+    audit_decision("predict", result["decision"], result["default_probability"], result["risk_category"],
+                   model_version=credit_model.version, request=application.model_dump(), response=result)
+
+def record_prediction(application, result, row):
+    # Audit trail + streaming fairness and drift counters, then challenger shadow scoring
+    audit_prediction(application, result)
+    fairness_monitor.record("predict", result["decision"], result["default_probability"],
+                            income=application.MonthlyIncome, age=application.age)
+    drift_monitor.record(row)
+    shadow_monitor.submit(row, result["default_probability"], credit_model.version)
 
 @router.post("/predict", response_model=PredictionResponse)
-def predict(application: CreditApplication):
+async def predict(application: CreditApplication, explain: ExplainLevel = "exact"):
+    """
+    `explain` selects the explanation tier: "exact" (SHAP, default), "fast"
+    (path attributions from the same pass as the prediction) or "none".
+    Concurrent calls are micro-batched into one vectorized model call.
+    """
+    timer = StageTimer("predict")
+    X = feature_pipeline.records([application])
+    result = await score_application(X, explain, timer)
+    record_prediction(application, result, X[0])
+    timer.mark("record")
+    return result
+
+async def score_application(X, explain, timer):
+    # X: one row of raw features in training column order (float64, from
+    # feature_pipeline.records), shared with the drift monitor
     try:
-        df = application.to_df()
-        
-        # Derived features
-        # income_to_debt = income / (debt_ratio + 1)
-        # late_payment_ratio = late90 / (late30 + 1)
-        # credit_stability = age / (open_loans + 1)
-        # risk_index = debt_ratio * late90
-        
-        # Enforce column order to match training
-        expected_features = [
-            'RevolvingUtilizationOfUnsecuredLines',
-            'age',
-            'NumberOfTime30-59DaysPastDueNotWorse',
-            'DebtRatio',
-            'MonthlyIncome',
-            'NumberOfOpenCreditLinesAndLoans',
-            'NumberOfTimes90DaysLate',
-            'NumberRealEstateLoansOrLines',
-            'NumberOfTime60-89DaysPastDueNotWorse',
-            'NumberOfDependents'
-        ]
-        
-        # Reorder columns
-        df = df[expected_features]
-
-        # Note: If the model was trained on these derived features, we must compute them here AND update the model to use them.
-        # But the problem description says "Backend must compute engineered features before prediction".
-        # However, the provided model training script (based on passed req) uses RAW features.
-        # If I want to use engineered features, I must train on them. 
-        # For this prototype steps, I will stick to what the model was trained on (Raw features).
-        # But I will calculate risk_index for the response as requested.
-        
-        prob = credit_model.predict(df)[0]
-        
-        risk_index = application.DebtRatio * application.NumberOfTimes90DaysLate
-        
-        # SHAP Explanation
-        try:
-            shap_values = credit_model.explain(df)
-            
-            # Get feature names and shap values
-            feature_names = df.columns
-            # Access the first sample
-            if isinstance(shap_values, list):
-                 sv = shap_values[0] # Just in case
-            else:
-                 sv = shap_values[0] # Single sample
-            
-            # Sort by absolute value to find top drivers
-            feature_impact = list(zip(feature_names, sv))
-            feature_impact.sort(key=lambda x: abs(x[1]), reverse=True)
-            
-            top_3 = []
-            for feat, val in feature_impact[:3]:
-                 direction = "increases risk" if val > 0 else "decreases risk"
-                 top_3.append({"feature": feat, "impact": float(val), "description": f"{feat} {direction}"})
-
-            explanation = f"Your default probability is {prob:.1%}. The main factors are: " + ", ".join([f"{x['feature']}" for x in top_3])
-            
-        except Exception as e:
-            print(f"SHAP Error: {e}")
-            # Fallback if SHAP fails
-            top_3 = [
-                {"feature": "DebtRatio", "impact": 1, "description": "High Debt Ratio"},
-                {"feature": "LatePayments", "impact": 1, "description": "History of late payments"},
-                {"feature": "CreditUtilization", "impact": 1, "description": "High credit utilization"}
+        risk_index = feature_pipeline.derived(X, ("risk_index",))["risk_index"][0]
+        timer.mark("features")
+
+        prob, factors = await score_row(X[0], explain)
+        timer.mark("score")
+
+        top_3, explanation = describe_row(prob, factors, explain)
+
+        result = build_prediction(prob, risk_index, top_3, explanation)
+        timer.mark("describe")
+        return result
+
+    except Overloaded as e:
+        raise overloaded(e)
+    except DeadlineExceeded as e:
+        raise deadline_exceeded(e)
+    except ModelNotReady as e:
+        raise not_ready(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+class DecisionResponse(BaseModel):
+    decision: str
+    early_exit: bool
+
+@router.post("/predict/decision", response_model=DecisionResponse)
+async def predict_decision(application: CreditApplication):
+    """
+    Decision only (Approve/Review/Reject), always the one /predict would
+    return. The early-exit decision index stops visiting trees once the
+    remaining ones can no longer change the bucket, which costs a fraction of
+    a full model call, so it runs inline rather than through the batcher.
+    No probability is computed: drift is recorded, but the call is not
+    audited or counted in fairness metrics (use /predict for that).
+    """
+    X = feature_pipeline.records([application])
+    try:
+        buckets, early = credit_model.decide(X)
+    except ModelNotReady as e:
+        raise not_ready(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    drift_monitor.record(X[0])
+    return {"decision": DECISIONS[buckets[0]], "early_exit": bool(early[0])}
+
+@router.get("/decision-index-stats")
+async def decision_index_stats():
+    """How often /predict/decision settles a row before the last tree."""
+    return credit_model.decision_index_stats()
+
+@router.post("/what-if", response_model=PredictionResponse)
+async def what_if(application: CreditApplication, explain: ExplainLevel = "exact"):
+    # Same as predict but explicitly for simulation (not audited)
+    return await score_application(feature_pipeline.records([application]), explain, StageTimer("what-if"))
+
+@router.get("/batcher-stats")
+def batcher_stats():
+    """Micro-batcher batch sizes, queue wait times and rejections."""
+    return prediction_batcher.stats()
+
+@router.get("/executor-stats")
+async def executor_stats():
+    """Model worker pool occupancy, rejections and expired deadlines."""
+    return model_executor.stats()
+
+@router.get("/ready")
+async def ready():
+    """Readiness probe: 200 once a model is loaded and warmed up, 503 before."""
+    status = credit_model.status()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
+def _check_admin(token):
+    if config.ADMIN_TOKEN and token != config.ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+@router.post("/admin/reload-model", status_code=202)
+def reload_model(x_admin_token: Optional[str] = Header(default=None)):
+    """
+    Rebuilds the model and explainer in the background and swaps them in
+    atomically; in-flight requests finish on the previous model.
+    """
+    _check_admin(x_admin_token)
+    started = credit_model.reload_async()
+    return {"started": started, **credit_model.status()}
+
+class ChallengerRequest(BaseModel):
+    path: str
+    name: Optional[str] = None
+
+@router.post("/admin/challengers", status_code=201)
+def add_challenger(request: ChallengerRequest, x_admin_token: Optional[str] = Header(default=None)):
+    """
+    Registers a model (bundle or pickle path on the server) as a shadow-scored
+    challenger. The shadow scorer loads it; load failures show up in /shadow.
+    """
+    _check_admin(x_admin_token)
+    try:
+        name = credit_model.load_challenger(request.path, request.name)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=422, detail=f"Could not load challenger: {e}")
+    return {"name": name, **credit_model.status()["challengers"][name]}
+
+@router.delete("/admin/challengers/{name}")
+def delete_challenger(name: str, x_admin_token: Optional[str] = Header(default=None)):
+    _check_admin(x_admin_token)
+    if not credit_model.remove_challenger(name):
+        raise HTTPException(status_code=404, detail="Challenger not found")
+    return {"removed": name}
+
+@router.get("/shadow")
+async def shadow():
+    """
+    Champion vs. challenger comparison on live /predict traffic (single,
+    batch, columnar and stream): decision agreement, decision flips and
+    probability deltas per challenger. Only the champion answers requests.
+    """
+    return shadow_monitor.report()
+
+@router.get("/drift")
+def drift(min_rows: int = Query(100, ge=1)):
+    """
+    Per-feature drift of live /predict inputs against the training data the
+    served model was exported with: PSI over the reference bins (plus missing
+    values) and a binned KS statistic. Counting restarts when a new model
+    version is loaded.
+    """
+    return drift_monitor.report(min_rows=min_rows)
+
+@router.get("/cache-stats")
+def cache_stats():
+    """Prediction cache hit/miss/eviction counters for sizing."""
+    return {"model_version": credit_model.version, **credit_model.cache.stats()}
+
+@router.get("/idempotency-stats")
+def idempotency_stats():
+    """/apply idempotency store size and computed/replayed/collapsed/conflicting requests."""
+    return idempotency.stats()
+
+# --- What-if sensitivity sweeps ---
+
+# Upper bound on grid points evaluated by one sweep call
+SWEEP_MAX_POINTS = 10000
+
+class SweepAxis(BaseModel):
+    feature: str  # CreditApplication field or training column name
+    values: Optional[List[float]] = None  # explicit grid, or start/stop/num
+    start: Optional[float] = None
+    stop: Optional[float] = None
+    num: int = 21
+
+class SweepRequest(BaseModel):
+    application: CreditApplication
+    axes: List[SweepAxis]
+    explain: ExplainLevel = "none"
+
+def _axis_column(feature):
+    try:
+        return feature_index(feature)
+    except KeyError:
+        raise HTTPException(status_code=422, detail=f"Unknown feature: {feature}")
+
+def _axis_grid(axis, column):
+    if axis.values is not None:
+        grid = np.asarray(axis.values, dtype=np.float64)
+    elif axis.start is not None and axis.stop is not None and axis.num > 0:
+        grid = np.linspace(axis.start, axis.stop, axis.num)
+    else:
+        raise HTTPException(status_code=422, detail=f"Axis {axis.feature} needs values or start/stop/num")
+    if not np.all(np.isfinite(grid)) or len(grid) == 0:
+        raise HTTPException(status_code=422, detail=f"Axis {axis.feature} has an empty or non-finite grid")
+    # Count features only take whole values in /predict, keep sweeps consistent
+    if CreditApplication.model_fields[FIELDS[column]].annotation is int:
+        grid = np.unique(np.round(grid))
+    return grid
+
+def _smallest_flip(feature, base_value, grid, probs, base_decision):
+    decisions = [get_decision(p) for p in probs]
+    flips = [i for i, d in enumerate(decisions) if d != base_decision]
+    if not flips:
+        return {"feature": feature, "base_value": base_value, "flip_value": None,
+                "delta": None, "new_decision": None, "default_probability": None}
+    best = min(flips, key=lambda i: abs(grid[i] - base_value))
+    return {
+        "feature": feature,
+        "base_value": base_value,
+        "flip_value": float(grid[best]),
+        "delta": float(grid[best] - base_value),
+        "new_decision": decisions[best],
+        "default_probability": float(probs[best])
+    }
+
+@router.post("/what-if/sweep")
+def what_if_sweep(request: SweepRequest):
+    """
+    Response curve (one axis) or surface (two axes) of the default probability
+    around a base application, scored in batched model calls of
+    BULK_CHUNK_ROWS rows, each admitted with its own deadline like
+    /predict/batch. Grid points bypass the prediction cache. Also reports,
+    per axis, the smallest change on its grid that flips the decision.
+    """
+    if not 1 <= len(request.axes) <= 2:
+        raise HTTPException(status_code=422, detail="A sweep takes one or two axes")
+
+    columns = [_axis_column(axis.feature) for axis in request.axes]
+    if len(set(columns)) != len(columns):
+        raise HTTPException(status_code=422, detail="Sweep axes must be different features")
+    grids = [_axis_grid(axis, column) for axis, column in zip(request.axes, columns)]
+    n_grid = int(np.prod([len(g) for g in grids]))
+    n_total = 1 + n_grid + (sum(len(g) for g in grids) if len(grids) == 2 else 0)
+    if n_total > SWEEP_MAX_POINTS:
+        raise HTTPException(status_code=422, detail=f"Sweep too large ({n_total} points, max {SWEEP_MAX_POINTS})")
+
+    try:
+        base_row = feature_pipeline.records([request.application])[0]
+
+        # Row 0: the base application. Then the full grid (row-major for two
+        # axes), then for two axes a 1-D sweep of each axis for the flip search.
+        X = np.tile(base_row, (n_total, 1))
+        if len(grids) == 1:
+            X[1:, columns[0]] = grids[0]
+        else:
+            g0, g1 = np.meshgrid(grids[0], grids[1], indexing="ij")
+            X[1:1 + n_grid, columns[0]] = g0.ravel()
+            X[1:1 + n_grid, columns[1]] = g1.ravel()
+            offset = 1 + n_grid
+            for column, grid in zip(columns, grids):
+                X[offset:offset + len(grid), column] = grid
+                offset += len(grid)
+
+        probs = np.empty(n_total, dtype=np.float32)
+        factors = [None] * n_total
+        # Synthetic rows: kept out of the prediction cache so one sweep
+        # cannot evict up to SWEEP_MAX_POINTS real entries
+        for start in range(0, n_total, config.BULK_CHUNK_ROWS):
+            chunk_probs, top = model_executor.score_sync(X[start:start + config.BULK_CHUNK_ROWS],
+                                                         request.explain, cache=False)
+            probs[start:start + len(chunk_probs)] = chunk_probs
+            if top is not None:
+                for j in range(len(chunk_probs)):
+                    factors[start + j] = (top[0][j], top[1][j])
+
+        base_prob = probs[0]
+        base_decision = get_decision(base_prob)
+        grid_probs = probs[1:1 + n_grid]
+
+        if len(grids) == 1:
+            axis_probs = [grid_probs]
+        else:
+            axis_probs = [probs[1 + n_grid:1 + n_grid + len(grids[0])], probs[1 + n_grid + len(grids[0]):]]
+
+        shape = [len(g) for g in grids]
+        response = {
+            "base": {
+                "default_probability": float(base_prob),
+                "risk_category": get_risk_category(base_prob),
+                "decision": base_decision
+            },
+            "axes": [
+                {"feature": FEATURES[column], "values": grid.tolist()}
+                for column, grid in zip(columns, grids)
+            ],
+            "default_probability": grid_probs.astype(float).reshape(shape).tolist(),
+            "decision": np.array([get_decision(p) for p in grid_probs]).reshape(shape).tolist(),
+            "decision_flips": [
+                _smallest_flip(FEATURES[column], float(base_row[column]), grid, p, base_decision)
+                for column, grid, p in zip(columns, grids, axis_probs)
+            ]
+        }
+
+        if request.explain != "none":
+            grid_factors = [
+                FALLBACK_FACTORS if factors[row] is None else top_risk_factors(*factors[row])
+                for row in range(1, 1 + n_grid)
             ]
-            explanation = f"Your default probability is {prob:.1%}. Risk factors include debt ratio and credit history."
+            if len(grids) == 2:
+                grid_factors = [grid_factors[i:i + shape[1]] for i in range(0, n_grid, shape[1])]
+            response["top_3_risk_factors"] = grid_factors
+
+        return response
+
+    except HTTPException:
+        raise
+    except Overloaded as e:
+        raise overloaded(e)
+    except DeadlineExceeded as e:
+        raise deadline_exceeded(e)
+    except ModelNotReady as e:
+        raise not_ready(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+class BatchPredictionRequest(BaseModel):
+    # Raw dicts so a single malformed row doesn't reject the whole batch
+    applications: List[Dict[str, Any]]
+
+class BatchPredictionItem(BaseModel):
+    index: int
+    result: Optional[PredictionResponse] = None
+    errors: Optional[list] = None
+
+class BatchPredictionResponse(BaseModel):
+    results: List[BatchPredictionItem]
+    scored: int
+    failed: int
+
+def _validation_errors(e: ValidationError):
+    return [
+        {"field": ".".join(str(p) for p in err["loc"]), "message": err["msg"]}
+        for err in e.errors()
+    ]
+
+@router.post("/predict/batch", response_model=BatchPredictionResponse)
+def predict_batch(request: BatchPredictionRequest, explain: ExplainLevel = "exact"):
+    """
+    Scores many applications with one model (and SHAP) call per
+    BULK_CHUNK_ROWS rows. Rows that fail validation are reported
+    individually; the rest are still scored.
+    """
+    try:
+        results = [None] * len(request.applications)
+        valid_idx = []
+        valid_apps = []
+
+        for i, raw in enumerate(request.applications):
+            try:
+                valid_apps.append(CreditApplication(**raw))
+                valid_idx.append(i)
+            except ValidationError as e:
+                results[i] = {"index": i, "errors": _validation_errors(e)}
+
+        if valid_apps:
+            # Single raw feature matrix for the whole batch; the model gets a float32 copy
+            X = feature_pipeline.records(valid_apps)
+
+            M = feature_pipeline.matrix(X)
+            probs = np.empty(len(M), dtype=np.float32)
+            factors = [None] * len(M)
+            # Each chunk is admitted and gets its deadline on its own, as in
+            # score_rows; once one misses it the request fails and the
+            # remaining chunks are never submitted
+            for start in range(0, len(M), config.BULK_CHUNK_ROWS):
+                chunk_probs, top = model_executor.score_sync(M[start:start + config.BULK_CHUNK_ROWS], explain)
+                probs[start:start + len(chunk_probs)] = chunk_probs
+                if top is not None:
+                    for j in range(len(chunk_probs)):
+                        factors[start + j] = (top[0][j], top[1][j])
+            risk_indices = feature_pipeline.derived(X, ("risk_index",))["risk_index"]
+
+            for row, i in enumerate(valid_idx):
+                prob = probs[row]
+                top_3, explanation = describe_row(prob, factors[row], explain)
+                results[i] = {"index": i, "result": build_prediction(prob, risk_indices[row], top_3, explanation)}
+            if config.AUDIT_ENABLED:
+                audit_decisions("predict", [prediction_record(valid_apps[row], results[i]["result"])
+                                            for row, i in enumerate(valid_idx)])
+
+            fairness_monitor.record_many(
+                "predict", [get_decision(p) for p in probs], probs,
+                incomes=[app.MonthlyIncome for app in valid_apps], ages=[app.age for app in valid_apps]
+            )
+            # Raw values (not the float32 model input) so bin edges compare exactly
+            drift_monitor.record_many(X)
+            shadow_monitor.submit(X, probs, credit_model.version)
 
         return {
-            "default_probability": float(prob),
-            "risk_category": get_risk_category(prob),
-            "decision": get_decision(prob),
-            "risk_index": float(risk_index),
-            "top_3_risk_factors": top_3,
-            "explanation_text": explanation
+            "results": results,
+            "scored": len(valid_idx),
+            "failed": len(results) - len(valid_idx)
         }
 
+    except Overloaded as e:
+        raise overloaded(e)
+    except DeadlineExceeded as e:
+        raise deadline_exceeded(e)
+    except ModelNotReady as e:
+        raise not_ready(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.post("/what-if", response_model=PredictionResponse)
-def what_if(application: CreditApplication):
-    # Same as predict but explicitly for simulation
-    return predict(application)
+# --- Columnar and streaming bulk scoring ---
+
+INTEGER_FIELDS = frozenset(f for f in FIELDS if CreditApplication.model_fields[f].annotation is int)
+
+def score_rows(X, errors, explain):
+    """
+    Scores the rows of a raw matrix that have no validation errors, in
+    chunks of BULK_CHUNK_ROWS through the model executor, and records them
+    (audit, fairness, drift). Returns (result columns over all rows, valid mask).
+    """
+    valid = np.ones(len(X), dtype=bool)
+    valid[list(errors)] = False
+    scored = X[valid]
+
+    parts = []
+    for start in range(0, len(scored), config.BULK_CHUNK_ROWS):
+        chunk = scored[start:start + config.BULK_CHUNK_ROWS]
+        probs, top = model_executor.score_sync(feature_pipeline.matrix(chunk), explain)
+        parts.append(prediction_columns(chunk, probs, top, explain))
+    if not parts:
+        parts.append(prediction_columns(scored, np.empty(0), None, explain))
+
+    columns = {}
+    for name in parts[0]:
+        values = np.concatenate([part[name] for part in parts])
+        full = np.full(len(X), None if values.dtype.kind == "O" else np.nan, dtype=values.dtype)
+        full[valid] = values
+        columns[name] = full
+
+    if len(scored):
+        decisions = columns["decision"][valid]
+        probs = columns["default_probability"][valid]
+        fairness_monitor.record_many(
+            "predict", decisions, probs,
+            incomes=scored[:, feature_index("MonthlyIncome")], ages=scored[:, feature_index("age")]
+        )
+        drift_monitor.record_many(scored)
+        shadow_monitor.submit(scored, probs, credit_model.version)
+        if config.AUDIT_ENABLED:
+            results = json_columns({k: v[valid] for k, v in columns.items()}, np.ones(len(scored), dtype=bool))
+            records = []
+            for i, row in enumerate(scored.tolist()):
+                request = {f: int(v) if f in INTEGER_FIELDS else v for f, v in zip(FIELDS, row)}
+                response = {k: v[i] for k, v in results.items()}
+                records.append((response["decision"], response["default_probability"], response["risk_category"],
+                                None, credit_model.version, request, response))
+            audit_decisions("predict", records)
+    return columns, valid
+
+def _error_list(errors):
+    return [{"index": i, "errors": e} for i, e in errors.items()]
+
+def _predict_columnar(body, arrow_in, arrow_out, explain):
+    if arrow_in:
+        columns, nulls = read_arrow_columns(body)
+    else:
+        columns, nulls = read_json_columns(body), None
+    X, errors = validate_columns(columns, INTEGER_FIELDS, nulls)
+    credit_model.current()  # ModelNotReady before any work is queued
+    results, valid = score_rows(X, errors, explain)
+
+    if arrow_out:
+        messages = np.full(len(X), None, dtype=object)
+        for i, e in errors.items():
+            messages[i] = json.dumps(e)
+        return encode_arrow({**results, "errors": messages}, np.ones(len(X), dtype=bool))
+    return json.dumps({
+        "scored": int(valid.sum()),
+        "failed": len(errors),
+        "errors": _error_list(errors),
+        "columns": json_columns(results, valid),
+    }).encode()
+
+def _media_type(request):
+    return request.headers.get("content-type", "").split(";")[0].strip().lower()
+
+@router.post("/predict/columnar")
+async def predict_columnar(request: Request, explain: ExplainLevel = "exact"):
+    """
+    Bulk scoring from one array per feature instead of one object per row:
+    a JSON body {"columns": {"age": [...], ...}} or an Arrow IPC stream
+    (Content-Type: application/vnd.apache.arrow.stream). Columns are
+    validated in bulk and fed to the model as one matrix; rows with invalid
+    values are reported and the rest scored. The response is columnar JSON,
+    or Arrow when the request was Arrow or Accept asks for it (null results
+    and a JSON "errors" column for failed rows).
+    """
+    arrow_in = _media_type(request) == ARROW_STREAM
+    arrow_out = arrow_in or ARROW_STREAM in request.headers.get("accept", "")
+    body = await request.body()
+    try:
+        # Parsing, validation and scoring are CPU work: keep them off the event loop
+        content = await run_in_threadpool(_predict_columnar, body, arrow_in, arrow_out, explain)
+    except PayloadError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Overloaded as e:
+        raise overloaded(e)
+    except DeadlineExceeded as e:
+        raise deadline_exceeded(e)
+    except ModelNotReady as e:
+        raise not_ready(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return Response(content, media_type=ARROW_STREAM if arrow_out else "application/json")
+
+def _predict_ndjson_chunk(lines, offset, explain):
+    # NDJSON lines for one chunk; a chunk the model can't take is reported row by row
+    columns, errors = read_ndjson_rows(lines)
+    X, column_errors = validate_columns(columns, INTEGER_FIELDS)
+    errors = {**column_errors, **errors}
+    try:
+        results, valid = score_rows(X, errors, explain)
+    except (Overloaded, DeadlineExceeded, ModelNotReady) as e:
+        message = [{"field": "", "message": str(e)}]
+        errors = {i: errors.get(i, message) for i in range(len(lines))}
+        results, valid = {}, np.zeros(len(lines), dtype=bool)
+
+    results = json_columns(results, valid)
+    out = []
+    for i in range(len(lines)):
+        if valid[i]:
+            item = {"index": offset + i, "result": {k: v[i] for k, v in results.items()}}
+        else:
+            item = {"index": offset + i, "errors": errors[i]}
+        out.append(json.dumps(item))
+    out.append("")
+    return "\n".join(out).encode()
+
+class DuplexStreamingResponse(StreamingResponse):
+    # The stock response watches for client disconnects by calling receive(),
+    # which would take request body chunks away from a body iterator that is
+    # still reading the request. Here the iterator's own reads see the disconnect.
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+
+@router.post("/predict/stream")
+async def predict_stream(request: Request, explain: ExplainLevel = "exact"):
+    """
+    Streaming bulk scoring: an NDJSON body (one application per line) is read
+    and scored BULK_CHUNK_ROWS lines at a time, and results stream back as
+    NDJSON lines {"index", "result"} or {"index", "errors"} in input order, so
+    neither side holds the whole book in memory. Blank lines are skipped and
+    not counted. Chunks the model can't take (queue full, deadline) come back
+    as per-row errors, since the status line has already been sent.
+    """
+    if _media_type(request) != NDJSON:
+        raise HTTPException(status_code=415, detail=f"Expected Content-Type: {NDJSON}")
+    try:
+        credit_model.current()
+    except ModelNotReady as e:
+        raise not_ready(e)
+
+    async def results():
+        offset = 0
+        pending = []
+        tail = b""
+        async for data in request.stream():
+            lines = (tail + data).split(b"\n")
+            tail = lines.pop()
+            pending.extend(line for line in lines if line.strip())
+            while len(pending) >= config.BULK_CHUNK_ROWS:
+                chunk, pending = pending[:config.BULK_CHUNK_ROWS], pending[config.BULK_CHUNK_ROWS:]
+                yield await run_in_threadpool(_predict_ndjson_chunk, chunk, offset, explain)
+                offset += len(chunk)
+        if tail.strip():
+            pending.append(tail)
+        if pending:
+            yield await run_in_threadpool(_predict_ndjson_chunk, pending, offset, explain)
+
+    return DuplexStreamingResponse(results(), media_type=NDJSON)
 
 @router.get("/fairness-metrics")
-def fairness_metrics():
-    # Placeholder for fairness metrics
-    # calculating these requires the full dataset or a test set evaluation
-    # For now, return static demo data or calculated from a small subset if available
+def fairness_metrics(window: Literal["all", "tumbling", "sliding"] = "all"):
+    """
+    Approval rates, mean predicted default rates and disparate impact by
+    income and age band, from counters updated with every /predict and
+    /apply decision. Each source is reported separately under "sources"
+    (different scorers and income scales). `window` selects all decisions
+    since startup, the current fixed window or the sliding window (see
+    app/core/fairness.py).
+    """
     return {
-        "disparate_impact_ratio": 0.95,
-        "default_rate_by_income": {
-            "Low": 0.15,
-            "Medium": 0.08,
-            "High": 0.02
-        },
-        "subgroup_accuracy": {
-            "Young (<25)": 0.82,
-            "Adult (25-60)": 0.86,
-            "Senior (>60)": 0.88
-        },
+        **fairness_monitor.snapshot(window),
         "message": "No protected attributes (gender, religion, ethnicity) used."
     }
 
+# Prototype values, served when the model carries no evaluation report (pickles)
+STATIC_MODEL_METRICS = {
+    "auc": 0.812,
+    "precision": 0.742,
+    "recall": 0.691
+}
+
+# Cheap in-memory reads: async so they run on the event loop and stay
+# responsive while the request threadpool is busy
 @router.get("/model-metrics")
-def model_metrics():
+async def model_metrics():
+    """
+    Returns model performance metrics (AUC, Precision, Recall) of the served
+    model from the hold-out evaluation stored with its bundle, plus live
+    metrics from outcomes reported to /outcomes.
     """
-    Returns model performance metrics (AUC, Precision, Recall).
-    Currently returns static validation values for the prototype.
+    try:
+        state = credit_model.current()
+    except ModelNotReady:
+        state = None
+    version = state.version if state is not None else None
+    report = state.evaluation if state is not None else None
+
+    if report is not None:
+        metrics = {
+            "auc": report["auc"],
+            "precision": report["precision"],
+            "recall": report["recall"],
+            "source": "evaluation",
+            "evaluation": report
+        }
+    else:
+        metrics = {**STATIC_MODEL_METRICS, "source": "static"}
+    metrics["model_version"] = version
+    metrics["live"] = live_metrics.report("predict", version) if version is not None else None
+    return metrics
+
+class OutcomeItem(BaseModel):
+    # The audit record id, or the application_id of an /apply decision
+    decision_id: Optional[int] = None
+    application_id: Optional[str] = None
+    defaulted: bool
+
+class OutcomesRequest(BaseModel):
+    outcomes: List[OutcomeItem]
+
+@router.post("/outcomes")
+def record_outcomes(request: OutcomesRequest):
+    """
+    Observed default labels for previously scored decisions. Each decision
+    takes one outcome (re-sent outcomes are reported as duplicates). Updates
+    the live AUC/precision/recall in /model-metrics and subgroup accuracy in
+    /fairness-metrics. Decisions are written to the audit log asynchronously,
+    so one scored moments ago may still be reported as not_found.
+    Responses do not carry the audit id (it is assigned when the writer
+    commits), so /apply decisions are matched by application_id; /predict
+    requests have no application_id and are reported by the decision_id
+    listed in GET /audit?endpoint=predict.
     """
+    if not config.AUDIT_ENABLED:
+        raise HTTPException(status_code=503, detail="Outcomes are matched against the audit log, which is disabled")
+
+    results = [None] * len(request.outcomes)
+    lookups = []
+    for i, item in enumerate(request.outcomes):
+        if item.decision_id is None and item.application_id is None:
+            results[i] = {"index": i, "status": "invalid", "detail": "decision_id or application_id is required"}
+        else:
+            lookups.append(i)
+
+    try:
+        stored = audit_log.record_outcomes(
+            [(request.outcomes[i].decision_id, request.outcomes[i].application_id, request.outcomes[i].defaulted)
+             for i in lookups]
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    by_model = {}
+    for i, (status, decision) in zip(lookups, stored):
+        results[i] = {"index": i, "status": status, "decision_id": decision["id"] if decision else None}
+        if status != "recorded":
+            continue
+        defaulted = request.outcomes[i].defaulted
+        prob = decision["risk_probability"]
+        key = (decision["endpoint"], decision["model_version"])
+        by_model.setdefault(key, ([], []))
+        by_model[key][0].append(prob)
+        by_model[key][1].append(defaulted)
+
+        payload = decision["request"] or {}
+        if decision["endpoint"] == "predict":
+            income, age = payload.get("MonthlyIncome"), payload.get("age")
+        else:
+            income, age = payload.get("monthly_income"), None
+        fairness_monitor.record_outcome(decision["endpoint"], (prob >= DEFAULT_THRESHOLD) == defaulted,
+                                        income=income, age=age)
+
+    for (endpoint, version), (probs, labels) in by_model.items():
+        live_metrics.add(endpoint, version, probs, labels)
+
+    statuses = [r["status"] for r in results]
     return {
-        "auc": 0.812,
-        "precision": 0.742,
-        "recall": 0.691
+        "results": results,
+        "recorded": statuses.count("recorded"),
+        "duplicates": statuses.count("duplicate"),
+        "not_found": statuses.count("not_found"),
+        "invalid": statuses.count("invalid")
     }
 
 # --- New Endpoint for Alternative Data (Hackathon Prototype) ---
@@ -191,102 +829,181 @@ class AlternativeCreditApplication(BaseModel):
     savings_balance: float  # New Feature
     rent_payment_score: int # New Feature: 0 if not renting, else 0-100
 
+def _apply_result(application_id, result, i):
+    return {
+        "application_id": application_id,
+        "decision": result["decision"][i],
+        "risk_probability": result["risk_probability"][i],
+        "risk_level": result["risk_level"][i],
+        "top_positive_factors": result["top_positive_factors"][i],
+        "top_negative_factors": result["top_negative_factors"][i],
+        "recommendations": result["recommendations"][i]
+    }
+
+def application_record(application, result):
+    # Audit record of one /apply decision (see AuditLog.record_many)
+    return (result["decision"], result["risk_probability"], result["risk_level"], application.application_id,
+            f"rules-{RULES_VERSION}", application.model_dump(), result)
+
+def audit_application(application, result):
+    audit_decision("apply", result["decision"], result["risk_probability"], result["risk_level"],
+                   application_id=application.application_id, model_version=f"rules-{RULES_VERSION}",
+                   request=application.model_dump(), response=result)
+
+def _rule_columns(applications):
+    # Column arrays of the fields the rule table reads
+    return {f: np.array([getattr(app, f) for app in applications], dtype=np.float64) for f in RULE_FIELDS}
+
+def _apply_one(application):
+    timer = StageTimer("apply")
+    rules = evaluate_rules(_rule_columns([application]))
+    timer.mark("rules")
+    result = _apply_result(application.application_id, rules, 0)
+    timer.mark("response")
+    audit_application(application, result)
+    fairness_monitor.record("apply", result["decision"], result["risk_probability"],
+                            income=application.monthly_income)
+    timer.mark("record")
+    return result
+
 @router.post("/apply")
-def apply_credit(application: AlternativeCreditApplication):
+def apply_credit(application: AlternativeCreditApplication, response: Response):
     """
     Heuristic endpoint for the hackathon prototype.
-    Calculates a credit score based on weighted average of the input scores.
+    Calculates a credit score based on weighted average of the input scores
+    (see the rule table in app/core/rules.py).
+    Idempotent by application_id: a repeat of the same application returns
+    the first result (Idempotent-Replayed: true), a different application
+    under the same id is rejected with 409.
     """
     try:
-        # 1. Calculate weighted score (Enhanced Heuristic)
-        # We adjust weights based on what data is available
-        
-        # Base components
-        score_sum = (
-            (application.transaction_score * 0.30) +
-            (application.utility_payment_score * 0.25) +
-            (application.business_activity_score * 0.25)
+        result, replayed = idempotency.run(application.application_id, application.model_dump(),
+                                           lambda: _apply_one(application))
+        if replayed:
+            response.headers["Idempotent-Replayed"] = "true"
+        return result
+
+    except IdempotencyConflict:
+        raise HTTPException(
+            status_code=409,
+            detail=f"application_id {application.application_id} was already submitted with different data",
         )
-        
-        # Add Savings impact (Cap at 10 points)
-        # Example: 50,000 savings adds full 10 points
-        savings_impact = min(10, (application.savings_balance / 5000))
-        
-        # Add Rent impact (Max 10 points)
-        rent_impact = (application.rent_payment_score * 0.10)
-        
-        weighted_score = score_sum + savings_impact + rent_impact
-        
-        # Cap at 100
-        weighted_score = min(100, weighted_score)
-
-        # 2. Determine Risk Probability
-        risk_probability = 1.0 - (weighted_score / 100.0)
-        risk_probability = max(0.0, min(1.0, risk_probability)) 
-        
-        # 3. Decision
-        if risk_probability < 0.30:
-            decision = "APPROVED"
-            risk_level = "LOW"
-        elif risk_probability < 0.60:
-            decision = "MANUAL_REVIEW"
-            risk_level = "MEDIUM"
-        else:
-            decision = "REJECTED"
-            risk_level = "HIGH"
-            
-        # 4. Top Factors
-        top_positive = []
-        top_negative = []
-        recommendations = [] # New Feature: Credit Coach
-
-        # Income Factor
-        if application.monthly_income > 25000: # adjusted for Indian context example
-            top_positive.append("Strong income stability")
-        elif application.monthly_income < 10000:
-            top_negative.append("Low monthly income")
-            recommendations.append("Consider adding a co-applicant to boost income eligibility.")
-
-        # Transaction Factor
-        if application.transaction_score > 75:
-            top_positive.append("Excellent transaction history")
-        elif application.transaction_score < 50:
-            top_negative.append("Irregular cash flow")
-            recommendations.append("Maintain a consistent balance and avoid frequent overdrafts.")
-
-        # Utility Factor
-        if application.utility_payment_score > 80:
-            top_positive.append("Consistent bill payments")
-        elif application.utility_payment_score < 50:
-            top_negative.append(" missed utility payments")
-            recommendations.append("Automate your utility bill payments to improve reliability score.")
-            
-        # Savings
-        if application.savings_balance > 20000:
-            top_positive.append("Healthy savings buffer")
-        elif application.savings_balance < 5000:
-            recommendations.append("Try to build a savings buffer of at least ₹10,000.")
-
-        # Rent
-        if application.rent_payment_score > 80:
-             top_positive.append("Timely rent payments")
-
-        # Fallbacks
-        if not top_positive and risk_level == "LOW":
-            top_positive.append("Balanced financial profile")
-        if not recommendations:
-            recommendations.append("Continue exploring credit builder products.")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+class AlternativeBatchRequest(BaseModel):
+    # Raw dicts so a single malformed row doesn't reject the whole batch
+    applications: List[Dict[str, Any]]
 
+@router.post("/apply/batch")
+def apply_credit_batch(request: AlternativeBatchRequest):
+    """
+    Scores many alternative-data applications with one vectorized rule
+    evaluation. Rows that fail validation are reported individually.
+    Each application goes through the same idempotency layer as /apply:
+    an application_id already submitted with the same data gets its stored
+    result (marked "replayed", not audited or counted again), one submitted
+    with different data is reported as an error for that row.
+    """
+    try:
+        results = [None] * len(request.applications)
+        valid_idx = []
+        valid_apps = []
+        replayed_count = 0
+
+        for i, raw in enumerate(request.applications):
+            try:
+                valid_apps.append(AlternativeCreditApplication(**raw))
+                valid_idx.append(i)
+            except ValidationError as e:
+                results[i] = {"index": i, "errors": _validation_errors(e)}
+
+        if valid_apps:
+            scored = evaluate_rules(_rule_columns(valid_apps))
+            fresh = []  # rows computed by this request, as opposed to replayed
+            for row, i in enumerate(valid_idx):
+                application = valid_apps[row]
+                try:
+                    result, replayed = idempotency.run(
+                        application.application_id, application.model_dump(),
+                        lambda: _apply_result(application.application_id, scored, row)
+                    )
+                except IdempotencyConflict:
+                    results[i] = {"index": i, "errors": [{
+                        "field": "application_id",
+                        "message": f"{application.application_id} was already submitted with different data",
+                    }]}
+                    continue
+                results[i] = {"index": i, "result": result}
+                if replayed:
+                    results[i]["replayed"] = True
+                    replayed_count += 1
+                else:
+                    fresh.append(row)
+
+            if config.AUDIT_ENABLED:
+                audit_decisions("apply", [application_record(valid_apps[row], results[valid_idx[row]]["result"])
+                                          for row in fresh])
+            fairness_monitor.record_many(
+                "apply", [scored["decision"][row] for row in fresh],
+                [scored["risk_probability"][row] for row in fresh],
+                incomes=[valid_apps[row].monthly_income for row in fresh]
+            )
+
+        failed = sum(1 for item in results if "errors" in item)
         return {
-            "application_id": application.application_id,
-            "decision": decision,
-            "risk_probability": round(risk_probability, 2),
-            "risk_level": risk_level,
-            "top_positive_factors": top_positive,
-            "top_negative_factors": top_negative,
-            "recommendations": recommendations 
+            "results": results,
+            "scored": len(results) - failed,
+            "replayed": replayed_count,
+            "failed": failed
         }
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# --- Audit log ---
+
+def _timestamp(value):
+    return value.timestamp() if value is not None else None
+
+@router.get("/audit")
+def audit_history(
+    application_id: Optional[str] = None,
+    decision: Optional[str] = None,
+    endpoint: Optional[Literal["apply", "predict"]] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[int] = None
+):
+    """
+    Newest-first page of audited decisions. Pass `next_cursor` from the
+    response as `cursor` to fetch the next page; it is null on the last page.
+    """
+    items, next_cursor = audit_log.query(
+        application_id=application_id, decision=decision, endpoint=endpoint,
+        since=_timestamp(since), until=_timestamp(until), limit=limit, cursor=cursor
+    )
+    return {"items": items, "next_cursor": next_cursor}
+
+@router.get("/audit/summary")
+def audit_summary(
+    endpoint: Optional[Literal["apply", "predict"]] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None
+):
+    """Decision counts, for the audit page's summary cards."""
+    return audit_log.summary(endpoint=endpoint, since=_timestamp(since), until=_timestamp(until))
+
+@router.get("/audit/stats")
+def audit_stats():
+    """Audit writer queue depth, throughput and dropped records."""
+    return audit_log.stats()
+
+@router.get("/audit/{record_id}")
+def audit_record(record_id: int):
+    """One audited decision including its request and response payloads."""
+    record = audit_log.get(record_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Audit record not found")
+    return record
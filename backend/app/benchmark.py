@@ -0,0 +1,271 @@
+"""
+Latency/throughput benchmarks for the API and the model layer.
+
+    cd backend
+    python -m app.benchmark --out bench.json
+    python -m app.benchmark --save-baseline bench-baseline.json
+    python -m app.benchmark --baseline bench-baseline.json      # exit code 1 on regression
+
+API scenarios run in-process against app.main:app through an ASGI client
+(no server, no network), with the app's lifespan, so model loading, the
+micro-batcher and the monitors behave as in production. /predict,
+/predict/decision, /what-if and /apply are driven at each concurrency level;
+the batch endpoints and the direct CreditModel.predict/decide/explain calls
+at each batch size. Every request
+carries a freshly generated application, so the prediction cache only ever
+misses. Audit logging is off unless --audit is given.
+
+Each scenario reports p50/p95/p99 latency and throughput. With --baseline,
+a scenario regresses when its p95 latency grew, or its throughput fell, by
+more than --tolerance; any failed request also fails the run.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+
+# Unique across runs too, for a persistent (SQLite) idempotency store
+_application_ids = (f"{os.urandom(4).hex()}-{i}" for i in itertools.count())
+
+
+def applications(rng, n):
+    """Random /predict payloads in realistic ranges."""
+    return [{
+        "RevolvingUtilizationOfUnsecuredLines": float(rng.gamma(1.0, 0.3)),
+        "age": int(rng.integers(21, 90)),
+        "NumberOfTime3059DaysPastDueNotWorse": int(rng.poisson(0.3)),
+        "DebtRatio": float(rng.gamma(1.0, 0.4)),
+        "MonthlyIncome": float(round(rng.lognormal(8.5, 0.6))),
+        "NumberOfOpenCreditLinesAndLoans": int(rng.poisson(8)),
+        "NumberOfTimes90DaysLate": int(rng.poisson(0.2)),
+        "NumberRealEstateLoansOrLines": int(rng.poisson(1)),
+        "NumberOfTime6089DaysPastDueNotWorse": int(rng.poisson(0.1)),
+        "NumberOfDependents": int(rng.poisson(0.8)),
+    } for _ in range(n)]
+
+
+def alternative_applications(rng, n):
+    """Random /apply payloads, each with an application_id of its own (/apply is idempotent by id)."""
+    return [{
+        "application_id": f"bench-{next(_application_ids)}",
+        "applicant_type": ["individual", "gig", "msme"][int(rng.integers(3))],
+        "monthly_income": float(round(rng.lognormal(9.8, 0.6))),
+        "transaction_score": int(rng.integers(0, 101)),
+        "utility_payment_score": int(rng.integers(0, 101)),
+        "business_activity_score": int(rng.integers(0, 101)),
+        "savings_balance": float(round(rng.lognormal(9.5, 1.0))),
+        "rent_payment_score": int(rng.integers(0, 101)),
+    } for _ in range(n)]
+
+
+def summarize(latencies, wall, errors=0, rows_per_call=1):
+    latencies = np.asarray(latencies, dtype=np.float64) * 1000.0
+    calls = len(latencies)
+    return {
+        "calls": calls,
+        "errors": errors,
+        "rows_per_call": rows_per_call,
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 3),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 3),
+        "mean_ms": round(float(latencies.mean()), 3),
+        "throughput_per_s": round(calls / wall, 1),
+        "rows_per_s": round(calls * rows_per_call / wall, 1),
+    }
+
+
+async def run_api(client, path, payloads, concurrency, warmup, rows_per_call=1):
+    """POSTs every payload with `concurrency` requests in flight; returns a summary."""
+    for payload in payloads[:warmup]:
+        await client.post(path, json=payload)
+
+    pending = iter(payloads[warmup:])
+    latencies = []
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        # One shared iterator: each payload is sent exactly once
+        for payload in pending:
+            started = time.perf_counter()
+            response = await client.post(path, json=payload)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, time.perf_counter() - started, errors, rows_per_call)
+
+
+def run_direct(fn, batches, warmup, rows_per_call):
+    for X in batches[:warmup]:
+        fn(X)
+    latencies = []
+    started = time.perf_counter()
+    for X in batches[warmup:]:
+        t = time.perf_counter()
+        fn(X)
+        latencies.append(time.perf_counter() - t)
+    return summarize(latencies, time.perf_counter() - started, 0, rows_per_call)
+
+
+async def run_suite(args):
+    import httpx
+    from app.main import app
+    from app.core.model import credit_model
+    from app.core.features import FeaturePipeline
+
+    rng = np.random.default_rng(args.seed)
+    n = args.requests + args.warmup
+    results = {}
+
+    def report(name, summary):
+        results[name] = summary
+        print(f"  {name:<44} p50 {summary['p50_ms']:8.2f}ms  p95 {summary['p95_ms']:8.2f}ms  "
+              f"p99 {summary['p99_ms']:8.2f}ms  {summary['rows_per_s']:10.1f} rows/s"
+              + (f"  {summary['errors']} errors" if summary["errors"] else ""))
+
+    async with app.router.lifespan_context(app):
+        deadline = time.monotonic() + args.load_timeout
+        while not (credit_model.ready and credit_model.status()["explainer_ready"]):
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"Model not ready after {args.load_timeout}s: {credit_model.status()['last_error']}")
+            await asyncio.sleep(0.1)
+        print(f"Model {credit_model.version} ({credit_model.status()['artifact']})")
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            for concurrency in args.concurrency:
+                for explain in args.explain:
+                    for endpoint in ("predict", "what-if"):
+                        summary = await run_api(client, f"/api/v1/{endpoint}?explain={explain}",
+                                                applications(rng, n), concurrency, args.warmup)
+                        report(f"api /{endpoint} explain={explain} c={concurrency}", summary)
+                summary = await run_api(client, "/api/v1/predict/decision", applications(rng, n),
+                                        concurrency, args.warmup)
+                report(f"api /predict/decision c={concurrency}", summary)
+                summary = await run_api(client, "/api/v1/apply", alternative_applications(rng, n),
+                                        concurrency, args.warmup)
+                report(f"api /apply c={concurrency}", summary)
+
+            # Batch endpoints: one call in flight, rows per call varies
+            batch_calls = max(args.requests // 10, 10)
+            for size in args.batch_sizes:
+                for explain in args.explain:
+                    payloads = [{"applications": applications(rng, size)} for _ in range(batch_calls + args.warmup)]
+                    summary = await run_api(client, f"/api/v1/predict/batch?explain={explain}", payloads,
+                                            1, args.warmup, size)
+                    report(f"api /predict/batch explain={explain} n={size}", summary)
+                payloads = [{"applications": alternative_applications(rng, size)} for _ in range(batch_calls + args.warmup)]
+                report(f"api /apply/batch n={size}", await run_api(client, "/api/v1/apply/batch", payloads,
+                                                                   1, args.warmup, size))
+
+        # Model layer without HTTP, validation or monitoring
+        pipeline = FeaturePipeline(list(applications(rng, 1)[0]))
+        for size in (1,) + tuple(args.batch_sizes):
+            batches = [
+                pipeline.matrix([list(row.values()) for row in applications(rng, size)])
+                for _ in range(batch_calls + args.warmup)
+            ]
+            report(f"model predict n={size}", run_direct(credit_model.predict, batches, args.warmup, size))
+            report(f"model decide n={size}", run_direct(credit_model.decide, batches, args.warmup, size))
+            report(f"model explain n={size}", run_direct(credit_model.explain, batches, args.warmup, size))
+
+    return results
+
+
+def compare(results, baseline=None, tolerance=0.25):
+    """Failed requests, plus the regressions of `results` against a baseline run."""
+    regressions = []
+    for name, current in results.items():
+        if current["errors"]:
+            regressions.append(f"{name}: {current['errors']} failed requests")
+        base = (baseline or {}).get("results", {}).get(name)
+        if base is None:
+            continue
+        if current["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {current['p95_ms']:.2f}ms vs baseline {base['p95_ms']:.2f}ms")
+        if current["rows_per_s"] < base["rows_per_s"] * (1 - tolerance):
+            regressions.append(f"{name}: {current['rows_per_s']:.1f} rows/s vs baseline {base['rows_per_s']:.1f}")
+    return regressions
+
+
+def _int_list(value):
+    return [int(v) for v in value.split(",") if v]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the scoring API and model layer.")
+    parser.add_argument("--out", help="Write results as JSON")
+    parser.add_argument("--baseline", help="Fail (exit 1) when a scenario regresses against this results file")
+    parser.add_argument("--save-baseline", help="Also write the results here as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Allowed relative p95/throughput regression (default 0.25)")
+    parser.add_argument("--requests", type=int, default=300, help="Measured requests per scenario")
+    parser.add_argument("--warmup", type=int, default=20, help="Unmeasured requests before each scenario")
+    parser.add_argument("--concurrency", type=_int_list, default=[1, 8, 32], help="e.g. 1,8,32")
+    parser.add_argument("--batch-sizes", type=_int_list, default=[16, 128], help="e.g. 16,128")
+    parser.add_argument("--explain", type=lambda v: v.split(","), default=["none", "exact"],
+                        help="Explain levels for /predict and /what-if, e.g. none,fast,exact")
+    parser.add_argument("--model", help="Model path (default: CREDIT_MODEL_PATH / app/model/model.pkl)")
+    parser.add_argument("--audit", action="store_true", help="Keep the audit log enabled")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--load-timeout", type=float, default=120.0)
+    args = parser.parse_args(argv)
+
+    # Configuration is read at import time, so set it before importing the app
+    if args.model:
+        os.environ["CREDIT_MODEL_PATH"] = args.model
+    if not args.audit:
+        os.environ["CREDIT_AUDIT_ENABLED"] = "0"
+    os.environ.setdefault("CREDIT_MODEL_WATCH_INTERVAL", "0")
+
+    print("Running benchmarks...")
+    results = asyncio.run(run_suite(args))
+
+    from app.core import config
+    from app.core.model import credit_model
+    output = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "environment": {
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "model_path": config.MODEL_PATH,
+            "model_version": credit_model.version,
+            "inference_engine": config.INFERENCE_ENGINE,
+            "microbatch": config.MICROBATCH_ENABLED,
+            "audit": config.AUDIT_ENABLED,
+        },
+        "settings": {k: getattr(args, k) for k in ("requests", "warmup", "concurrency", "batch_sizes", "explain", "seed")},
+        "results": results,
+    }
+    for path in (args.out, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(output, f, indent=2)
+            print(f"Results written to {path}")
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"{len(regressions)} regression(s) (tolerance {args.tolerance:.0%}):")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+    if args.baseline:
+        print(f"No regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
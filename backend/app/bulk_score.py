@@ -0,0 +1,238 @@
+"""
+Offline bulk scoring of whole books (cs-training style CSV or Parquet).
+
+    cd backend
+    python -m app.bulk_score input.csv scored.csv --workers 8 --explain fast
+
+The input is streamed in fixed-size chunks, so memory stays bounded regardless
+of file size. Chunks are scored on a process pool; each worker loads the model
+once (a bundle maps its tree arrays, so this is cheap) and writes its chunk to a
+part file next to the output. Completed parts survive interruption: re-running
+the same command skips them and only scores what is left. When every chunk is
+done the parts are concatenated into the output file.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+
+from app.core import config
+from app.core.bundle import is_bundle, load_bundle
+from app.core.features import feature_pipeline
+from app.core.model import prediction_columns
+
+MANIFEST_FILE = "_manifest.json"
+
+# Model instance of each worker process (set by _init_worker)
+_worker_model = None
+
+
+def _file_format(path, override=None):
+    if override:
+        return override
+    return "parquet" if path.lower().endswith((".parquet", ".pq")) else "csv"
+
+
+def iter_chunks(path, chunk_size, fmt):
+    """Yields DataFrames of at most chunk_size rows without loading the whole file."""
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_size)
+
+
+def to_features(df, dtype=np.float32, fill_values=None):
+    """
+    Feature matrix in training column order; accepts API or training column
+    names. Missing values of the features in `fill_values` are replaced the way
+    training replaced them; the rest stay NaN and follow each split's learned
+    default direction.
+    """
+    return feature_pipeline.fill(feature_pipeline.frame(df, dtype), fill_values)
+
+
+def _init_worker(model_path, threads, explain="none"):
+    global _worker_model
+    from app.core.model import CreditModel, PredictionCache
+    _worker_model = CreditModel(model_path)
+    # Every row of a book is new; caching would only cost memory
+    _worker_model.cache = PredictionCache(0)
+    # The SHAP explainer is only worth building when rows ask for exact factors
+    if not _worker_model.load_model(explainer=explain == "exact"):
+        raise RuntimeError(f"Could not load model from {model_path}")
+    # One process per core already, so keep XGBoost from oversubscribing
+    state = _worker_model.current()
+    if state.estimator is not None:
+        state.estimator.set_params(n_jobs=threads)
+    state.booster.set_param({"nthread": threads})
+
+
+def score_chunk(df, explain="none"):
+    """Scores one chunk; returns the output DataFrame (one row per input row)."""
+    raw = to_features(df, np.float64, _worker_model.current().fill_values)
+    probs, top = _worker_model.score(feature_pipeline.matrix(raw), explain)
+
+    # Same columns as /predict/columnar
+    out = pd.DataFrame(prediction_columns(raw, probs, top, explain))
+    return out
+
+
+def _part_path(parts_dir, index, fmt):
+    return os.path.join(parts_dir, f"part-{index:06d}.{fmt}")
+
+
+def _write_frame(df, path, fmt):
+    # Write then rename, so an interrupted write never looks like a finished part
+    tmp = path + ".tmp"
+    if fmt == "parquet":
+        df.to_parquet(tmp, index=False)
+    else:
+        df.to_csv(tmp, index=False)
+    os.replace(tmp, path)
+
+
+def _score_part(df, index, start_row, parts_dir, out_fmt, explain, id_column):
+    out = score_chunk(df, explain)
+    if id_column and id_column in df.columns:
+        ids = df[id_column].to_numpy()
+    else:
+        ids = np.arange(start_row, start_row + len(df))
+    out.insert(0, id_column or "row", ids)
+    _write_frame(out, _part_path(parts_dir, index, out_fmt), out_fmt)
+    return len(df)
+
+
+def _check_manifest(parts_dir, manifest):
+    path = os.path.join(parts_dir, MANIFEST_FILE)
+    if os.path.exists(path):
+        with open(path) as f:
+            previous = json.load(f)
+        if previous != manifest:
+            raise SystemExit(
+                f"{parts_dir} belongs to a different run (input, options or model changed); "
+                "use --restart to discard it"
+            )
+    else:
+        with open(path, "w") as f:
+            json.dump(manifest, f, indent=2)
+
+
+def _merge_parts(parts_dir, n_parts, output, fmt):
+    tmp = output + ".tmp"
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        writer = None
+        for i in range(n_parts):
+            table = pq.read_table(_part_path(parts_dir, i, fmt))
+            if writer is None:
+                writer = pq.ParquetWriter(tmp, table.schema)
+            writer.write_table(table)
+        if writer is not None:
+            writer.close()
+    else:
+        with open(tmp, "wb") as dst:
+            for i in range(n_parts):
+                with open(_part_path(parts_dir, i, fmt), "rb") as src:
+                    if i > 0:
+                        src.readline()  # header already written
+                    shutil.copyfileobj(src, dst)
+    os.replace(tmp, output)
+
+
+def run(input_path, output_path, model_path=None, chunk_size=50000, workers=None, explain="none",
+        id_column=None, input_format=None, output_format=None, restart=False):
+    model_path = model_path or config.MODEL_PATH
+    workers = workers or os.cpu_count() or 1
+    in_fmt = _file_format(input_path, input_format)
+    out_fmt = _file_format(output_path, output_format)
+    parts_dir = output_path + ".parts"
+
+    if restart and os.path.exists(parts_dir):
+        shutil.rmtree(parts_dir)
+    os.makedirs(parts_dir, exist_ok=True)
+    st = os.stat(input_path)
+    _check_manifest(parts_dir, {
+        "input": os.path.abspath(input_path),
+        "input_size": st.st_size,
+        "input_mtime_ns": st.st_mtime_ns,
+        "model": os.path.abspath(model_path),
+        "chunk_size": chunk_size,
+        "explain": explain,
+        "id_column": id_column,
+        "output_format": out_fmt,
+    })
+
+    if not (is_bundle(model_path) and load_bundle(model_path).fill_values):
+        print("Model has no recorded fill values; missing inputs stay NaN "
+              "(export a bundle to fill them as training did)", file=sys.stderr)
+
+    started = time.perf_counter()
+    scored = skipped = 0
+    n_parts = 0
+    in_flight = set()
+    # At most two chunks per worker are held in memory at any time
+    max_in_flight = workers * 2
+
+    def report(final=False):
+        elapsed = time.perf_counter() - started
+        rate = scored / elapsed if elapsed > 0 else 0.0
+        label = "done" if final else "progress"
+        print(f"[{label}] {scored} rows scored, {skipped} resumed, {elapsed:.1f}s, {rate:,.0f} rows/sec",
+              file=sys.stderr)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(model_path, max(1, (os.cpu_count() or 1) // workers), explain)) as pool:
+        start_row = 0
+        for index, df in enumerate(iter_chunks(input_path, chunk_size, in_fmt)):
+            n_parts = index + 1
+            if os.path.exists(_part_path(parts_dir, index, out_fmt)):
+                skipped += len(df)
+            else:
+                if len(in_flight) >= max_in_flight:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        scored += future.result()
+                    report()
+                in_flight.add(pool.submit(_score_part, df, index, start_row, parts_dir,
+                                          out_fmt, explain, id_column))
+            start_row += len(df)
+
+        for future in in_flight:
+            scored += future.result()
+
+    _merge_parts(parts_dir, n_parts, output_path, out_fmt)
+    shutil.rmtree(parts_dir)
+    report(final=True)
+    return scored + skipped
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score a CSV/Parquet book with the credit model")
+    parser.add_argument("input", help="cs-training style CSV or Parquet file")
+    parser.add_argument("output", help="Output .csv or .parquet file")
+    parser.add_argument("--model", help="Model bundle or pickle (default: CREDIT_MODEL_PATH)")
+    parser.add_argument("--chunk-size", type=int, default=50000)
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--explain", choices=["none", "fast", "exact"], default="none",
+                        help="Add top-3 risk factors per row")
+    parser.add_argument("--id-column", default=None, help="Input column copied to the output as row id")
+    parser.add_argument("--input-format", choices=["csv", "parquet"])
+    parser.add_argument("--output-format", choices=["csv", "parquet"])
+    parser.add_argument("--restart", action="store_true", help="Discard parts from a previous run")
+    args = parser.parse_args(argv)
+
+    run(args.input, args.output, model_path=args.model, chunk_size=args.chunk_size, workers=args.workers,
+        explain=args.explain, id_column=args.id_column, input_format=args.input_format,
+        output_format=args.output_format, restart=args.restart)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,363 @@
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from app.core import config
+from app.core.metrics import audit_dropped
+
+# Server-side, append-only decision audit log.
+#
+# Request handlers only put a tuple on a bounded in-memory queue (bulk
+# endpoints put one list for the whole request); a single writer thread
+# drains it and inserts whole batches into SQLite (WAL mode) in one
+# transaction, so auditing never waits on disk in the request path. If the
+# queue is full the records are dropped rather than blocking scoring, and
+# counted in stats() and credit_audit_dropped_total.
+# Reads use their own connections and, thanks to WAL, never block the writer.
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS decisions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    endpoint TEXT NOT NULL,
+    application_id TEXT,
+    decision TEXT NOT NULL,
+    risk_probability REAL,
+    risk_level TEXT,
+    model_version TEXT,
+    request TEXT,
+    response TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_decisions_application ON decisions (application_id, id);
+CREATE INDEX IF NOT EXISTS idx_decisions_decision ON decisions (decision, id);
+CREATE INDEX IF NOT EXISTS idx_decisions_ts ON decisions (ts);
+CREATE TRIGGER IF NOT EXISTS decisions_no_update BEFORE UPDATE ON decisions
+BEGIN SELECT RAISE(ABORT, 'audit log is append-only'); END;
+CREATE TRIGGER IF NOT EXISTS decisions_no_delete BEFORE DELETE ON decisions
+BEGIN SELECT RAISE(ABORT, 'audit log is append-only'); END;
+CREATE TABLE IF NOT EXISTS outcomes (
+    decision_id INTEGER PRIMARY KEY REFERENCES decisions (id),
+    defaulted INTEGER NOT NULL,
+    ts REAL NOT NULL
+);
+CREATE TRIGGER IF NOT EXISTS outcomes_no_update BEFORE UPDATE ON outcomes
+BEGIN SELECT RAISE(ABORT, 'audit log is append-only'); END;
+CREATE TRIGGER IF NOT EXISTS outcomes_no_delete BEFORE DELETE ON outcomes
+BEGIN SELECT RAISE(ABORT, 'audit log is append-only'); END;
+"""
+
+_INSERT = (
+    "INSERT INTO decisions (ts, endpoint, application_id, decision, risk_probability, risk_level, "
+    "model_version, request, response) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+
+_SUMMARY_COLUMNS = "id, ts, endpoint, application_id, decision, risk_probability, risk_level, model_version"
+
+MAX_PAGE_SIZE = 500
+
+_STOP = object()
+
+
+class AuditLog:
+    def __init__(self, path, max_queue=10000, batch_size=500, flush_interval=0.2):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+        self.written = 0
+        self.batches = 0
+        self.dropped = 0
+        self.errors = 0
+        self.last_error = None
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # Safe with WAL: a crash can lose the last commits but never corrupts the file
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _create_schema(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        conn = self._connect()
+        conn.executescript(_SCHEMA)
+        conn.close()
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._create_schema()
+            self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=10):
+        """Flushes everything queued so far and stops the writer."""
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is not None and thread.is_alive():
+            self._queue.put(_STOP)
+            thread.join(timeout)
+
+    def record(self, endpoint, decision, risk_probability=None, risk_level=None,
+               application_id=None, model_version=None, request=None, response=None):
+        """
+        Queues one decision. Never blocks and never raises: when the queue is
+        full the record is dropped and counted. Returns whether it was queued.
+        """
+        item = (time.time(), endpoint, application_id, decision, risk_probability, risk_level,
+                model_version, request, response)
+        return self._put(item, 1)
+
+    def record_many(self, endpoint, records):
+        """
+        Queues the decisions of one bulk request as a single queue item, so a
+        large batch takes one slot instead of one per row. `records` are
+        (decision, risk_probability, risk_level, application_id,
+        model_version, request, response) tuples. Returns whether they were queued.
+        """
+        ts = time.time()
+        item = [(ts, endpoint, application_id, decision, prob, level, version, request, response)
+                for decision, prob, level, application_id, version, request, response in records]
+        return self._put(item, len(item)) if item else True
+
+    def _put(self, item, n):
+        try:
+            self._queue.put_nowait(item)
+            return True
+        except queue.Full:
+            self.dropped += n
+            audit_dropped.inc(amount=n)
+            print(f"Audit queue full, dropped {n} decision(s)")
+            return False
+
+    def _run(self):
+        conn = self._connect()
+        try:
+            while True:
+                try:
+                    batch = [self._queue.get(timeout=self.flush_interval)]
+                except queue.Empty:
+                    continue
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                stop = any(item is _STOP for item in batch)
+                self._write(conn, _records(batch))
+                if stop:
+                    # Drain whatever arrived before the stop request
+                    rest = []
+                    while True:
+                        try:
+                            item = self._queue.get_nowait()
+                        except queue.Empty:
+                            break
+                        rest.append(item)
+                    self._write(conn, _records(rest))
+                    return
+        finally:
+            conn.close()
+
+    def _write(self, conn, batch):
+        if not batch:
+            return
+        # JSON encoding happens here, off the request path
+        rows = [
+            (ts, endpoint, application_id, decision,
+             float(prob) if prob is not None else None, level, version,
+             json.dumps(request, default=str) if request is not None else None,
+             json.dumps(response, default=str) if response is not None else None)
+            for ts, endpoint, application_id, decision, prob, level, version, request, response in batch
+        ]
+        try:
+            # A bulk request arrives as one queue item; keep transactions to batch_size rows
+            for start in range(0, len(rows), self.batch_size):
+                with conn:
+                    conn.executemany(_INSERT, rows[start:start + self.batch_size])
+                self.written += len(rows[start:start + self.batch_size])
+                self.batches += 1
+        except sqlite3.Error as e:
+            self.errors += 1
+            self.last_error = str(e)
+            print(f"Audit write failed ({len(rows)} records): {e}")
+
+    def _reader(self):
+        # One read connection per thread (sqlite3 connections are thread-bound)
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self._create_schema()
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def query(self, application_id=None, decision=None, endpoint=None, since=None, until=None,
+              limit=50, cursor=None):
+        """
+        Newest-first page of decisions matching the filters. `since`/`until`
+        are unix timestamps; `cursor` is the `next_cursor` of the previous page
+        (keyset pagination on id, so deep pages cost the same as the first).
+        Returns (items, next_cursor).
+        """
+        where, params = self._filters(application_id, decision, endpoint, since, until)
+        if cursor is not None:
+            where.append("id < ?")
+            params.append(int(cursor))
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        sql = f"SELECT {_SUMMARY_COLUMNS} FROM decisions"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY id DESC LIMIT ?"
+        rows = self._reader().execute(sql, params + [limit + 1]).fetchall()
+        next_cursor = rows[limit - 1]["id"] if len(rows) > limit else None
+        return [_summary(row) for row in rows[:limit]], next_cursor
+
+    def get(self, record_id):
+        """Full record including the request and response payloads, or None."""
+        row = self._reader().execute("SELECT * FROM decisions WHERE id = ?", (int(record_id),)).fetchone()
+        if row is None:
+            return None
+        record = _summary(row)
+        record["request"] = json.loads(row["request"]) if row["request"] else None
+        record["response"] = json.loads(row["response"]) if row["response"] else None
+        return record
+
+    def summary(self, endpoint=None, since=None, until=None):
+        """Number of decisions per decision value."""
+        where, params = self._filters(None, None, endpoint, since, until)
+        sql = "SELECT decision, COUNT(*) FROM decisions"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " GROUP BY decision"
+        counts = dict(self._reader().execute(sql, params).fetchall())
+        return {"total": sum(counts.values()), "by_decision": counts}
+
+    def record_outcomes(self, outcomes):
+        """
+        Stores observed outcomes for audited decisions. `outcomes` holds
+        (decision_id, application_id, defaulted) tuples; an application_id
+        refers to its latest decision. Each decision takes one outcome, so
+        re-sent outcomes are ignored. Returns one (status, decision) pair per
+        item: status is "recorded", "duplicate" or "not_found" and decision
+        the audited row (with its request) when found.
+        """
+        conn = self._connect()
+        conn.row_factory = sqlite3.Row
+        results = []
+        try:
+            with conn:
+                for decision_id, application_id, defaulted in outcomes:
+                    if decision_id is not None:
+                        row = conn.execute("SELECT * FROM decisions WHERE id = ?", (int(decision_id),)).fetchone()
+                    else:
+                        row = conn.execute(
+                            "SELECT * FROM decisions WHERE application_id = ? ORDER BY id DESC LIMIT 1",
+                            (application_id,)
+                        ).fetchone()
+                    if row is None:
+                        results.append(("not_found", None))
+                        continue
+                    inserted = conn.execute(
+                        "INSERT OR IGNORE INTO outcomes (decision_id, defaulted, ts) VALUES (?, ?, ?)",
+                        (row["id"], int(bool(defaulted)), time.time())
+                    ).rowcount
+                    decision = _summary(row)
+                    decision["request"] = json.loads(row["request"]) if row["request"] else None
+                    results.append(("recorded" if inserted else "duplicate", decision))
+        finally:
+            conn.close()
+        return results
+
+    def outcome_histogram(self, n_bins):
+        """
+        Labelled outcomes aggregated per (endpoint, model_version, score bin):
+        rows of (endpoint, model_version, bin, defaulted, repaid).
+        """
+        sql = (
+            "SELECT d.endpoint, d.model_version, MIN(CAST(d.risk_probability * ? AS INTEGER), ?) AS bin, "
+            "SUM(o.defaulted), SUM(1 - o.defaulted) "
+            "FROM outcomes o JOIN decisions d ON d.id = o.decision_id "
+            "WHERE d.risk_probability IS NOT NULL GROUP BY 1, 2, 3"
+        )
+        return self._reader().execute(sql, (n_bins, n_bins - 1)).fetchall()
+
+    @staticmethod
+    def _filters(application_id, decision, endpoint, since, until):
+        where, params = [], []
+        for column, value in (("application_id", application_id), ("decision", decision), ("endpoint", endpoint)):
+            if value is not None:
+                where.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            where.append("ts >= ?")
+            params.append(float(since))
+        if until is not None:
+            where.append("ts < ?")
+            params.append(float(until))
+        return where, params
+
+    def stats(self):
+        return {
+            "enabled": config.AUDIT_ENABLED,
+            "path": self.path,
+            "running": self._thread is not None and self._thread.is_alive(),
+            "queued": self._queue.qsize(),
+            "max_queue": self._queue.maxsize,
+            "written": self.written,
+            "batches": self.batches,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "last_error": self.last_error,
+        }
+
+
+def _records(items):
+    # Queue items (single records and bulk lists) as one list of records
+    records = []
+    for item in items:
+        if isinstance(item, list):
+            records.extend(item)
+        elif item is not _STOP:
+            records.append(item)
+    return records
+
+
+def _summary(row):
+    return {
+        "id": row["id"],
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(row["ts"])) + f".{int(row['ts'] % 1 * 1000):03d}Z",
+        "endpoint": row["endpoint"],
+        "application_id": row["application_id"],
+        "decision": row["decision"],
+        "risk_probability": row["risk_probability"],
+        "risk_level": row["risk_level"],
+        "model_version": row["model_version"],
+    }
+
+
+audit_log = AuditLog(
+    config.AUDIT_DB_PATH,
+    max_queue=config.AUDIT_MAX_QUEUE,
+    batch_size=config.AUDIT_BATCH_SIZE,
+    flush_interval=config.AUDIT_FLUSH_INTERVAL_MS / 1000.0,
+)
+
+
+def audit_decision(*args, **kwargs):
+    if config.AUDIT_ENABLED:
+        audit_log.record(*args, **kwargs)
+
+
+def audit_decisions(endpoint, records):
+    if config.AUDIT_ENABLED:
+        audit_log.record_many(endpoint, records)
@@ -0,0 +1,223 @@
+import asyncio
+import time
+import numpy as np
+
+from app.core import config
+from app.core.executor import DeadlineExceeded, Overloaded, model_executor
+from app.core.metrics import batch_size, batch_wait, model_rejections
+
+# Micro-batching scheduler for single-row scoring.
+#
+# Concurrent /predict and /what-if calls each used to make their own tiny
+# predict_proba + SHAP call. The batcher collects rows for up to a short window
+# (or until the batch is full), scores them with one vectorized call per
+# explanation tier and resolves each waiting request with its own row. Batches
+# run on the model executor, up to one per executor worker at a time; while
+# all are busy the next batch keeps filling. Rows whose deadline passed while
+# queued are dropped before scoring.
+
+# Upper bounds of the batch-size histogram buckets
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+class BatcherOverloaded(Overloaded):
+    """Raised when the scoring queue is full; the caller should shed the request."""
+
+
+class MicroBatcher:
+    def __init__(self, score_fn, window_ms=2.0, max_batch_size=64, max_queue=1024, max_inflight=1):
+        # async score_fn(X, explain, deadline=...) -> (probs, top) as returned by CreditModel.score
+        self.score_fn = score_fn
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max_batch_size
+        self.max_queue = max_queue
+        self.max_inflight = max(1, max_inflight)
+        self._inflight = set()
+
+        self._queue = None
+        self._task = None
+        self._loop = None
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.batches = 0
+        self.items = 0
+        self.rejected = 0
+        self.errors = 0
+        self.expired = 0
+        self.max_batch_seen = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.size_histogram = [0] * (len(BATCH_SIZE_BUCKETS) + 1)
+
+    def _ensure_started(self):
+        # The worker is bound to the running event loop; (re)start it lazily so
+        # the batcher also works under test clients that create their own loop.
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+            self._slots = asyncio.Semaphore(self.max_inflight)
+            self._task = loop.create_task(self._run())
+
+    async def stop(self):
+        tasks = [t for t in [self._task, *self._inflight] if t is not None]
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        self._inflight.clear()
+
+    async def submit(self, row, explain="exact", deadline=None):
+        """
+        Queues one feature row (training column order) and waits for its result.
+        Returns (prob, factors) where factors is (indices, values) or None.
+        `deadline` is a time.monotonic() value; past it the row is dropped
+        and DeadlineExceeded raised.
+        """
+        self._ensure_started()
+        future = self._loop.create_future()
+        try:
+            self._queue.put_nowait((row, explain, future, time.perf_counter(), deadline))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            model_rejections.inc("queue_full")
+            raise BatcherOverloaded("Scoring queue is full")
+        if deadline is None:
+            return await future
+        try:
+            return await asyncio.wait_for(future, max(deadline - time.monotonic(), 0.0))
+        except asyncio.TimeoutError:
+            model_rejections.inc("deadline")
+            raise DeadlineExceeded("Scoring did not finish before the request deadline")
+
+    async def _run(self):
+        while True:
+            # Wait for a free executor slot first, so rows keep accumulating
+            # into the next batch while every slot is busy
+            await self._slots.acquire()
+            batch = [await self._queue.get()]
+            deadline = self._loop.time() + self.window
+            while len(batch) < self.max_batch_size:
+                # Take whatever is already queued without yielding
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                timeout = deadline - self._loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            task = self._loop.create_task(self._dispatch(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._dispatched)
+
+    def _dispatched(self, task):
+        self._inflight.discard(task)
+        self._slots.release()
+
+    async def _dispatch(self, batch):
+        now = time.perf_counter()
+        self._record(batch, now)
+
+        groups = {}
+        current = time.monotonic()
+        for item in batch:
+            if item[2].done():  # client went away or timed out
+                continue
+            if item[4] is not None and item[4] < current:
+                self.expired += 1
+                model_rejections.inc("deadline")
+                item[2].set_exception(DeadlineExceeded("Deadline passed while queued"))
+                continue
+            groups.setdefault(item[1], []).append(item)
+
+        for explain, items in groups.items():
+            X = np.array([item[0] for item in items], dtype=np.float32)
+            # The batch is worth scoring until its last row's deadline
+            deadlines = [item[4] for item in items]
+            deadline = None if None in deadlines else max(deadlines)
+            try:
+                probs, top = await self.score_fn(X, explain, deadline=deadline)
+            except Exception as e:
+                self.errors += 1
+                for item in items:
+                    if not item[2].done():
+                        item[2].set_exception(e)
+                continue
+
+            for i, item in enumerate(items):
+                future = item[2]
+                if future.done():  # client went away
+                    continue
+                factors = (top[0][i], top[1][i]) if top is not None else None
+                future.set_result((probs[i], factors))
+
+    def _record(self, batch, now):
+        size = len(batch)
+        self.batches += 1
+        self.items += size
+        self.max_batch_seen = max(self.max_batch_seen, size)
+        for i, bound in enumerate(BATCH_SIZE_BUCKETS):
+            if size <= bound:
+                self.size_histogram[i] += 1
+                break
+        else:
+            self.size_histogram[-1] += 1
+        batch_size.observe(size)
+        for item in batch:
+            wait = now - item[3]
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+            batch_wait.observe(wait)
+
+    def stats(self):
+        labels = [f"<={b}" for b in BATCH_SIZE_BUCKETS] + [f">{BATCH_SIZE_BUCKETS[-1]}"]
+        return {
+            "enabled": config.MICROBATCH_ENABLED,
+            "window_ms": self.window * 1000.0,
+            "max_batch_size": self.max_batch_size,
+            "max_queue": self.max_queue,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "batches": self.batches,
+            "items": self.items,
+            "rejected": self.rejected,
+            "errors": self.errors,
+            "expired": self.expired,
+            "max_inflight": self.max_inflight,
+            "inflight": len(self._inflight),
+            "mean_batch_size": self.items / self.batches if self.batches else 0.0,
+            "max_batch_size_seen": self.max_batch_seen,
+            "batch_size_histogram": dict(zip(labels, self.size_histogram)),
+            "mean_wait_ms": self.wait_total / self.items * 1000.0 if self.items else 0.0,
+            "max_wait_ms": self.wait_max * 1000.0,
+        }
+
+
+prediction_batcher = MicroBatcher(
+    model_executor.score,
+    window_ms=config.MICROBATCH_WINDOW_MS,
+    max_batch_size=config.MICROBATCH_MAX_SIZE,
+    max_queue=config.MICROBATCH_MAX_QUEUE,
+    max_inflight=model_executor.workers,
+)
+
+
+async def score_row(row, explain="exact"):
+    """
+    Scores a single feature row, through the micro-batcher when enabled.
+    Returns (prob, factors) with factors = (indices, values) or None.
+    """
+    deadline = model_executor.deadline()
+    if config.MICROBATCH_ENABLED:
+        return await prediction_batcher.submit(row, explain, deadline)
+
+    X = np.array([row], dtype=np.float32)
+    probs, top = await model_executor.score(X, explain, deadline=deadline)
+    return probs[0], ((top[0][0], top[1][0]) if top is not None else None)
@@ -0,0 +1,198 @@
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import numpy as np
+from app.core.forest import ARRAY_FIELDS, CompiledForest, verify_parity
+from app.core.drift import DRIFT_FILE
+from app.core.evaluation import EVALUATION_FILE
+
+# Versioned model bundle: a directory that replaces the pickled XGBClassifier.
+#
+#   metadata.json   format version, model version, training data hash, metrics,
+#                   SHAP expected value, native-engine parameters (written last)
+#   schema.json     ordered feature schema the model was trained on
+#   booster.ubj     native XGBoost booster (UBJSON), for large batches and SHAP
+#   evaluation.json optional hold-out evaluation report (app/core/evaluation.py)
+#   drift_reference.json  optional training histograms for drift (app/core/drift.py)
+#   trees/*.npy     flattened tree arrays, opened with np.load(mmap_mode="r") so
+#                   every worker process shares them through the page cache
+#
+# Loading a bundle only parses two small JSON files and maps the arrays, so the
+# native engine is ready in milliseconds; XGBoost and SHAP are loaded later.
+
+BUNDLE_FORMAT_VERSION = 1
+METADATA_FILE = "metadata.json"
+SCHEMA_FILE = "schema.json"
+BOOSTER_FILE = "booster.ubj"
+TREES_DIR = "trees"
+
+
+class ModelBundle:
+    def __init__(self, path, forest, schema, metadata):
+        self.path = path
+        self.forest = forest
+        self.schema = schema
+        self.metadata = metadata
+
+    @property
+    def features(self):
+        return self.schema["features"]
+
+    @property
+    def fill_values(self):
+        # Training replacements for missing inputs; empty for older bundles
+        return self.schema.get("fill_values", {})
+
+    @property
+    def iteration_range(self):
+        return tuple(self.metadata["iteration_range"])
+
+    def load_booster(self):
+        import xgboost as xgb
+        booster = xgb.Booster()
+        booster.load_model(os.path.join(self.path, BOOSTER_FILE))
+        return booster
+
+
+def is_bundle(path):
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, METADATA_FILE))
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def export_bundle(model, out_dir, target=None, training_data_hash=None, metrics=None, extra_metadata=None,
+                  evaluation=None, drift_reference=None, fill_values=None):
+    """
+    Writes a fitted XGBClassifier as a model bundle. The bundle is assembled in
+    a temporary directory next to `out_dir` and renamed into place, so a server
+    watching `out_dir` never sees a half-written bundle. `evaluation` is an
+    evaluation_report() and `drift_reference` a reference_histograms() of the
+    training data, both stored with the model. `fill_values` maps features to
+    the values training used for missing entries. Returns the metadata.
+    """
+    import xgboost as xgb
+    import shap
+
+    booster = model.get_booster()
+    best_iteration = getattr(model, "best_iteration", None)
+    n_rounds = booster.num_boosted_rounds()
+    iteration_range = (0, best_iteration + 1) if best_iteration is not None else (0, n_rounds)
+
+    forest = CompiledForest.from_booster(booster, iteration_range)
+    mismatches = verify_parity(forest, lambda X: model.predict_proba(X)[:, 1])
+    expected_value = np.ravel(shap.TreeExplainer(booster).expected_value).astype(float).tolist()
+
+    out_dir = os.path.abspath(out_dir)
+    parent = os.path.dirname(out_dir)
+    os.makedirs(parent, exist_ok=True)
+    tmp = tempfile.mkdtemp(prefix=".bundle-", dir=parent)
+    os.chmod(tmp, 0o755)  # mkdtemp creates it private
+    try:
+        booster.save_model(os.path.join(tmp, BOOSTER_FILE))
+        os.makedirs(os.path.join(tmp, TREES_DIR))
+        for name, array in forest.arrays().items():
+            np.save(os.path.join(tmp, TREES_DIR, f"{name}.npy"), np.ascontiguousarray(array))
+
+        schema = {
+            "features": list(booster.feature_names),
+            "dtype": "float32",
+            "target": target,
+            "fill_values": fill_values or {},
+        }
+        metadata = {
+            "format_version": BUNDLE_FORMAT_VERSION,
+            # Hash of the booster identifies the model (cache keys, reports)
+            "model_version": file_sha256(os.path.join(tmp, BOOSTER_FILE))[:16],
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "xgboost_version": xgb.__version__,
+            "python_version": sys.version.split()[0],
+            "objective": "binary:logistic",
+            "iteration_range": list(iteration_range),
+            "n_trees": forest.n_trees,
+            "n_nodes": int(len(forest.feature)),
+            "max_depth": forest.max_depth,
+            "base_margin": float(forest.base_margin),
+            "native_parity_mismatches": mismatches,
+            "shap_expected_value": expected_value,
+            "training_data_hash": training_data_hash,
+            "metrics": metrics or {},
+            "params": {k: v for k, v in model.get_params().items() if isinstance(v, (int, float, str, bool))},
+        }
+        if extra_metadata:
+            metadata.update(extra_metadata)
+
+        with open(os.path.join(tmp, SCHEMA_FILE), "w") as f:
+            json.dump(schema, f, indent=2)
+        if evaluation is not None:
+            # Keyed by the model it was computed for
+            with open(os.path.join(tmp, EVALUATION_FILE), "w") as f:
+                json.dump({"model_version": metadata["model_version"], **evaluation}, f, indent=2)
+        if drift_reference is not None:
+            with open(os.path.join(tmp, DRIFT_FILE), "w") as f:
+                json.dump(drift_reference, f)
+        # metadata.json is written last: its presence marks a complete bundle
+        with open(os.path.join(tmp, METADATA_FILE), "w") as f:
+            json.dump(metadata, f, indent=2)
+
+        if os.path.exists(out_dir):
+            old = tempfile.mkdtemp(prefix=".bundle-old-", dir=parent)
+            os.rename(out_dir, os.path.join(old, "bundle"))
+            os.rename(tmp, out_dir)
+            # Open memory maps of the old files stay valid after unlinking
+            shutil.rmtree(old, ignore_errors=True)
+        else:
+            os.rename(tmp, out_dir)
+    except Exception:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    return metadata
+
+
+def load_bundle(path, mmap=True):
+    """Maps a bundle written by export_bundle. Does not import XGBoost."""
+    with open(os.path.join(path, METADATA_FILE)) as f:
+        metadata = json.load(f)
+    if metadata.get("format_version") != BUNDLE_FORMAT_VERSION:
+        raise ValueError(f"Unsupported model bundle format: {metadata.get('format_version')}")
+    with open(os.path.join(path, SCHEMA_FILE)) as f:
+        schema = json.load(f)
+
+    mode = "r" if mmap else None
+    arrays = {
+        name: np.load(os.path.join(path, TREES_DIR, f"{name}.npy"), mmap_mode=mode)
+        for name in ARRAY_FIELDS
+    }
+    forest = CompiledForest(
+        **arrays,
+        base_margin=metadata["base_margin"],
+        max_depth=metadata["max_depth"],
+        feature_names=schema["features"],
+    )
+    return ModelBundle(path, forest, schema, metadata)
+
+
+if __name__ == "__main__":
+    # Convert an existing pickled model: python -m app.core.bundle model.pkl out_dir
+    import argparse
+    import joblib
+
+    parser = argparse.ArgumentParser(description="Convert a pickled XGBClassifier into a model bundle")
+    parser.add_argument("model_pkl")
+    parser.add_argument("out_dir")
+    parser.add_argument("--fill-values", type=json.loads, default=None,
+                        help='Missing-value replacements used in training, e.g. '
+                             '\'{"MonthlyIncome": 5400, "NumberOfDependents": 0}\'')
+    args = parser.parse_args()
+
+    meta = export_bundle(joblib.load(args.model_pkl), args.out_dir, fill_values=args.fill_values)
+    print(f"Wrote bundle {args.out_dir} (version {meta['model_version']}, {meta['n_trees']} trees)")
@@ -0,0 +1,226 @@
+import io
+import json
+import numpy as np
+
+from app.core.features import FEATURES, FIELD_ALIASES, FIELDS, column_name
+
+# Columnar payloads for bulk scoring.
+#
+# /predict/batch takes a JSON array of objects and validates every row with
+# Pydantic, which dominates its cost for large batches. The columnar formats
+# carry one array per feature instead: each column is converted to NumPy and
+# checked in one pass (nulls, numbers, integral values for integer fields) and
+# the columns are stacked straight into the model's float64 matrix. A bad
+# value only fails its own row; a payload that can't be read at all (bad
+# JSON/Arrow, a missing column, ragged lengths) raises PayloadError.
+#
+#   JSON    {"columns": {"age": [...], "DebtRatio": [...], ...}}
+#   Arrow   IPC stream (one or more record batches) with the same columns
+#   NDJSON  one application object per line, read and scored in chunks
+#
+# Columns may use the API field names or the training column names.
+
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+NDJSON = "application/x-ndjson"
+
+
+class PayloadError(ValueError):
+    """The payload as a whole can't be read; nothing in it is scored."""
+
+
+# Marks a field absent from an NDJSON row (None is an explicit null)
+_MISSING = object()
+
+
+def _message(integer, reason):
+    kind = "integer" if integer else "number"
+    if reason == "missing":
+        return "Field required"
+    if reason == "fraction":
+        return "Input should be a valid integer, got a number with a fractional part"
+    if reason == "infinite":
+        return "Input should be a finite number"
+    return f"Input should be a valid {kind}"
+
+
+def _slow_column(values):
+    """float64 column from a list with strings, nulls or absent values; NaN plus a reason where invalid."""
+    out = np.empty(len(values), dtype=np.float64)
+    bad = {}
+    for i, v in enumerate(values):
+        if v is _MISSING:
+            bad[i] = "missing"
+        elif v is None or isinstance(v, (dict, list)):
+            bad[i] = "type"
+        else:
+            # Numeric strings pass, as in the per-row API's lax validation
+            try:
+                out[i] = float(v)
+                continue
+            except (TypeError, ValueError):
+                bad[i] = "type"
+        out[i] = np.nan
+    return out, bad
+
+
+def _column(values, null_mask=None):
+    """float64 column plus {row: reason} for the rows that can't be used."""
+    if isinstance(values, np.ndarray) and values.dtype.kind in "fiu":
+        column = values.astype(np.float64, copy=False)
+        bad = {}
+    else:
+        try:
+            column = np.array(values, dtype=np.float64)
+            bad = {}
+        except (TypeError, ValueError):
+            column, bad = _slow_column(values)
+        if column.ndim != 1:
+            column, bad = _slow_column(values)
+    # Nulls (JSON null, Arrow null, NaN) are rejected like the per-row API does
+    missing = np.isnan(column)
+    if null_mask is not None:
+        missing |= null_mask
+    for i in np.flatnonzero(missing):
+        bad.setdefault(int(i), "type")
+    return column, bad
+
+
+def validate_columns(columns, integer_fields, null_masks=None):
+    """
+    Checks a mapping of field/column name -> values (lists or 1-D arrays).
+    Returns (X, errors): the float64 matrix in model column order and
+    {row: [{"field", "message"}]} for the rows that must not be scored
+    (their values in X are undefined).
+    """
+    by_column = {}
+    for name, values in columns.items():
+        by_column[column_name(name)] = (name, values)
+    missing = [f for f, c in zip(FIELDS, FEATURES) if c not in by_column]
+    if missing:
+        raise PayloadError(f"Missing columns: {', '.join(missing)}")
+
+    lengths = {len(by_column[c][1]) for c in FEATURES}
+    if len(lengths) != 1:
+        raise PayloadError(f"Columns have different lengths: {sorted(lengths)}")
+    n = lengths.pop()
+
+    X = np.empty((n, len(FEATURES)), dtype=np.float64)
+    errors = {}
+    for j, (field, feature) in enumerate(zip(FIELDS, FEATURES)):
+        name, values = by_column[feature]
+        column, bad = _column(values, (null_masks or {}).get(name))
+        integer = field in integer_fields
+        if integer:
+            finite = np.isfinite(column)
+            for i in np.flatnonzero(~finite & ~np.isnan(column)):
+                bad.setdefault(int(i), "infinite")
+            for i in np.flatnonzero(finite & (column != np.trunc(column))):
+                bad.setdefault(int(i), "fraction")
+        for i, reason in bad.items():
+            errors.setdefault(i, []).append({"field": field, "message": _message(integer, reason)})
+        X[:, j] = column
+    return X, dict(sorted(errors.items()))
+
+
+def read_json_columns(body):
+    """The "columns" mapping of a columnar JSON body."""
+    try:
+        payload = json.loads(body)
+    except ValueError as e:
+        raise PayloadError(f"Invalid JSON: {e}")
+    columns = payload.get("columns") if isinstance(payload, dict) else None
+    if not isinstance(columns, dict) or not all(isinstance(v, list) for v in columns.values()):
+        raise PayloadError('Expected {"columns": {"<feature>": [values, ...], ...}}')
+    return columns
+
+
+def read_arrow_columns(body):
+    """(columns, null masks) of an Arrow IPC stream; numeric columns only."""
+    try:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+    except ImportError:
+        raise PayloadError("Arrow payloads require pyarrow on the server")
+    try:
+        table = pa.ipc.open_stream(body).read_all()
+    except (pa.ArrowInvalid, OSError) as e:
+        raise PayloadError(f"Invalid Arrow IPC stream: {e}")
+
+    wanted = set(FEATURES)
+    columns, masks = {}, {}
+    for name in table.column_names:
+        if column_name(name) not in wanted:
+            continue
+        column = table.column(name)
+        if not (pa.types.is_integer(column.type) or pa.types.is_floating(column.type)):
+            raise PayloadError(f"Column {name} must be numeric, got {column.type}")
+        if column.null_count:
+            masks[name] = column.is_null().to_numpy(zero_copy_only=False)
+            column = pc.fill_null(column, 0)
+        # No copy for a single-chunk float64 column without nulls
+        columns[name] = pc.cast(column, pa.float64()).to_numpy()
+    return columns, masks
+
+
+def read_ndjson_rows(lines):
+    """
+    Columns of a chunk of NDJSON lines (bytes), plus errors for lines that
+    aren't JSON objects: (columns, {row: [{"field", "message"}]}).
+    """
+    rows = []
+    errors = {}
+    for i, line in enumerate(lines):
+        try:
+            row = json.loads(line)
+            if not isinstance(row, dict):
+                errors[i] = [{"field": "", "message": "Input should be a valid dictionary"}]
+        except ValueError as e:
+            errors[i] = [{"field": "", "message": f"Invalid JSON: {e}"}]
+        rows.append({} if i in errors else row)
+
+    columns = {}
+    for field, feature in zip(FIELDS, FEATURES):
+        if field in FIELD_ALIASES:
+            # Either spelling of the renamed columns
+            columns[field] = [r.get(field, r.get(feature, _MISSING)) for r in rows]
+        else:
+            columns[field] = [r.get(field, _MISSING) for r in rows]
+    return columns, errors
+
+
+def json_columns(columns, valid):
+    """Result columns as JSON lists, null for rows that weren't scored (and for NaN)."""
+    out = {}
+    for name, values in columns.items():
+        values = np.asarray(values)
+        keep = valid
+        if values.dtype.kind == "f":
+            keep = keep & ~np.isnan(values)
+        elif values.dtype.kind == "O":
+            keep = keep & np.not_equal(values, None)
+        listed = values.tolist()
+        for i in np.flatnonzero(~keep):
+            listed[i] = None
+        out[name] = listed
+    return out
+
+
+def encode_arrow(columns, valid):
+    """Result columns as an Arrow IPC stream, null for rows that weren't scored."""
+    import pyarrow as pa
+
+    arrays = {}
+    for name, values in columns.items():
+        values = np.asarray(values)
+        mask = ~valid
+        if values.dtype.kind in "OU":
+            if values.dtype.kind == "O":
+                mask = mask | np.equal(values, None)
+            arrays[name] = pa.array(values, type=pa.string(), mask=mask)
+        else:
+            arrays[name] = pa.array(values, mask=mask)
+    table = pa.table(arrays)
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
@@ -0,0 +1,96 @@
+import os
+
+# Runtime configuration, read from environment variables so the same image can
+# be tuned per deployment.
+
+MODEL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "model")
+
+# Model artifact served by the API: a bundle directory (app/core/bundle.py) or a
+# pickled XGBClassifier. Defaults to app/model/bundle when present, else model.pkl.
+MODEL_PATH = os.environ.get(
+    "CREDIT_MODEL_PATH",
+    os.path.join(MODEL_DIR, "bundle") if os.path.isdir(os.path.join(MODEL_DIR, "bundle"))
+    else os.path.join(MODEL_DIR, "model.pkl"),
+)
+
+# Seconds between checks of MODEL_PATH for changes (hot reload); 0 disables
+MODEL_WATCH_INTERVAL = float(os.environ.get("CREDIT_MODEL_WATCH_INTERVAL", "5"))
+
+# Shared secret for /admin endpoints (X-Admin-Token header); empty = no check
+ADMIN_TOKEN = os.environ.get("CREDIT_ADMIN_TOKEN", "")
+
+# "native" scores with the compiled tree arrays (app/core/forest.py),
+# "xgboost" always goes through the XGBClassifier wrapper.
+INFERENCE_ENGINE = os.environ.get("CREDIT_INFERENCE_ENGINE", "native")
+
+# Batches larger than this are handed to XGBoost, whose multithreaded
+# predictor is faster once the per-call overhead is amortised.
+NATIVE_MAX_ROWS = int(os.environ.get("CREDIT_NATIVE_MAX_ROWS", "256"))
+
+# Micro-batching of concurrent /predict and /what-if calls (app/core/batcher.py)
+MICROBATCH_ENABLED = os.environ.get("CREDIT_MICROBATCH_ENABLED", "1") == "1"
+MICROBATCH_WINDOW_MS = float(os.environ.get("CREDIT_MICROBATCH_WINDOW_MS", "2"))
+MICROBATCH_MAX_SIZE = int(os.environ.get("CREDIT_MICROBATCH_MAX_SIZE", "64"))
+MICROBATCH_MAX_QUEUE = int(os.environ.get("CREDIT_MICROBATCH_MAX_QUEUE", "1024"))
+
+# Early-exit decision index for /predict/decision (app/core/forest.py); off
+# scores every tree and buckets the probability
+DECISION_INDEX_ENABLED = os.environ.get("CREDIT_DECISION_INDEX_ENABLED", "1") == "1"
+
+# Per-row prediction/explanation cache (CreditModel.score); 0 disables it
+CACHE_MAX_SIZE = int(os.environ.get("CREDIT_CACHE_MAX_SIZE", "10000"))
+# Entry lifetime in seconds; 0 keeps entries until evicted or the model reloads
+CACHE_TTL_SECONDS = float(os.environ.get("CREDIT_CACHE_TTL_SECONDS", "0"))
+
+# Server-side decision audit log (app/core/audit.py)
+AUDIT_ENABLED = os.environ.get("CREDIT_AUDIT_ENABLED", "1") == "1"
+AUDIT_DB_PATH = os.environ.get(
+    "CREDIT_AUDIT_DB_PATH",
+    os.path.join(os.path.dirname(MODEL_DIR), "data", "audit.db"),
+)
+# Queued writes (one per decision, or one per bulk request); further records are dropped (and counted)
+AUDIT_MAX_QUEUE = int(os.environ.get("CREDIT_AUDIT_MAX_QUEUE", "10000"))
+AUDIT_BATCH_SIZE = int(os.environ.get("CREDIT_AUDIT_BATCH_SIZE", "500"))
+AUDIT_FLUSH_INTERVAL_MS = float(os.environ.get("CREDIT_AUDIT_FLUSH_INTERVAL_MS", "200"))
+
+# Streaming fairness metrics (app/core/fairness.py): length of one tumbling
+# window, and how many of them make up the sliding window
+FAIRNESS_BUCKET_SECONDS = float(os.environ.get("CREDIT_FAIRNESS_BUCKET_SECONDS", "3600"))
+FAIRNESS_SLIDING_BUCKETS = int(os.environ.get("CREDIT_FAIRNESS_SLIDING_BUCKETS", "24"))
+
+# Prometheus metrics (app/core/metrics.py). Set a directory shared by all
+# uvicorn workers so /metrics reports their sum; empty keeps per-process metrics.
+METRICS_DIR = os.environ.get("CREDIT_METRICS_DIR", "")
+
+# Model execution layer (app/core/executor.py): "thread" or "process" workers,
+# how many, how many calls may wait beyond them before requests get 429, and
+# the per-request deadline after which a queued model call is dropped (503)
+MODEL_EXECUTOR = os.environ.get("CREDIT_MODEL_EXECUTOR", "thread")
+MODEL_WORKERS = int(os.environ.get("CREDIT_MODEL_WORKERS", str(min(4, os.cpu_count() or 1))))
+MODEL_MAX_QUEUE = int(os.environ.get("CREDIT_MODEL_MAX_QUEUE", "64"))
+MODEL_TIMEOUT_MS = float(os.environ.get("CREDIT_MODEL_TIMEOUT_MS", "2000"))
+# Retry-After (seconds) sent with 429/503 rejections
+RETRY_AFTER_SECONDS = int(os.environ.get("CREDIT_RETRY_AFTER_SECONDS", "1"))
+
+# Rows per model call for /predict/batch, /predict/columnar and /what-if/sweep and per chunk
+# of /predict/stream; each chunk is admitted (and gets its deadline) on its own
+BULK_CHUNK_ROWS = int(os.environ.get("CREDIT_BULK_CHUNK_ROWS", "1000"))
+
+# Challenger models shadow-scored on live /predict traffic (app/core/shadow.py):
+# comma-separated bundle/pickle paths, plus how the comparison worker batches
+CHALLENGER_PATHS = [p.strip() for p in os.environ.get("CREDIT_CHALLENGER_PATHS", "").split(",") if p.strip()]
+SHADOW_BATCH_SIZE = int(os.environ.get("CREDIT_SHADOW_BATCH_SIZE", "256"))
+SHADOW_INTERVAL_MS = float(os.environ.get("CREDIT_SHADOW_INTERVAL_MS", "200"))
+# Submissions queued for the worker before new ones are dropped (and counted)
+SHADOW_MAX_QUEUE = int(os.environ.get("CREDIT_SHADOW_MAX_QUEUE", "10000"))
+
+# Idempotent /apply by application_id (app/core/idempotency.py): "memory"
+# (per process) or "sqlite" (shared by the workers on one host), how many
+# results are kept and for how long
+IDEMPOTENCY_BACKEND = os.environ.get("CREDIT_IDEMPOTENCY_BACKEND", "memory")
+IDEMPOTENCY_DB_PATH = os.environ.get(
+    "CREDIT_IDEMPOTENCY_DB_PATH",
+    os.path.join(os.path.dirname(MODEL_DIR), "data", "idempotency.db"),
+)
+IDEMPOTENCY_MAX_SIZE = int(os.environ.get("CREDIT_IDEMPOTENCY_MAX_SIZE", "100000"))
+IDEMPOTENCY_TTL_SECONDS = float(os.environ.get("CREDIT_IDEMPOTENCY_TTL_SECONDS", "86400"))
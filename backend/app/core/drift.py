@@ -0,0 +1,197 @@
+import threading
+import time
+from bisect import bisect_right
+import numpy as np
+
+# Feature drift of live /predict traffic against the training distribution.
+#
+# At training time every feature gets a reference histogram: bin edges at the
+# training quantiles (quantile bins cope with heavy tails such as MonthlyIncome
+# and DebtRatio) or, for low-cardinality count features, one bin per observed
+# value; plus a bin for missing values. The histograms ship in the model bundle
+# (drift_reference.json).
+#
+# Live rows are counted into the same bins. Each thread increments its own
+# shard (a plain list of ints), so the request path takes no lock and costs a
+# bisect and an increment per feature; /drift sums the shards and compares
+# them with the reference (PSI and a binned KS statistic).
+
+DRIFT_FILE = "drift_reference.json"
+
+REFERENCE_BINS = 20
+
+# Conventional PSI reading: < 0.1 stable, 0.1-0.25 moderate shift, above significant
+PSI_MODERATE = 0.1
+PSI_SIGNIFICANT = 0.25
+
+# Floor for empty bins so PSI stays finite
+_PSI_EPSILON = 1e-4
+
+
+def reference_histograms(X, feature_names, n_bins=REFERENCE_BINS):
+    """Reference histograms of a training matrix (rows x features), for the bundle."""
+    X = np.asarray(X, dtype=np.float64)
+    features = []
+    for f, name in enumerate(feature_names):
+        column = X[:, f]
+        present = column[~np.isnan(column)]
+        values = np.unique(present)
+        if len(values) <= 2 * n_bins:
+            # Few distinct values (counts, small integers): one bin per value
+            edges = values[1:]
+        else:
+            edges = np.unique(np.quantile(present, np.linspace(0, 1, n_bins + 1)[1:-1]))
+        counts = np.bincount(np.searchsorted(edges, present, side="right"), minlength=len(edges) + 1)
+        features.append({
+            "name": name,
+            "edges": edges.tolist(),
+            "counts": counts.tolist(),
+            "missing": int(len(column) - len(present)),
+        })
+    return {"rows": int(X.shape[0]), "features": features}
+
+
+class _LiveHistograms:
+    """Live counts for one reference (one model version)."""
+
+    def __init__(self, version, reference):
+        self.version = version
+        self.reference = reference
+        self.started_at = time.time()
+        self.names = [f["name"] for f in reference["features"]]
+        self.edges = [list(map(float, f["edges"])) for f in reference["features"]]
+        # Flat counter layout: per feature, len(edges) + 1 value bins then the missing bin
+        self.offsets = []
+        size = 0
+        for edges in self.edges:
+            self.offsets.append(size)
+            size += len(edges) + 2
+        self.size = size
+        self._local = threading.local()
+        self._shards = []
+        self._shards_lock = threading.Lock()
+
+    def _shard(self):
+        counts = getattr(self._local, "counts", None)
+        if counts is None:
+            counts = self._local.counts = [0] * self.size
+            with self._shards_lock:
+                self._shards.append(counts)
+        return counts
+
+    def add_row(self, row):
+        counts = self._shard()
+        for x, edges, offset in zip(row, self.edges, self.offsets):
+            if x != x:  # NaN
+                counts[offset + len(edges) + 1] += 1
+            else:
+                counts[offset + bisect_right(edges, x)] += 1
+
+    def add_rows(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        counts = self._shard()
+        for f, (edges, offset) in enumerate(zip(self.edges, self.offsets)):
+            column = X[:, f]
+            missing = np.isnan(column)
+            binned = np.bincount(np.searchsorted(edges, column[~missing], side="right"), minlength=len(edges) + 1)
+            for i, c in enumerate(binned.tolist()):
+                counts[offset + i] += c
+            counts[offset + len(edges) + 1] += int(missing.sum())
+
+    def totals(self):
+        with self._shards_lock:
+            shards = list(self._shards)
+        if not shards:
+            return np.zeros(self.size, dtype=np.int64)
+        # Other threads may be incrementing; a slightly stale read is fine
+        return np.sum(np.array(shards, dtype=np.int64), axis=0)
+
+
+def psi(expected, actual):
+    """Population stability index between two count vectors over the same bins."""
+    e = np.asarray(expected, dtype=np.float64)
+    a = np.asarray(actual, dtype=np.float64)
+    e = np.maximum(e / e.sum(), _PSI_EPSILON)
+    a = np.maximum(a / a.sum(), _PSI_EPSILON)
+    return float(np.sum((a - e) * np.log(a / e)))
+
+
+def binned_ks(expected, actual):
+    """Largest CDF gap between two histograms, measured at the bin edges."""
+    e = np.cumsum(expected, dtype=np.float64)
+    a = np.cumsum(actual, dtype=np.float64)
+    if e[-1] == 0 or a[-1] == 0:
+        return None
+    return float(np.max(np.abs(e / e[-1] - a / a[-1])))
+
+
+def _status(value):
+    if value is None:
+        return None
+    if value >= PSI_SIGNIFICANT:
+        return "significant"
+    if value >= PSI_MODERATE:
+        return "moderate"
+    return "stable"
+
+
+class DriftMonitor:
+    def __init__(self):
+        self._live = None
+
+    def activate(self, version, reference):
+        """Starts counting against a new model's reference (None disables)."""
+        if self._live is not None and self._live.version == version:
+            return  # same model reloaded; keep counting
+        # Single assignment: requests pick up the new histograms atomically
+        self._live = _LiveHistograms(version, reference) if reference is not None else None
+
+    def record(self, row):
+        """Counts one feature row (training column order). Cheap enough for every request."""
+        live = self._live
+        if live is not None:
+            live.add_row(row)
+
+    def record_many(self, X):
+        live = self._live
+        if live is not None and len(X):
+            live.add_rows(X)
+
+    def report(self, min_rows=100):
+        live = self._live
+        if live is None:
+            return {"available": False, "detail": "The served model has no drift reference (train a bundle)"}
+
+        totals = live.totals()
+        features = {}
+        live_rows = 0
+        for f, name in enumerate(live.names):
+            ref = live.reference["features"][f]
+            offset, n_value_bins = live.offsets[f], len(live.edges[f]) + 1
+            current = totals[offset:offset + n_value_bins]
+            missing = int(totals[offset + n_value_bins])
+            live_rows = max(live_rows, int(current.sum()) + missing)
+
+            expected_all = np.append(ref["counts"], ref["missing"])
+            actual_all = np.append(current, missing)
+            value = psi(expected_all, actual_all) if actual_all.sum() else None
+            features[name] = {
+                "psi": value,
+                "ks": binned_ks(ref["counts"], current),
+                "status": _status(value) if actual_all.sum() >= min_rows else "insufficient_data",
+                "live_missing_rate": missing / actual_all.sum() if actual_all.sum() else None,
+                "reference_missing_rate": ref["missing"] / live.reference["rows"] if live.reference["rows"] else None,
+            }
+
+        return {
+            "available": True,
+            "model_version": live.version,
+            "since": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(live.started_at)),
+            "live_rows": live_rows,
+            "reference_rows": live.reference["rows"],
+            "min_rows": min_rows,
+            "features": features,
+        }
+
+
+drift_monitor = DriftMonitor()
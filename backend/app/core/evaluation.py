@@ -0,0 +1,222 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_right
+import numpy as np
+
+# Model quality reporting.
+#
+# evaluation_report() computes the hold-out report at training time; the
+# trainer stores it in the model bundle (evaluation.json) and the API serves
+# it from a cache keyed by model version. ScoreHistogram keeps live AUC,
+# precision and recall from labelled outcomes in bounded memory: scores are
+# binned, and each bin counts defaulted and repaid applications.
+
+EVALUATION_FILE = "evaluation.json"
+
+# Probability at or above which an application is counted as a predicted default
+DEFAULT_THRESHOLD = 0.5
+
+# Decision for a default probability: DECISIONS[i] below DECISION_CUTOFFS[i],
+# the last one at or above the highest cutoff
+DECISION_CUTOFFS = (0.3, 0.6)
+DECISIONS = ("Approve", "Review", "Reject")
+
+
+def get_risk_category(prob):
+    if prob < 0.2:
+        return "Low"
+    elif prob < 0.5:
+        return "Medium"
+    else:
+        return "High"
+
+
+def get_decision(prob):
+    # Approve below 0.3, Review below 0.6, else Reject (shared with the decision index)
+    return DECISIONS[bisect_right(DECISION_CUTOFFS, prob)]
+
+
+# Histogram resolution; the AUC error from binning is at most half the share
+# of positive/negative pairs that fall in the same bin
+SCORE_BINS = 1000
+
+
+def roc_auc(y_true, scores):
+    """Exact ROC AUC (Mann-Whitney U with average ranks for ties)."""
+    y = np.asarray(y_true).astype(bool)
+    scores = np.asarray(scores, dtype=np.float64)
+    n_pos = int(y.sum())
+    n_neg = len(y) - n_pos
+    if n_pos == 0 or n_neg == 0:
+        return None
+    order = np.argsort(scores, kind="mergesort")
+    sorted_scores = scores[order]
+    # Average rank of each run of tied scores
+    starts = np.flatnonzero(np.r_[True, sorted_scores[1:] != sorted_scores[:-1]])
+    ends = np.r_[starts[1:], len(scores)]
+    avg_rank = (starts + ends + 1) / 2.0
+    ranks = np.empty(len(scores))
+    ranks[order] = np.repeat(avg_rank, ends - starts)
+    return float((ranks[y].sum() - n_pos * (n_pos + 1) / 2.0) / (n_pos * n_neg))
+
+
+def _classification_metrics(tp, fp, tn, fn):
+    n = tp + fp + tn + fn
+    precision = tp / (tp + fp) if tp + fp else None
+    recall = tp / (tp + fn) if tp + fn else None
+    f1 = 2 * precision * recall / (precision + recall) if precision and recall else None
+    return {
+        "precision": precision,
+        "recall": recall,
+        "f1": f1,
+        "accuracy": (tp + tn) / n if n else None,
+        "confusion_matrix": {"tp": int(tp), "fp": int(fp), "tn": int(tn), "fn": int(fn)},
+    }
+
+
+def evaluation_report(y_true, scores, threshold=DEFAULT_THRESHOLD, dataset=None):
+    """
+    Hold-out evaluation of default probabilities: AUC, precision/recall/F1 at
+    `threshold`, and the observed default rate in each serving decision band.
+    """
+    y = np.asarray(y_true).astype(bool)
+    scores = np.asarray(scores, dtype=np.float64)
+    predicted = scores >= threshold
+    tp = int(np.sum(predicted & y))
+    fp = int(np.sum(predicted & ~y))
+    tn = int(np.sum(~predicted & ~y))
+    fn = int(np.sum(~predicted & y))
+
+    # Same banding as get_decision, vectorized
+    band_of = np.searchsorted(DECISION_CUTOFFS, scores, side="right")
+    bands = {}
+    for band, decision in enumerate(DECISIONS):
+        in_band = band_of == band
+        n = int(in_band.sum())
+        bands[decision] = {
+            "rows": n,
+            "default_rate": float(y[in_band].mean()) if n else None,
+        }
+
+    return {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "dataset": {"rows": int(len(y)), "positives": int(y.sum()), **(dataset or {})},
+        "threshold": threshold,
+        "auc": roc_auc(y, scores),
+        **_classification_metrics(tp, fp, tn, fn),
+        "decision_bands": bands,
+    }
+
+
+# Reports already read from disk, by model version (the booster hash)
+_report_cache = {}
+_report_lock = threading.Lock()
+
+
+def load_report(bundle_path, model_version):
+    """Evaluation report stored in a bundle, or None. Cached per model version."""
+    with _report_lock:
+        if model_version in _report_cache:
+            return _report_cache[model_version]
+    report = None
+    path = os.path.join(bundle_path, EVALUATION_FILE)
+    if os.path.exists(path):
+        with open(path) as f:
+            report = json.load(f)
+        # A report copied from another model must not be served for this one
+        if report.get("model_version") != model_version:
+            report = None
+    with _report_lock:
+        _report_cache[model_version] = report
+    return report
+
+
+class ScoreHistogram:
+    """
+    Counts of defaulted/repaid outcomes per score bin. add() is O(batch) and
+    the memory is fixed at 2 x n_bins counters regardless of volume.
+    """
+
+    def __init__(self, n_bins=SCORE_BINS):
+        self.n_bins = n_bins
+        self.positives = np.zeros(n_bins, dtype=np.int64)
+        self.negatives = np.zeros(n_bins, dtype=np.int64)
+
+    def bins(self, scores):
+        scores = np.asarray(scores, dtype=np.float64)
+        return np.clip(np.floor(scores * self.n_bins), 0, self.n_bins - 1).astype(np.int64)
+
+    def add(self, scores, labels):
+        b = self.bins(scores)
+        labels = np.asarray(labels).astype(bool)
+        self.positives += np.bincount(b[labels], minlength=self.n_bins)
+        self.negatives += np.bincount(b[~labels], minlength=self.n_bins)
+
+    def add_counts(self, bin_index, positives, negatives):
+        self.positives[bin_index] += positives
+        self.negatives[bin_index] += negatives
+
+    def auc(self):
+        n_pos = int(self.positives.sum())
+        n_neg = int(self.negatives.sum())
+        if n_pos == 0 or n_neg == 0:
+            return None
+        # Positives beat every negative in a lower bin and tie half with their own bin
+        neg_below = np.cumsum(self.negatives) - self.negatives
+        wins = np.sum(self.positives * (neg_below + 0.5 * self.negatives))
+        return float(wins / (n_pos * n_neg))
+
+    def report(self, threshold=DEFAULT_THRESHOLD):
+        # Bins are [k/n, (k+1)/n), so a threshold on a bin edge is exact
+        first = int(np.ceil(threshold * self.n_bins))
+        tp = int(self.positives[first:].sum())
+        fp = int(self.negatives[first:].sum())
+        fn = int(self.positives[:first].sum())
+        tn = int(self.negatives[:first].sum())
+        return {
+            "outcomes": tp + fp + tn + fn,
+            "positives": tp + fn,
+            "threshold": threshold,
+            "auc": self.auc(),
+            **_classification_metrics(tp, fp, tn, fn),
+        }
+
+
+class LiveMetrics:
+    """Score histograms of labelled outcomes, one per (endpoint, model version)."""
+
+    def __init__(self, n_bins=SCORE_BINS):
+        self.n_bins = n_bins
+        self._lock = threading.Lock()
+        self._histograms = {}
+
+    def _histogram(self, key):
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            histogram = self._histograms[key] = ScoreHistogram(self.n_bins)
+        return histogram
+
+    def add(self, endpoint, model_version, scores, labels):
+        with self._lock:
+            self._histogram((endpoint, model_version)).add(scores, labels)
+
+    def load(self, rows):
+        """Restores counts from (endpoint, model_version, bin, positives, negatives) rows."""
+        with self._lock:
+            self._histograms = {}
+            for endpoint, version, bin_index, positives, negatives in rows:
+                self._histogram((endpoint, version)).add_counts(int(bin_index), positives, negatives)
+
+    def report(self, endpoint, model_version, threshold=DEFAULT_THRESHOLD):
+        with self._lock:
+            histogram = self._histograms.get((endpoint, model_version))
+            return histogram.report(threshold) if histogram is not None else None
+
+    def keys(self):
+        with self._lock:
+            return list(self._histograms)
+
+
+live_metrics = LiveMetrics()
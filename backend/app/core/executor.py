@@ -0,0 +1,200 @@
+import asyncio
+import multiprocessing
+import threading
+import time
+from concurrent.futures import CancelledError, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from app.core import config
+from app.core.metrics import model_rejections
+from app.core.model import credit_model
+
+# Execution layer for model calls (scoring and SHAP).
+#
+# Model work runs on its own pool instead of the server's shared thread pool,
+# so a burst of scoring cannot starve cheap endpoints. Admission is bounded:
+# at most `workers` calls run and `max_queue` wait; beyond that a call is
+# rejected at once (Overloaded -> HTTP 429) instead of queueing until the
+# client gives up. Every call carries a deadline; a call still queued when its
+# deadline passes is skipped rather than computed for nobody, and the caller
+# gets DeadlineExceeded (HTTP 503). Both carry Retry-After.
+#
+#   thread   worker threads in this process, sharing credit_model and its
+#            prediction cache (XGBoost, SHAP and the native engine's NumPy
+#            kernels release the GIL for most of their work)
+#   process  worker processes, each with its own copy of the model; no GIL
+#            contention, at the cost of one model (and SHAP explainer) per
+#            worker. Workers reload once each time the served model version changes.
+
+
+class Overloaded(Exception):
+    """The model queue is full; the request should be retried later."""
+
+
+class DeadlineExceeded(Exception):
+    """The request's deadline passed before its model call finished."""
+
+
+# Model instance of each worker process (set by _init_worker)
+_worker_model = None
+# Served version the parent last sent this worker
+_worker_requested = None
+
+
+def _init_worker(model_path):
+    global _worker_model
+    from app.core.model import CreditModel, PredictionCache
+    _worker_model = CreditModel(model_path)
+    # The parent keeps no cache for process workers and each worker only sees
+    # a share of the traffic; a per-worker cache would mostly cost memory
+    _worker_model.cache = PredictionCache(0)
+    _worker_model.load_model()
+
+
+def _ping():
+    return True
+
+
+def _score(X, explain, k, deadline, version, cache=True):
+    # deadline is time.monotonic(), which is system-wide, so it also holds in worker processes
+    if deadline is not None and time.monotonic() > deadline:
+        raise DeadlineExceeded("Deadline passed while queued")
+    global _worker_requested
+    model = _worker_model if _worker_model is not None else credit_model
+    if _worker_model is not None and version is not None and version != _worker_requested:
+        # Reload once per version the parent moves to, not per call: the file
+        # may already hold a newer model than the parent serves, and reloading
+        # cannot bring the worker back to the parent's version
+        if _worker_model.version != version:
+            _worker_model.load_model()
+        _worker_requested = version
+    return model.score(X, explain, k, cache)
+
+
+class ModelExecutor:
+    def __init__(self, kind="thread", workers=4, max_queue=64, timeout=2.0, model_path=None):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown executor kind: {kind}")
+        self.kind = kind
+        self.workers = max(1, int(workers))
+        self.max_queue = max(0, int(max_queue))
+        self.timeout = timeout
+        self.model_path = model_path
+        self._pool = None
+        self._lock = threading.Lock()
+        self._pending = 0  # running + queued
+
+        self.submitted = 0
+        self.completed = 0
+        self.rejected = 0
+        self.expired = 0
+
+    def start(self):
+        with self._lock:
+            if self._pool is not None:
+                return
+            if self.kind == "process":
+                # spawn, not fork: the server already runs threads (model loader, audit writer)
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.model_path or credit_model.path,),
+                )
+                # Start the workers (and their model loads) now rather than on
+                # the first requests, whose deadlines could not cover it
+                for _ in range(self.workers):
+                    self._pool.submit(_ping)
+            else:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="model")
+
+    def stop(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def deadline(self, timeout=None):
+        """Deadline (time.monotonic) for a call starting now."""
+        timeout = self.timeout if timeout is None else timeout
+        return time.monotonic() + timeout if timeout else None
+
+    def _submit(self, X, explain, k, deadline, cache=True):
+        # Raises ModelNotReady before taking a slot
+        version = credit_model.current().version
+        if self._pool is None:
+            self.start()
+        with self._lock:
+            if self._pending >= self.workers + self.max_queue:
+                self.rejected += 1
+                model_rejections.inc("queue_full")
+                raise Overloaded(f"Model queue is full ({self._pending} calls pending)")
+            self._pending += 1
+            self.submitted += 1
+        try:
+            future = self._pool.submit(_score, X, explain, k, deadline, version, cache)
+        except BaseException:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, future):
+        with self._lock:
+            self._pending -= 1
+            if future is not None and not future.cancelled() and future.exception() is None:
+                self.completed += 1
+
+    def _expired(self, future):
+        # Drops the call if it has not started yet
+        future.cancel()
+        with self._lock:
+            self.expired += 1
+        model_rejections.inc("deadline")
+        return DeadlineExceeded("Model call did not finish before the request deadline")
+
+    async def score(self, X, explain, k=3, deadline=None, cache=True):
+        """CreditModel.score on the pool, for async callers."""
+        deadline = self.deadline() if deadline is None else deadline
+        future = self._submit(X, explain, k, deadline, cache)
+        try:
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0.0)
+            return await asyncio.wait_for(asyncio.wrap_future(future), remaining)
+        except (asyncio.TimeoutError, CancelledError):
+            raise self._expired(future)
+        except DeadlineExceeded:
+            raise self._expired(future)
+
+    def score_sync(self, X, explain, k=3, deadline=None, cache=True):
+        """CreditModel.score on the pool, for sync endpoints (blocks the calling thread)."""
+        deadline = self.deadline() if deadline is None else deadline
+        future = self._submit(X, explain, k, deadline, cache)
+        try:
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0.0)
+            return future.result(remaining)
+        except (FutureTimeout, CancelledError, DeadlineExceeded):
+            raise self._expired(future)
+
+    def stats(self):
+        with self._lock:
+            pending = self._pending
+        return {
+            "kind": self.kind,
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "timeout_ms": self.timeout * 1000.0 if self.timeout else None,
+            "running": min(pending, self.workers),
+            "queued": max(pending - self.workers, 0),
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "expired": self.expired,
+        }
+
+
+model_executor = ModelExecutor(
+    kind=config.MODEL_EXECUTOR,
+    workers=config.MODEL_WORKERS,
+    max_queue=config.MODEL_MAX_QUEUE,
+    timeout=config.MODEL_TIMEOUT_MS / 1000.0,
+)
@@ -0,0 +1,261 @@
+import threading
+import time
+import numpy as np
+
+from app.core import config
+
+# Streaming fairness metrics over scored decisions.
+#
+# Every decision updates a few counters for the applicant's income band and
+# age band: decisions, approvals and the sum of predicted default
+# probabilities (plus, once outcomes are known, how many predictions were
+# correct). Counters are kept three ways:
+#
+#   all        since the process started
+#   tumbling   the current fixed window (FAIRNESS_BUCKET_SECONDS long)
+#   sliding    the last FAIRNESS_SLIDING_BUCKETS windows, kept as a ring of
+#              per-window counters plus running totals; a window leaving the
+#              ring is subtracted once
+#
+# so recording is O(1) per decision and /fairness-metrics only reads a
+# (groups x stats) matrix, no matter how many decisions were scored.
+#
+# /predict and /apply are different scorers with different income scales, so
+# each source has its own band rows and its own overall row, and is reported
+# on its own; their rates are never pooled.
+
+# (label, upper bound exclusive). Income bands follow each scorer's own
+# currency: /predict uses the training data's monthly income, /apply the
+# thresholds of its rule table (app/core/rules.py).
+INCOME_BANDS = {
+    "predict": (("Low", 3000), ("Medium", 7500), ("High", np.inf)),
+    # "Strong income" in the rules is > 25000, so 25000 itself is still Medium
+    "apply": (("Low", 10000), ("Medium", np.nextafter(25000.0, np.inf)), ("High", np.inf)),
+}
+AGE_BANDS = (("Young (<25)", 25), ("Adult (25-60)", 61), ("Senior (>60)", np.inf))
+
+APPROVED_DECISIONS = {"Approve", "APPROVED"}
+
+SOURCES = ("predict", "apply")
+
+# (source, dimension, band) of each counter row
+GROUPS = [
+    (source, dimension, label)
+    for source in SOURCES
+    for dimension, bands in (("income", INCOME_BANDS[source]), ("age", AGE_BANDS))
+    for label, _ in bands
+]
+_GROUP_INDEX = {group: i for i, group in enumerate(GROUPS)}
+# The rows after the groups hold each source's totals
+_OVERALL = {source: len(GROUPS) + i for i, source in enumerate(SOURCES)}
+
+# Columns of the counter matrices
+DECISIONS, APPROVED, PROB_SUM, OUTCOMES, CORRECT = range(5)
+_N_STATS = 5
+
+WINDOWS = ("all", "tumbling", "sliding")
+
+
+def _band(bands, value):
+    if value is None or value != value:  # missing or NaN
+        return None
+    for label, upper in bands:
+        if value < upper:
+            return label
+    return None
+
+
+def income_band(source, income):
+    return _band(INCOME_BANDS[source], income)
+
+
+def age_band(age):
+    return _band(AGE_BANDS, age)
+
+
+def group_rows(source, income=None, age=None):
+    """Counter rows a decision contributes to (its source's bands and overall row)."""
+    rows = [_OVERALL[source]]
+    band = income_band(source, income)
+    if band is not None:
+        rows.append(_GROUP_INDEX[(source, "income", band)])
+    band = age_band(age)
+    if band is not None:
+        rows.append(_GROUP_INDEX[(source, "age", band)])
+    return rows
+
+
+class FairnessMonitor:
+    def __init__(self, bucket_seconds=3600.0, sliding_buckets=24):
+        self.bucket_seconds = float(bucket_seconds)
+        self.sliding_buckets = int(sliding_buckets)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        shape = (len(GROUPS) + len(SOURCES), _N_STATS)
+        with self._lock:
+            self._total = np.zeros(shape)
+            self._ring = np.zeros((self.sliding_buckets,) + shape)
+            self._sliding = np.zeros(shape)
+            self._bucket = None
+            self.started_at = time.time()
+
+    def _advance(self, ts):
+        # Called with the lock held. Returns the ring slot for `ts`.
+        bucket = int(ts // self.bucket_seconds)
+        if self._bucket is None:
+            self._bucket = bucket
+        elif bucket > self._bucket:
+            # Expire the windows that fell out of the sliding range (at most all of them)
+            for b in range(self._bucket + 1, min(bucket, self._bucket + self.sliding_buckets) + 1):
+                slot = b % self.sliding_buckets
+                self._sliding -= self._ring[slot]
+                self._ring[slot] = 0.0
+            if bucket - self._bucket >= self.sliding_buckets:
+                # Everything expired; clear float drift from the subtractions
+                self._sliding[:] = 0.0
+            self._bucket = bucket
+        # Late records (older than the current window) count in the current one
+        return self._bucket % self.sliding_buckets
+
+    def record(self, source, decision, probability, income=None, age=None, ts=None):
+        """Counts one scored decision. `source` is "predict" or "apply"."""
+        rows = group_rows(source, income, age)
+        approved = 1.0 if decision in APPROVED_DECISIONS else 0.0
+        stats = np.array([1.0, approved, float(probability), 0.0, 0.0])
+        with self._lock:
+            slot = self._advance(time.time() if ts is None else ts)
+            ring = self._ring[slot]
+            # Row by row: basic indexing is several times cheaper than fancy indexing
+            for row in rows:
+                self._total[row] += stats
+                ring[row] += stats
+                self._sliding[row] += stats
+
+    def record_many(self, source, decisions, probabilities, incomes=None, ages=None, ts=None):
+        """Vectorized record() for a scored batch."""
+        n = len(decisions)
+        if n == 0:
+            return
+        stats = np.zeros((n, _N_STATS))
+        stats[:, DECISIONS] = 1.0
+        stats[:, APPROVED] = [d in APPROVED_DECISIONS for d in decisions]
+        stats[:, PROB_SUM] = np.asarray(probabilities, dtype=np.float64)
+
+        row_lists = [np.full(n, _OVERALL[source])]
+        for values, bands, dimension in ((incomes, INCOME_BANDS[source], "income"), (ages, AGE_BANDS, "age")):
+            if values is None:
+                continue
+            values = np.asarray(values, dtype=np.float64)
+            band = np.searchsorted([upper for _, upper in bands], values, side="right")
+            index = np.array([_GROUP_INDEX[(source, dimension, label)] for label, _ in bands] + [-1])
+            rows = np.where(np.isnan(values), -1, index[np.minimum(band, len(bands))])
+            row_lists.append(rows)
+        rows = np.concatenate(row_lists)
+        stats = np.tile(stats, (len(row_lists), 1))
+        keep = rows >= 0
+        rows, stats = rows[keep], stats[keep]
+
+        with self._lock:
+            slot = self._advance(time.time() if ts is None else ts)
+            np.add.at(self._total, rows, stats)
+            np.add.at(self._ring[slot], rows, stats)
+            np.add.at(self._sliding, rows, stats)
+
+    def record_outcome(self, source, correct, income=None, age=None, ts=None):
+        """Counts whether a decision's prediction matched the observed outcome."""
+        rows = group_rows(source, income, age)
+        with self._lock:
+            slot = self._advance(time.time() if ts is None else ts)
+            for counters in (self._total, self._ring[slot], self._sliding):
+                for row in rows:
+                    counters[row, OUTCOMES] += 1.0
+                    counters[row, CORRECT] += 1.0 if correct else 0.0
+
+    def counters(self, window="all"):
+        """Copy of the (groups + sources, stats) counter matrix for a window."""
+        if window not in WINDOWS:
+            raise ValueError(f"Unknown window: {window}")
+        with self._lock:
+            # Roll forward so idle periods expire from the windows
+            slot = self._advance(time.time())
+            if window == "all":
+                return self._total.copy()
+            if window == "tumbling":
+                return self._ring[slot].copy()
+            return self._sliding.copy()
+
+    def window_bounds(self, window):
+        """(start, end) of a window as ISO timestamps; end is None for "all"."""
+        if window == "all":
+            return _iso(self.started_at), None
+        end = (self._bucket + 1) * self.bucket_seconds
+        length = self.bucket_seconds * (1 if window == "tumbling" else self.sliding_buckets)
+        return _iso(max(end - length, self.started_at)), _iso(end)
+
+    def snapshot(self, window="all"):
+        counters = self.counters(window)
+        start, end = self.window_bounds(window)
+        return {
+            "window": window,
+            "window_start": start,
+            "window_end": end,
+            "decisions": int(round(sum(counters[row, DECISIONS] for row in _OVERALL.values()))),
+            "sources": {source: _source_report(counters, source) for source in SOURCES},
+        }
+
+
+def _source_report(counters, source):
+    def rate(row, column, denominator):
+        n = counters[row, denominator]
+        # Counts are whole numbers; >= 0.5 ignores residue from window subtraction
+        return round(float(counters[row, column] / n), 6) if n >= 0.5 else None
+
+    by = {"income": {}, "age": {}}
+    for i, (group_source, dimension, label) in enumerate(GROUPS):
+        if group_source != source:
+            continue
+        by[dimension][label] = {
+            "decisions": int(round(counters[i, DECISIONS])),
+            "approval_rate": rate(i, APPROVED, DECISIONS),
+            "default_rate": rate(i, PROB_SUM, DECISIONS),
+            "accuracy": rate(i, CORRECT, OUTCOMES),
+        }
+
+    ratios = {dimension: _disparate_impact(groups) for dimension, groups in by.items()}
+    measured = [r for r in ratios.values() if r is not None]
+    overall = _OVERALL[source]
+
+    return {
+        "decisions": int(round(counters[overall, DECISIONS])),
+        "approval_rate": rate(overall, APPROVED, DECISIONS),
+        # Lowest approval rate over the highest, across bands (1.0 = parity)
+        "disparate_impact_ratio": min(measured) if measured else None,
+        "disparate_impact_by": ratios,
+        # Mean predicted default probability per band
+        "default_rate_by_income": {k: v["default_rate"] for k, v in by["income"].items()},
+        "default_rate_by_age": {k: v["default_rate"] for k, v in by["age"].items()},
+        "approval_rate_by_income": {k: v["approval_rate"] for k, v in by["income"].items()},
+        "approval_rate_by_age": {k: v["approval_rate"] for k, v in by["age"].items()},
+        # Needs observed outcomes; None until some are reported
+        "subgroup_accuracy": {k: v["accuracy"] for k, v in by["age"].items()},
+        "groups": by,
+    }
+
+
+def _iso(ts):
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(ts))
+
+
+def _disparate_impact(groups):
+    rates = [g["approval_rate"] for g in groups.values() if g["approval_rate"] is not None]
+    if len(rates) < 2 or max(rates) == 0:
+        return None
+    return round(min(rates) / max(rates), 6)
+
+
+fairness_monitor = FairnessMonitor(
+    bucket_seconds=config.FAIRNESS_BUCKET_SECONDS,
+    sliding_buckets=config.FAIRNESS_SLIDING_BUCKETS,
+)
@@ -0,0 +1,141 @@
+from operator import attrgetter
+
+import numpy as np
+
+# Feature schema shared by training (ml/train_model.py) and serving.
+#
+# FEATURES are the model inputs in the order the model was trained on (the
+# cs-training columns). The API cannot use the hyphenated column names as
+# field names, so FIELD_ALIASES maps its field names back to the columns.
+# DERIVED_FEATURES are computed from the raw columns; they are reported
+# (risk_index in every prediction) but not model inputs.
+#
+# A FeaturePipeline turns the name lookups into column-index arrays once, when
+# it is built, so each call is a handful of vectorized NumPy operations
+# whatever the batch size. A single /predict row goes through the same code
+# as a 10,000-row book, and training (ml/pipeline.py prepare_stage) builds
+# its matrix with a FeaturePipeline over the dataset's columns plus fill(),
+# the same calls bulk_score makes on a scored file.
+
+FEATURES = (
+    "RevolvingUtilizationOfUnsecuredLines",
+    "age",
+    "NumberOfTime30-59DaysPastDueNotWorse",
+    "DebtRatio",
+    "MonthlyIncome",
+    "NumberOfOpenCreditLinesAndLoans",
+    "NumberOfTimes90DaysLate",
+    "NumberRealEstateLoansOrLines",
+    "NumberOfTime60-89DaysPastDueNotWorse",
+    "NumberOfDependents",
+)
+
+# API field name -> training column (hyphens aren't allowed in field names)
+FIELD_ALIASES = {
+    "NumberOfTime3059DaysPastDueNotWorse": "NumberOfTime30-59DaysPastDueNotWorse",
+    "NumberOfTime6089DaysPastDueNotWorse": "NumberOfTime60-89DaysPastDueNotWorse",
+}
+
+# API field names in training column order
+FIELDS = tuple({v: k for k, v in FIELD_ALIASES.items()}.get(f, f) for f in FEATURES)
+
+# name: (op, a, b) over raw columns
+#   ratio    a / (b + 1)
+#   product  a * b
+DERIVED_FEATURES = {
+    "income_to_debt": ("ratio", "MonthlyIncome", "DebtRatio"),
+    "late_payment_ratio": ("ratio", "NumberOfTimes90DaysLate", "NumberOfTime30-59DaysPastDueNotWorse"),
+    "credit_stability": ("ratio", "age", "NumberOfOpenCreditLinesAndLoans"),
+    "risk_index": ("product", "DebtRatio", "NumberOfTimes90DaysLate"),
+}
+
+
+def column_name(name):
+    """Training column for an API field or column name."""
+    return FIELD_ALIASES.get(name, name)
+
+
+def feature_index(name):
+    """Position of a feature (API field or column name) in the model input; KeyError if unknown."""
+    column = column_name(name)
+    if column not in FEATURES:
+        raise KeyError(name)
+    return FEATURES.index(column)
+
+
+class FeaturePipeline:
+    def __init__(self, columns=FEATURES):
+        """
+        `columns` is the layout of the matrices passed to matrix(): training
+        column or API field names, in any order, extra columns allowed.
+        """
+        columns = [column_name(c) for c in columns]
+        missing = [f for f in FEATURES if f not in columns]
+        if missing:
+            raise ValueError(f"Input is missing columns: {', '.join(missing)}")
+        self.columns = tuple(columns)
+
+        take = np.array([columns.index(f) for f in FEATURES], dtype=np.intp)
+        # Input already in model order: matrix() is a no-copy view
+        self._take = None if np.array_equal(take, np.arange(len(columns))) else take
+
+        self._derived = {
+            name: (op, FEATURES.index(a), FEATURES.index(b))
+            for name, (op, a, b) in DERIVED_FEATURES.items()
+        }
+
+    def matrix(self, X, dtype=np.float32):
+        """Model input (n, len(FEATURES)) from a 2-D array in this pipeline's column layout."""
+        X = np.asarray(X, dtype=dtype)
+        return X if self._take is None else X.take(self._take, axis=1)
+
+    def derived(self, X, names=None):
+        """
+        Derived features of a model-order matrix (as returned by matrix()),
+        as float64 columns keyed by name; `names` limits which are computed.
+        """
+        out = {}
+        for name in names or self._derived:
+            op, a, b = self._derived[name]
+            left = X[:, a].astype(np.float64, copy=False)
+            right = X[:, b].astype(np.float64, copy=False)
+            out[name] = left / (right + 1.0) if op == "ratio" else left * right
+        return out
+
+    def frame(self, df, dtype=np.float32):
+        """Model input from a DataFrame with training or API column names."""
+        df = df.rename(columns=FIELD_ALIASES)
+        missing = [f for f in FEATURES if f not in df.columns]
+        if missing:
+            raise ValueError(f"Input is missing columns: {', '.join(missing)}")
+        return df[list(FEATURES)].to_numpy(dtype=dtype)
+
+    @staticmethod
+    def records(records, dtype=np.float64):
+        """
+        Model input from objects with the API field names as attributes
+        (validated applications). The values live on Python objects, so this
+        copies: one C-level attrgetter call per record, then one array build.
+        """
+        return np.array(list(map(_record_values, records)), dtype=dtype).reshape(-1, len(FIELDS))
+
+    @staticmethod
+    def fill(X, values):
+        """
+        Model-order matrix with NaN in the features named in `values` replaced
+        by their value (training's missing-value fill). Returns a copy when
+        anything is filled; X itself is never modified.
+        """
+        if not values:
+            return X
+        X = np.array(X, copy=True)
+        for name, value in values.items():
+            column = X[:, feature_index(name)]
+            column[np.isnan(column)] = value
+        return X
+
+
+_record_values = attrgetter(*FIELDS)
+
+# Plan for matrices already in training column order (API rows, bulk files)
+feature_pipeline = FeaturePipeline()
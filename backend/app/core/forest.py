@@ -0,0 +1,413 @@
+import json
+from bisect import bisect_right
+from decimal import Decimal, localcontext
+import numpy as np
+
+# Flattened ("compiled") representation of an XGBoost tree ensemble.
+#
+# All trees are packed into one set of contiguous node arrays so a batch of
+# rows can be pushed through every tree at once with a few NumPy gathers.
+# Leaves point back to themselves, which lets traversal run a fixed number of
+# steps (max depth) without checking for leaves.
+#
+# Scoring follows XGBoost's CPU predictor exactly: inputs are float32, a row
+# goes left when `x < threshold` (or when x is missing and default_left is set),
+# leaf values are accumulated tree by tree in float32 starting from the base
+# margin, and the logistic transform is applied in float32.
+
+ARRAY_FIELDS = ("feature", "threshold", "left", "right", "default_left", "value", "cover", "roots", "node_mean")
+
+
+class CompiledForest:
+    def __init__(self, feature, threshold, left, right, default_left, value, cover, roots,
+                 base_margin, max_depth, feature_names=None, node_mean=None):
+        self.feature = feature            # int32   split feature index (0 for leaves)
+        self.threshold = threshold        # float32 split condition (NaN for leaves)
+        self.left = left                  # int32   left child (self for leaves)
+        self.right = right                # int32   right child (self for leaves)
+        self.default_left = default_left  # bool    direction for missing values
+        self.value = value                # float32 leaf value (0 for internal nodes)
+        self.cover = cover                # float32 sum of hessians reaching the node
+        self.roots = roots                # int32   root node index of each tree
+        self.base_margin = np.float32(base_margin)
+        self.max_depth = int(max_depth)
+        self.feature_names = list(feature_names) if feature_names is not None else None
+        # Cover-weighted expected value of every node, used for path attributions
+        if node_mean is None:
+            node_mean = _node_means(left, right, value, cover, roots)
+        self.node_mean = node_mean
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def n_features(self):
+        return len(self.feature_names) if self.feature_names else int(self.feature.max()) + 1
+
+    @classmethod
+    def from_booster(cls, booster, iteration_range=None):
+        """
+        Flattens a binary:logistic gbtree booster into contiguous arrays.
+        `iteration_range` mirrors XGBoost's argument (end is exclusive).
+        """
+        raw = json.loads(booster.save_raw(raw_format="json"))
+        learner = raw["learner"]
+
+        objective = learner["objective"]["name"]
+        if objective != "binary:logistic":
+            raise ValueError(f"Unsupported objective for compiled inference: {objective}")
+        gbm = learner["gradient_booster"]
+        if gbm["name"] != "gbtree":
+            raise ValueError(f"Unsupported booster for compiled inference: {gbm['name']}")
+
+        model = gbm["model"]
+        trees = model["trees"]
+        indptr = model["iteration_indptr"]
+        n_rounds = len(indptr) - 1
+        begin, end = iteration_range if iteration_range else (0, n_rounds)
+        if end <= 0 or end > n_rounds:
+            end = n_rounds
+        trees = trees[indptr[begin]:indptr[end]]
+
+        # base_score is stored as a probability ("[5E-1]" in XGBoost >= 3)
+        base_score = np.float32(learner["learner_model_param"]["base_score"].strip("[]"))
+        base_margin = -np.log(np.float32(1.0) / base_score - np.float32(1.0))
+
+        features, thresholds, lefts, rights, defaults, values, covers, roots = [], [], [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for tree in trees:
+            if any(int(t) != 0 for t in tree.get("split_type", [])):
+                raise ValueError("Categorical splits are not supported by compiled inference")
+
+            left = np.asarray(tree["left_children"], dtype=np.int32)
+            right = np.asarray(tree["right_children"], dtype=np.int32)
+            cond = np.asarray(tree["split_conditions"], dtype=np.float32)
+            is_leaf = left == -1
+            n = len(left)
+            idx = np.arange(n, dtype=np.int32)
+
+            features.append(np.where(is_leaf, 0, np.asarray(tree["split_indices"], dtype=np.int32)))
+            thresholds.append(np.where(is_leaf, np.float32(np.nan), cond).astype(np.float32))
+            lefts.append(np.where(is_leaf, idx, left) + offset)
+            rights.append(np.where(is_leaf, idx, right) + offset)
+            defaults.append(np.asarray(tree["default_left"], dtype=bool))
+            # For leaves XGBoost stores the (learning-rate scaled) leaf weight in split_conditions
+            values.append(np.where(is_leaf, cond, np.float32(0)).astype(np.float32))
+            covers.append(np.asarray(tree["sum_hessian"], dtype=np.float32))
+            roots.append(offset)
+
+            max_depth = max(max_depth, _tree_depth(left, right))
+            offset += n
+
+        return cls(
+            feature=np.concatenate(features).astype(np.int32),
+            threshold=np.concatenate(thresholds),
+            left=np.concatenate(lefts).astype(np.int32),
+            right=np.concatenate(rights).astype(np.int32),
+            default_left=np.concatenate(defaults),
+            value=np.concatenate(values),
+            cover=np.concatenate(covers),
+            roots=np.asarray(roots, dtype=np.int32),
+            base_margin=base_margin,
+            max_depth=max_depth,
+            feature_names=booster.feature_names,
+        )
+
+    def _as_matrix(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        return X
+
+    def _step(self, X, rows, node):
+        x = X[rows, self.feature[node]]
+        go_left = np.where(np.isnan(x), self.default_left[node], x < self.threshold[node])
+        return np.where(go_left, self.left[node], self.right[node])
+
+    def leaf_indices(self, X):
+        """Returns the (n_rows, n_trees) matrix of leaf node indices reached by each row."""
+        X = self._as_matrix(X)
+        rows = np.arange(X.shape[0])[:, None]
+        node = np.broadcast_to(self.roots, (X.shape[0], self.n_trees)).copy()
+        for _ in range(self.max_depth):
+            node = self._step(X, rows, node)
+        return node
+
+    def _margin_from_leaves(self, leaves):
+        values = self.value[leaves]
+        # Sequential float32 accumulation (cumsum) to match XGBoost bit for bit;
+        # np.sum would use pairwise summation and round differently.
+        acc = np.empty((values.shape[0], values.shape[1] + 1), dtype=np.float32)
+        acc[:, 0] = self.base_margin
+        acc[:, 1:] = values
+        return np.cumsum(acc, axis=1, dtype=np.float32)[:, -1]
+
+    def predict_margin(self, X):
+        return self._margin_from_leaves(self.leaf_indices(X))
+
+    def predict_with_contributions(self, X):
+        """
+        Probabilities plus Saabas-style path attributions (margin space, shape
+        (n_rows, n_features)) computed in the same traversal. Every split on the
+        decision path credits its feature with the change in the node's expected
+        value, which is what XGBoost's approx_contribs computes.
+        """
+        X = self._as_matrix(X)
+        n, n_features = X.shape
+        rows = np.arange(n)[:, None]
+        node = np.broadcast_to(self.roots, (n, self.n_trees)).copy()
+        slots, deltas = [], []
+        for _ in range(self.max_depth):
+            nxt = self._step(X, rows, node)
+            # Leaves loop onto themselves, so their delta is 0
+            slots.append((rows * n_features + self.feature[node]).ravel())
+            deltas.append((self.node_mean[nxt] - self.node_mean[node]).ravel())
+            node = nxt
+        contribs = np.bincount(
+            np.concatenate(slots), weights=np.concatenate(deltas), minlength=n * n_features
+        ).reshape(n, n_features)
+        return sigmoid(self._margin_from_leaves(node)), contribs
+
+    def predict_proba(self, X):
+        """Probability of the positive class, shape (n_rows,)."""
+        return sigmoid(self.predict_margin(X))
+
+    def arrays(self):
+        return {name: getattr(self, name) for name in ARRAY_FIELDS}
+
+
+def sigmoid(margin):
+    # Same formulation as XGBoost's common::Sigmoid (float32 throughout)
+    z = np.minimum(-np.asarray(margin, dtype=np.float32), np.float32(88.7))
+    return np.float32(1.0) / (expf(z) + np.float32(1.0) + np.float32(1e-16))
+
+
+# NumPy port of glibc's expf (sysdeps/ieee754/flt-32/e_expf.c), which XGBoost
+# calls inside Sigmoid. numpy's own float32 exp differs from it in the last bit
+# for a large share of inputs, so we evaluate the same table + polynomial in
+# float64 and round once, giving identical float32 results.
+_EXP2F_N = 32
+
+
+def _exp2f_table():
+    tab = []
+    with localcontext() as ctx:
+        ctx.prec = 60
+        for i in range(_EXP2F_N):
+            # bits of 2^(i/N) with the exponent adjustment for i pre-subtracted
+            two_pow = np.float64(float(Decimal(2) ** (Decimal(i) / Decimal(_EXP2F_N))))
+            tab.append(int(two_pow.view(np.uint64)) - (i << (52 - 5)))
+    return np.array(tab, dtype=np.uint64)
+
+
+_EXP2F_TAB = _exp2f_table()
+_EXPF_INVLN2N = float.fromhex("0x1.71547652b82fep+0") * _EXP2F_N
+_EXPF_SHIFT = float.fromhex("0x1.8p+52")
+_EXPF_C0 = float.fromhex("0x1.c6af84b912394p-5") / _EXP2F_N / _EXP2F_N / _EXP2F_N
+_EXPF_C1 = float.fromhex("0x1.ebfce50fac4f3p-3") / _EXP2F_N / _EXP2F_N
+_EXPF_C2 = float.fromhex("0x1.62e42ff0c52d6p-1") / _EXP2F_N
+
+
+def expf(x):
+    # Inputs below -150 underflow to 0 in float32 anyway; clamping keeps the
+    # exponent arithmetic below in range.
+    xd = np.maximum(np.asarray(x, dtype=np.float32), np.float32(-150.0)).astype(np.float64)
+    z = _EXPF_INVLN2N * xd
+    kd = z + _EXPF_SHIFT
+    ki = kd.view(np.uint64)
+    kd = kd - _EXPF_SHIFT
+    r = z - kd
+    t = _EXP2F_TAB[ki % np.uint64(_EXP2F_N)] + (ki << np.uint64(52 - 5))
+    s = t.view(np.float64)
+    y = (_EXPF_C0 * r + _EXPF_C1) * (r * r) + (_EXPF_C2 * r + 1.0)
+    return (y * s).astype(np.float32)
+
+
+def _node_means(left, right, value, cover, roots):
+    # Parents before children (breadth-first from every root), then fold bottom-up
+    order = list(roots)
+    i = 0
+    while i < len(order):
+        node = order[i]
+        if left[node] != node:
+            order.append(left[node])
+            order.append(right[node])
+        i += 1
+    mean = value.astype(np.float64)
+    for node in reversed(order):
+        l, r = left[node], right[node]
+        if l != node and cover[node] > 0:
+            mean[node] = (cover[l] * mean[l] + cover[r] * mean[r]) / cover[node]
+    return mean
+
+
+def _tree_depth(left, right):
+    depth = np.zeros(len(left), dtype=np.int32)
+    for i in range(len(left)):
+        if left[i] != -1:
+            depth[left[i]] = depth[i] + 1
+            depth[right[i]] = depth[i] + 1
+    return int(depth.max())
+
+
+class DecisionIndex:
+    """
+    Early-exit decision buckets on a compiled forest.
+
+    `cutoffs` are increasing probabilities splitting [0, 1] into buckets
+    (bucket i holds cutoffs[i-1] <= p < cutoffs[i]). Rows are walked tree by
+    tree in plain Python, largest leaf-value range first; after each tree the
+    margin so far plus the smallest and largest sum the remaining trees can
+    still add bounds the final margin. Once both bounds fall in one bucket
+    the row is decided without visiting the other trees.
+
+    The bounds are widened by the worst-case float32 rounding of XGBoost's
+    sequential accumulation plus a guard for the sigmoid, so an early
+    decision is always the bucket of the fully scored probability. Rows
+    still undecided after the last tree are scored in full (predict_proba)
+    and bucketed from the exact probability.
+
+    The walk beats the vectorized traversal only for a few rows at a time,
+    where NumPy's per-call overhead dominates; larger inputs are scored in
+    full and bucketed.
+    """
+
+    MAX_ROWS = 4         # inputs walked row by row; larger ones are scored in full
+    MARGIN_GUARD = 1e-4  # margin-space slack for the float32 sigmoid near a cutoff
+
+    def __init__(self, forest, cutoffs):
+        cutoffs = [float(c) for c in cutoffs]
+        if any(not 0.0 < c < 1.0 for c in cutoffs) or cutoffs != sorted(cutoffs):
+            raise ValueError(f"Cutoffs must be increasing probabilities in (0, 1): {cutoffs}")
+        self.forest = forest
+        self.cutoffs = np.array(cutoffs, dtype=np.float64)
+        self.margin_cutoffs = np.log(self.cutoffs / (1.0 - self.cutoffs))
+
+        ends = np.append(forest.roots[1:], len(forest.value))
+        leaf_min, leaf_max, leaf_abs = [], [], []
+        for start, end in zip(forest.roots, ends):
+            leaves = forest.left[start:end] == np.arange(start, end)
+            values = forest.value[start:end][leaves].astype(np.float64)
+            leaf_min.append(values.min())
+            leaf_max.append(values.max())
+            leaf_abs.append(np.abs(values).max())
+        leaf_min, leaf_max = np.array(leaf_min), np.array(leaf_max)
+        self.order = np.argsort(leaf_min - leaf_max, kind="stable")  # widest range first
+        self.roots = forest.roots[self.order]
+        # Smallest/largest sum still to come after the first k trees, k = 0..n_trees
+        self.rest_min = np.append(np.cumsum(leaf_min[self.order][::-1])[::-1], 0.0)
+        self.rest_max = np.append(np.cumsum(leaf_max[self.order][::-1])[::-1], 0.0)
+        # Float32 rounding of n_trees sequential additions, each at most
+        # 2^-24 of the largest partial sum; doubled for our float64 sums
+        bound = abs(float(forest.base_margin)) + float(np.sum(leaf_abs))
+        self.slack = 2.0 * forest.n_trees * 2.0 ** -24 * bound + self.MARGIN_GUARD
+
+        # Plain-Python node tables for the walk
+        self._feature = forest.feature.tolist()
+        self._threshold = forest.threshold.astype(np.float64).tolist()
+        self._left = forest.left.tolist()
+        self._right = forest.right.tolist()
+        self._default_left = forest.default_left.tolist()
+        self._value = forest.value.astype(np.float64).tolist()
+        self._cuts = self.margin_cutoffs.tolist()
+        self._roots = self.roots.tolist()
+        self._lower = (self.rest_min - self.slack).tolist()
+        self._upper = (self.rest_max + self.slack).tolist()
+
+    def bucket(self, probs):
+        """Buckets of fully scored probabilities."""
+        return np.searchsorted(self.cutoffs, np.asarray(probs, dtype=np.float64), side="right")
+
+    def decide(self, X):
+        """
+        Returns (buckets, trees): the bucket of every row and how many trees
+        were visited to decide it (n_trees for rows scored in full).
+        """
+        X = self.forest._as_matrix(X)
+        if len(X) > self.MAX_ROWS:
+            return self.bucket(self.forest.predict_proba(X)), np.full(len(X), self.forest.n_trees, dtype=np.intp)
+        return self._walk(X)
+
+    def _walk(self, X):
+        feature, threshold, left, right = self._feature, self._threshold, self._left, self._right
+        default_left, value, cuts = self._default_left, self._value, self._cuts
+        lower, upper = self._lower, self._upper
+        n_trees = len(self._roots)
+        buckets = np.empty(len(X), dtype=np.intp)
+        trees = np.full(len(X), n_trees, dtype=np.intp)
+        undecided = []
+        base = float(self.forest.base_margin)
+        for i, row in enumerate(X.astype(np.float64).tolist()):
+            margin = base
+            for k, node in enumerate(self._roots, 1):
+                while left[node] != node:
+                    x = row[feature[node]]
+                    if x != x:
+                        node = left[node] if default_left[node] else right[node]
+                    else:
+                        node = left[node] if x < threshold[node] else right[node]
+                margin += value[node]
+                b = bisect_right(cuts, margin + lower[k])
+                if b == bisect_right(cuts, margin + upper[k]):
+                    buckets[i] = b
+                    trees[i] = k
+                    break
+            else:
+                undecided.append(i)
+        if undecided:
+            buckets[undecided] = self.bucket(self.forest.predict_proba(X[undecided]))
+        return buckets, trees
+
+
+def _sample_inputs(forest, n_samples, seed):
+    # Random rows around every split threshold, plus missing values
+    rng = np.random.default_rng(seed)
+    n_features = forest.n_features
+    X = np.empty((n_samples, n_features), dtype=np.float32)
+    for f in range(n_features):
+        thr = forest.threshold[(forest.feature == f) & ~np.isnan(forest.threshold)]
+        if len(thr) == 0:
+            X[:, f] = rng.normal(size=n_samples)
+            continue
+        # Exact thresholds, their float32 neighbours and jittered values
+        picks = rng.choice(thr, size=n_samples)
+        mode = rng.integers(0, 4, size=n_samples)
+        X[:, f] = np.select(
+            [mode == 0, mode == 1, mode == 2],
+            [picks, np.nextafter(picks, np.float32(-np.inf)), picks * rng.uniform(0.5, 1.5, size=n_samples)],
+            default=np.nextafter(picks, np.float32(np.inf)),
+        )
+    X[rng.random(X.shape) < 0.05] = np.nan
+    return X
+
+
+def verify_parity(forest, predict_fn, n_samples=2000, seed=0):
+    """
+    Compares the compiled forest with XGBoost on random inputs drawn around
+    every split threshold (plus missing values). `predict_fn(X)` returns
+    XGBoost's positive-class probabilities. Returns the number of rows whose
+    probability differs in any bit.
+    """
+    X = _sample_inputs(forest, n_samples, seed)
+    expected = np.asarray(predict_fn(X), dtype=np.float32)
+    actual = forest.predict_proba(X)
+    return int(np.count_nonzero(expected.view(np.int32) != actual.view(np.int32)))
+
+
+def verify_decisions(index, n_samples=2000, seed=0):
+    """
+    Compares DecisionIndex.decide with the buckets of fully scored
+    probabilities, on the verify_parity inputs and on rows with a
+    probability near each cutoff. Returns the number of rows that differ.
+    """
+    forest = index.forest
+    X = _sample_inputs(forest, n_samples, seed)
+    # The closest of the sampled rows to every cutoff, for the tightest bounds
+    probs = forest.predict_proba(X).astype(np.float64)
+    near = np.argsort(np.min(np.abs(probs[:, None] - index.cutoffs[None, :]), axis=1))[:n_samples // 10]
+    X = np.concatenate([X, X[near]])
+    expected = index.bucket(forest.predict_proba(X))
+    actual = np.concatenate([index.decide(X[i:i + index.MAX_ROWS])[0] for i in range(0, len(X), index.MAX_ROWS)])
+    return int(np.count_nonzero(actual != expected))
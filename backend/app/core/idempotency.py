@@ -0,0 +1,270 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from app.core import config
+
+# Idempotent /apply by application_id.
+#
+# The first request for an application_id computes and stores its result
+# together with a fingerprint (SHA-256 of the validated payload). A repeat
+# with the same payload gets the stored result back without being scored,
+# audited or counted again; a repeat with a different payload is a conflict
+# (409). Duplicates that arrive while the first is still being computed wait
+# for it instead of computing in parallel (single-flight). Failed
+# computations are not stored, so a retry after an error recomputes. A result
+# that cannot be stored is still returned (and logged): it has already been
+# audited, so failing the request would only make the retry audit it again.
+#
+# Stores are bounded and entries expire after IDEMPOTENCY_TTL_SECONDS:
+#
+#   memory  per-process dict, oldest entries evicted first
+#   sqlite  local database shared by all uvicorn workers on the host; expired
+#           and excess rows are purged every PURGE_EVERY writes
+#
+# Single-flight is per process: with the SQLite store, two workers that
+# receive the same new application_id at the same instant may both compute,
+# and the later write wins.
+
+
+class IdempotencyConflict(Exception):
+    """The key was already used with a different payload."""
+
+
+def fingerprint(payload):
+    """SHA-256 of the payload's canonical JSON."""
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class MemoryStore:
+    def __init__(self, max_size=100000, ttl_seconds=86400):
+        self.max_size = max_size
+        self.ttl = ttl_seconds
+        self._data = OrderedDict()  # key -> (expires_at, fingerprint, result), oldest first
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        """(fingerprint, result) of a live entry, or None."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry[0] < now:
+                del self._data[key]
+                self.expirations += 1
+                return None
+            return entry[1], entry[2]
+
+    def put(self, key, fp, result):
+        now = time.monotonic()
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = (now + self.ttl, fp, result)
+            # One TTL for every entry, so the oldest expire first
+            while self._data:
+                oldest = next(iter(self._data.values()))
+                if oldest[0] < now:
+                    self._data.popitem(last=False)
+                    self.expirations += 1
+                elif len(self._data) > self.max_size:
+                    self._data.popitem(last=False)
+                    self.evictions += 1
+                else:
+                    break
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        return {"backend": "memory", "size": len(self._data), "max_size": self.max_size,
+                "ttl_seconds": self.ttl, "evictions": self.evictions, "expirations": self.expirations}
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS idempotency (
+    key TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    result TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_idempotency_expires ON idempotency (expires_at);
+"""
+
+
+class SQLiteStore:
+    PURGE_EVERY = 1000
+
+    def __init__(self, path, max_size=100000, ttl_seconds=86400):
+        self.path = path
+        self.max_size = max_size
+        self.ttl = ttl_seconds
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _conn(self):
+        # One connection per thread (sqlite3 connections are thread-bound)
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._conn().execute(
+            "SELECT fingerprint, result FROM idempotency WHERE key = ? AND expires_at >= ?", (key, time.time())
+        ).fetchone()
+        return (row[0], json.loads(row[1])) if row else None
+
+    def put(self, key, fp, result):
+        conn = self._conn()
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO idempotency VALUES (?, ?, ?, ?)",
+                         (key, fp, json.dumps(result, default=str), time.time() + self.ttl))
+        with self._lock:
+            self._writes += 1
+            purge = self._writes % self.PURGE_EVERY == 0
+        if purge:
+            self._purge(conn)
+
+    def _purge(self, conn):
+        with conn:
+            self.expirations += conn.execute("DELETE FROM idempotency WHERE expires_at < ?",
+                                             (time.time(),)).rowcount
+            # Entries expire in insertion order, so the earliest expiries are the oldest
+            self.evictions += conn.execute(
+                "DELETE FROM idempotency WHERE key IN (SELECT key FROM idempotency ORDER BY expires_at "
+                "LIMIT max(0, (SELECT count(*) FROM idempotency) - ?))", (self.max_size,)
+            ).rowcount
+
+    def clear(self):
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM idempotency")
+
+    def stats(self):
+        size = self._conn().execute("SELECT count(*) FROM idempotency").fetchone()[0]
+        return {"backend": "sqlite", "path": self.path, "size": size, "max_size": self.max_size,
+                "ttl_seconds": self.ttl, "evictions": self.evictions, "expirations": self.expirations}
+
+
+class _Flight:
+    __slots__ = ("fingerprint", "done", "result", "error")
+
+    def __init__(self, fp):
+        self.fingerprint = fp
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class IdempotencyLayer:
+    def __init__(self, store):
+        self.store = store
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.computed = 0
+        self.replayed = 0
+        self.collapsed = 0
+        self.conflicts = 0
+        self.store_errors = 0
+
+    def run(self, key, payload, compute):
+        """
+        The result of `compute()` for `key`, computed at most once per payload
+        while the entry lives. Returns (result, replayed). Raises
+        IdempotencyConflict when `key` was used with a different payload;
+        exceptions from `compute()` reach every caller waiting on it.
+        """
+        fp = fingerprint(payload)
+        # Only the in-flight table is read under the lock; the store lookup
+        # (a disk read with SQLite) happens outside it, by the key's leader
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = _Flight(fp)
+                leader = True
+            else:
+                if flight.fingerprint != fp:
+                    self.conflicts += 1
+                    raise IdempotencyConflict(key)
+                self.collapsed += 1
+                leader = False
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+
+        try:
+            stored = self.store.get(key)
+            if stored is not None:
+                with self._lock:
+                    if stored[0] != fp:
+                        self.conflicts += 1
+                        raise IdempotencyConflict(key)
+                    self.replayed += 1
+                flight.result = stored[1]
+                return flight.result, True
+
+            flight.result = compute()
+            try:
+                self.store.put(key, fp, flight.result)
+            except Exception as e:
+                # The result has been scored and audited already; failing the
+                # request now would make the client's retry do it twice
+                with self._lock:
+                    self.store_errors += 1
+                print(f"Idempotency store write failed for {key}: {e}")
+            with self._lock:
+                self.computed += 1
+            return flight.result, False
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def stats(self):
+        return {
+            **self.store.stats(),
+            "in_flight": len(self._flights),
+            "computed": self.computed,
+            "replayed": self.replayed,
+            "collapsed": self.collapsed,
+            "conflicts": self.conflicts,
+            "store_errors": self.store_errors,
+        }
+
+
+def make_store(backend, path, max_size, ttl_seconds):
+    if backend == "memory":
+        return MemoryStore(max_size, ttl_seconds)
+    if backend == "sqlite":
+        return SQLiteStore(path, max_size, ttl_seconds)
+    raise ValueError(f"Unknown idempotency backend {backend!r} (expected memory or sqlite)")
+
+
+idempotency = IdempotencyLayer(make_store(
+    config.IDEMPOTENCY_BACKEND,
+    config.IDEMPOTENCY_DB_PATH,
+    config.IDEMPOTENCY_MAX_SIZE,
+    config.IDEMPOTENCY_TTL_SECONDS,
+))
@@ -0,0 +1,362 @@
+import glob
+import hashlib
+import mmap
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+import numpy as np
+
+from app.core import config
+
+# Prometheus metrics for the scoring hot path.
+#
+# Every metric and every label combination is declared up front, so each
+# process's values form one flat float64 array with the same layout. With
+# CREDIT_METRICS_DIR set, that array is a memory-mapped file per process
+# (metrics-<layout>-<pid>.bin) and /metrics sums the files of all uvicorn
+# workers, plus an archive of workers that have exited; without it the array
+# lives in memory and /metrics reports this process only. Recording is a
+# bisect and two additions under a per-process lock, around a microsecond.
+
+# Upper bounds (seconds) of the latency histograms
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LOAD_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class _Metric:
+    def __init__(self, registry, kind, name, help, labelnames, labelsets, slots):
+        self.kind = kind
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.labelsets = [tuple(str(v) for v in labels) for labels in labelsets]
+        self.slots = slots  # values per label set
+        self.offset = registry.size
+        self._registry = registry
+        self._index = {labels: i for i, labels in enumerate(self.labelsets)}
+
+    def _slot(self, labels):
+        return self.offset + self._index[tuple(labels)] * self.slots
+
+
+class _CounterChild:
+    __slots__ = ("_registry", "_slot")
+
+    def __init__(self, registry, slot):
+        self._registry = registry
+        self._slot = slot
+
+    def inc(self, amount=1.0):
+        self._registry.add(self._slot, amount)
+
+
+class Counter(_Metric):
+    def labels(self, *labels):
+        return _CounterChild(self._registry, self._slot(labels))
+
+    def inc(self, *labels, amount=1.0):
+        self._registry.add(self._slot(labels), amount)
+
+
+class _HistogramChild:
+    __slots__ = ("_registry", "_slot", "_buckets")
+
+    def __init__(self, registry, slot, buckets):
+        self._registry = registry
+        self._slot = slot
+        self._buckets = buckets
+
+    def observe(self, value):
+        # Slots: one count per bucket (non-cumulative), +Inf, then the sum
+        self._registry.observe(self._slot, bisect_left(self._buckets, value), len(self._buckets) + 1, value)
+
+
+class Histogram(_Metric):
+    def __init__(self, registry, name, help, labelnames, labelsets, buckets):
+        super().__init__(registry, "histogram", name, help, labelnames, labelsets, len(buckets) + 2)
+        self.buckets = tuple(buckets)
+
+    def labels(self, *labels):
+        return _HistogramChild(self._registry, self._slot(labels), self.buckets)
+
+    def observe(self, value, *labels):
+        self.labels(*labels).observe(value)
+
+
+class Registry:
+    def __init__(self, directory=None):
+        self.directory = directory or None
+        self.metrics = []
+        self.size = 0
+        self._lock = threading.Lock()
+        self._pid = None
+        self._values = None
+
+    def counter(self, name, help, labelnames=(), labelsets=((),)):
+        return self._add(Counter(self, "counter", name, help, labelnames, labelsets, 1))
+
+    def histogram(self, name, help, labelnames=(), labelsets=((),), buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(self, name, help, labelnames, labelsets, buckets))
+
+    def _add(self, metric):
+        if self._values is not None:
+            raise RuntimeError("Metrics must be declared before the first observation")
+        self.metrics.append(metric)
+        self.size += len(metric.labelsets) * metric.slots
+        return metric
+
+    @property
+    def layout(self):
+        """Hash of the declared metrics; files are only summed with matching layouts."""
+        spec = repr([(m.name, m.kind, m.labelsets, m.slots) for m in self.metrics])
+        return hashlib.sha256(spec.encode()).hexdigest()[:12]
+
+    def _path(self, suffix):
+        return os.path.join(self.directory, f"metrics-{self.layout}-{suffix}.bin")
+
+    def _open(self):
+        # Called with the lock held, once per process (also after a fork)
+        pid = os.getpid()
+        if self.directory is None:
+            buffer = bytearray(self.size * 8)
+        else:
+            os.makedirs(self.directory, exist_ok=True)
+            self._fold_exited()
+            with open(self._path(pid), "w+b") as f:
+                f.truncate(self.size * 8)
+                buffer = mmap.mmap(f.fileno(), self.size * 8)
+        # A float view of the buffer: element updates cost a fraction of numpy's
+        self._values = memoryview(buffer).cast("d")
+        self._pid = pid
+
+    def _fold_exited(self):
+        """
+        Adds the files of exited workers into one archive file and removes
+        them, so totals keep counting up when uvicorn replaces a worker.
+        """
+        if os.name != "posix":
+            return  # liveness check below needs POSIX signals
+        import fcntl
+
+        with open(os.path.join(self.directory, f"metrics-{self.layout}.lock"), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            exited = []
+            for path in glob.glob(self._path("*")):
+                match = re.search(r"-(\d+)\.bin$", path)
+                if match is None:
+                    continue  # the archive
+                try:
+                    os.kill(int(match.group(1)), 0)
+                except ProcessLookupError:
+                    exited.append(path)
+                except PermissionError:
+                    pass  # alive, another user's process
+            if not exited:
+                return
+            archive_path = self._path("archive")
+            archive = _read(archive_path, self.size)
+            if archive is None:
+                archive = np.zeros(self.size)
+            for path in exited:
+                values = _read(path, self.size)
+                if values is not None:
+                    archive += values
+            tmp = archive_path + ".tmp"
+            archive.tofile(tmp)
+            os.replace(tmp, archive_path)
+            for path in exited:
+                os.remove(path)
+
+    def add(self, slot, amount):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._open()
+            self._values[slot] += amount
+
+    def observe(self, slot, bucket, n_buckets, value):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._open()
+            values = self._values
+            values[slot + bucket] += 1
+            values[slot + n_buckets] += value
+
+    def collect(self):
+        """Values summed over every process sharing the metrics directory."""
+        with self._lock:
+            if self._pid != os.getpid():
+                self._open()
+            if self.directory is None:
+                return np.array(self._values, dtype=np.float64)
+        total = np.zeros(self.size)
+        # Live workers, plus the archive of exited ones
+        for path in glob.glob(self._path("*")):
+            values = _read(path, self.size)
+            if values is not None:
+                total += values
+        return total
+
+    def render(self):
+        """Prometheus text exposition format."""
+        values = self.collect()
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for i, labels in enumerate(metric.labelsets):
+                slot = metric.offset + i * metric.slots
+                pairs = [f'{k}="{v}"' for k, v in zip(metric.labelnames, labels)]
+                if metric.kind == "counter":
+                    lines.append(f"{metric.name}{_labels(pairs)} {_number(values[slot])}")
+                    continue
+                counts = np.cumsum(values[slot:slot + len(metric.buckets) + 1])
+                for bound, count in zip(metric.buckets + ("+Inf",), counts):
+                    le = 'le="%s"' % (bound if isinstance(bound, str) else _number(bound))
+                    lines.append(f"{metric.name}_bucket{_labels(pairs + [le])} {_number(count)}")
+                lines.append(f"{metric.name}_sum{_labels(pairs)} {_number(values[slot + len(metric.buckets) + 1])}")
+                lines.append(f"{metric.name}_count{_labels(pairs)} {_number(counts[-1])}")
+        return "\n".join(lines) + "\n"
+
+
+def _read(path, size):
+    try:
+        values = np.fromfile(path, dtype=np.float64)
+    except OSError:
+        return None  # removed meanwhile
+    return values if len(values) == size else None
+
+
+def _labels(pairs):
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+registry = Registry(config.METRICS_DIR)
+
+# Instrumented endpoints (path below /api/v1 -> label); everything else is "other"
+ENDPOINTS = ("predict", "predict/decision", "what-if", "predict/batch", "predict/columnar", "predict/stream",
+             "what-if/sweep", "apply", "apply/batch", "outcomes", "other")
+STATUS_CLASSES = ("2xx", "3xx", "4xx", "5xx")
+
+# Stages of each endpoint's handler, in order. "parse" runs from the request
+# arriving to the handler starting: body read, JSON decoding, Pydantic
+# validation and (for sync handlers) the hop to the thread pool.
+STAGES = {
+    "predict": ("parse", "features", "score", "describe", "record"),
+    "what-if": ("parse", "features", "score", "describe"),
+    "apply": ("parse", "rules", "response", "record"),
+}
+MODEL_STAGES = ("predict", "explain_fast", "explain_exact")
+
+http_requests = registry.counter(
+    "credit_http_requests_total", "HTTP requests by endpoint and status class.",
+    ("endpoint", "status"), [(e, s) for e in ENDPOINTS for s in STATUS_CLASSES],
+)
+http_duration = registry.histogram(
+    "credit_http_request_duration_seconds", "Request latency from arrival to the last response byte.",
+    ("endpoint",), [(e,) for e in ENDPOINTS],
+)
+stage_duration = registry.histogram(
+    "credit_stage_duration_seconds", "Time spent in each stage of a request handler.",
+    ("endpoint", "stage"), [(e, s) for e, stages in STAGES.items() for s in stages],
+)
+model_stage_duration = registry.histogram(
+    "credit_model_stage_duration_seconds", "Model calls per (micro)batch: probabilities and explanations.",
+    ("stage",), [(s,) for s in MODEL_STAGES],
+)
+batch_size = registry.histogram(
+    "credit_microbatch_size", "Rows per micro-batch.", buckets=BATCH_SIZE_BUCKETS,
+)
+batch_wait = registry.histogram(
+    "credit_microbatch_wait_seconds", "Time a row waits in the micro-batcher queue.",
+)
+shap_fallbacks = registry.counter(
+    "credit_shap_fallbacks_total", "Predictions answered with the fallback factors because the explanation failed.",
+)
+model_rejections = registry.counter(
+    "credit_model_rejections_total", "Model calls refused (queue full) or dropped (deadline passed).",
+    ("reason",), [("queue_full",), ("deadline",)],
+)
+decision_exits = registry.counter(
+    "credit_decision_index_rows_total", "Decision-only rows by how the decision index settled them.",
+    ("exit",), [("early",), ("full",)],
+)
+audit_dropped = registry.counter(
+    "credit_audit_dropped_total", "Decisions not written to the audit log because its queue was full.",
+)
+model_load_duration = registry.histogram(
+    "credit_model_load_duration_seconds", "Model build and warm-up time per successful load.", buckets=LOAD_BUCKETS,
+)
+model_load_failures = registry.counter(
+    "credit_model_load_failures_total", "Model loads that failed (the previous model keeps serving).",
+)
+
+_ENDPOINT_BY_PATH = {f"/api/v1/{e}": e for e in ENDPOINTS if e != "other"}
+_HTTP_CHILDREN = {(e, s): http_requests.labels(e, s) for e in ENDPOINTS for s in STATUS_CLASSES}
+_DURATION_CHILDREN = {e: http_duration.labels(e) for e in ENDPOINTS}
+
+# perf_counter() at which the current request arrived (set by MetricsMiddleware)
+_request_started = ContextVar("request_started", default=None)
+
+
+class StageTimer:
+    """Records consecutive handler stages; the first one starts at request arrival."""
+    __slots__ = ("_children", "_last")
+
+    def __init__(self, endpoint):
+        self._children = _STAGE_CHILDREN[endpoint]
+        now = time.perf_counter()
+        started = _request_started.get()
+        self._last = now
+        if started is not None:
+            self._children["parse"].observe(now - started)
+
+    def mark(self, stage):
+        """Ends `stage` (timed from the previous mark)."""
+        now = time.perf_counter()
+        self._children[stage].observe(now - self._last)
+        self._last = now
+
+
+_STAGE_CHILDREN = {e: {s: stage_duration.labels(e, s) for s in stages} for e, stages in STAGES.items()}
+
+
+class MetricsMiddleware:
+    """Counts requests and times them end to end (pure ASGI, no per-request objects)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        endpoint = _ENDPOINT_BY_PATH.get(scope["path"].rstrip("/"), "other")
+        token = _request_started.set(started)
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _request_started.reset(token)
+            _DURATION_CHILDREN[endpoint].observe(time.perf_counter() - started)
+            _HTTP_CHILDREN[(endpoint, f"{min(max(status // 100, 2), 5)}xx")].inc()
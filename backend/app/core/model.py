@@ -1,56 +1,679 @@
-import joblib
-import xgboost as xgb
-import shap
-import pandas as pd
 import numpy as np
 import os
+import io
+import time
+import hashlib
+import json
+import threading
+from collections import OrderedDict, namedtuple
+from app.core import config
+from app.core.bundle import METADATA_FILE, file_sha256, is_bundle, load_bundle
+from app.core.drift import DRIFT_FILE, drift_monitor
+from app.core.metrics import (MODEL_STAGES, decision_exits, model_load_duration, model_load_failures,
+                              model_stage_duration, shap_fallbacks)
+from app.core.evaluation import DECISION_CUTOFFS, get_decision, get_risk_category, load_report
+from app.core.features import FEATURES, feature_pipeline
+from app.core.forest import CompiledForest, DecisionIndex, verify_decisions, verify_parity
 
-MODEL_PATH = r"c:/Users/parik/OneDrive/Desktop/barclays/backend/app/model/model.pkl"
+# joblib, xgboost and shap are imported lazily (they are slow to import and
+# only needed once a model is actually being loaded or explained), which keeps
+# process start-up fast.
+
+# Explanation tiers accepted by CreditModel.score:
+#   exact - SHAP TreeExplainer (audit grade)
+#   fast  - Saabas path attributions from the same pass as the prediction
+#   none  - probability only
+EXPLAIN_LEVELS = ("exact", "fast", "none")
+
+_MODEL_STAGES = {stage: model_stage_duration.labels(stage) for stage in MODEL_STAGES}
+
+# A registered challenger: the server keeps only this; the shadow scorer
+# (app/core/shadow.py) loads and owns the model itself
+Challenger = namedtuple("Challenger", ["path", "version", "loaded_at"])
+
+def top_k_contributions(values, k=3):
+    """
+    Picks the k largest |values| per row with a partial selection (no full
+    sort). Results are ordered by descending magnitude and ties keep feature
+    order, i.e. the same as a stable sort. Returns (indices, values), each (n, k).
+    """
+    values = np.asarray(values)
+    n, n_features = values.shape
+    k = min(k, n_features)
+    magnitude = np.abs(values)
+
+    # k-th largest magnitude per row; everything above it is in, ties are
+    # filled in feature order
+    kth = -np.partition(-magnitude, k - 1, axis=1)[:, k - 1:k]
+    above = magnitude > kth
+    ties = magnitude == kth
+    room = k - above.sum(axis=1, keepdims=True)
+    selected = above | (ties & (np.cumsum(ties, axis=1) <= room))
+
+    idx = np.nonzero(selected)[1].reshape(n, k)
+    order = np.argsort(-np.take_along_axis(magnitude, idx, axis=1), axis=1, kind="stable")
+    idx = np.take_along_axis(idx, order, axis=1)
+    return idx, np.take_along_axis(values, idx, axis=1)
+
+def prediction_columns(raw, probs, top, explain):
+    """
+    Result columns for a scored raw matrix: /predict/columnar, /predict/stream
+    and the bulk_score output layout. `top` is the (indices, values) pair
+    from score(), or None when explanations failed.
+    """
+    columns = {
+        "default_probability": probs.astype(np.float64),
+        "risk_category": np.array([get_risk_category(p) for p in probs], dtype=object),
+        "decision": np.array([get_decision(p) for p in probs], dtype=object),
+        **feature_pipeline.derived(raw, ("risk_index",)),
+    }
+    if explain != "none":
+        if top is None and len(probs):
+            shap_fallbacks.inc(amount=len(probs))
+        names = np.asarray(FEATURES, dtype=object)
+        for j in range(3):
+            if top is None:
+                columns[f"factor_{j + 1}"] = np.full(len(probs), None, dtype=object)
+                columns[f"impact_{j + 1}"] = np.full(len(probs), np.nan)
+            else:
+                columns[f"factor_{j + 1}"] = names[top[0][:, j]]
+                columns[f"impact_{j + 1}"] = top[1][:, j].astype(np.float64)
+    return columns
+
+class PredictionCache:
+    """
+    Thread-safe LRU cache of per-row scoring results with an optional TTL.
+    Keys are built by the caller from the model version, the explanation
+    request and the canonical float32 feature bytes.
+    """
+    def __init__(self, max_size=10000, ttl_seconds=0):
+        self.max_size = max_size
+        self.ttl = ttl_seconds
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def enabled(self):
+        return self.max_size > 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+def canonical_rows(X):
+    """float32 rows with -0.0 and NaN payloads normalised, so equal inputs share a key."""
+    X = np.asarray(X, dtype=np.float32) + np.float32(0.0)
+    X[np.isnan(X)] = np.nan
+    return X
+
+class ModelNotReady(Exception):
+    """Raised when scoring is attempted before a model has been loaded."""
+
+class LoadedModel:
+    """
+    One model generation, built from a pickled XGBClassifier or a model bundle
+    (app/core/bundle.py). The XGBoost booster and the SHAP explainer are created
+    on first use (or by prepare() right after the swap), so a bundle can start
+    serving from its memory-mapped tree arrays within milliseconds.
+    Requests that hold a reference keep a consistent model across reloads.
+    """
+    def __init__(self, forest, version, path, signature, iteration_range, n_features,
+                 estimator=None, booster=None, bundle=None):
+        self.forest = forest
+        self.version = version
+        self.path = path
+        self.signature = signature  # artifact (mtime_ns, size) when loaded
+        self.iteration_range = iteration_range
+        self.n_features = n_features
+        self.estimator = estimator  # sklearn wrapper, pickle artifacts only
+        self.bundle = bundle
+        self._booster = booster
+        self._explainer = None
+        self.decision_index = None  # built by prepare()
+        self._lock = threading.RLock()
+        self.loaded_at = time.time()
+
+    @property
+    def model(self):
+        return self.estimator
+
+    @property
+    def metadata(self):
+        return self.bundle.metadata if self.bundle is not None else {}
+
+    @property
+    def fill_values(self):
+        # Training replacements for missing inputs (bundles only)
+        return self.bundle.fill_values if self.bundle is not None else {}
+
+    @property
+    def evaluation(self):
+        # Hold-out report exported with the bundle (pickles carry none)
+        return load_report(self.bundle.path, self.version) if self.bundle is not None else None
+
+    @property
+    def drift_reference(self):
+        # Training histograms exported with the bundle, or None
+        if self.bundle is None:
+            return None
+        path = os.path.join(self.bundle.path, DRIFT_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    @property
+    def booster(self):
+        if self._booster is None:
+            with self._lock:
+                if self._booster is None:
+                    self._booster = self.bundle.load_booster()
+        return self._booster
+
+    @property
+    def explainer(self):
+        if self._explainer is None:
+            with self._lock:
+                if self._explainer is None:
+                    import shap
+                    # Pickles explain the sklearn wrapper; bundles have no
+                    # wrapper and explain the booster rebuilt from their trees
+                    self._explainer = shap.TreeExplainer(self.estimator if self.estimator is not None else self.booster)
+        return self._explainer
+
+    @property
+    def explainer_ready(self):
+        return self._explainer is not None
+
+    def prepare(self, explainer=True):
+        """
+        Builds the decision index and the XGBoost/SHAP side ahead of the first
+        request that needs them (the SHAP explainer only with `explainer`).
+        Bundles were parity-checked on the machine that exported them; the
+        check is repeated here because the platform's expf may differ.
+        """
+        self.decision_index = compile_decision_index(self.forest)
+        if explainer:
+            self.explainer
+        if self.bundle is not None and self.forest is not None:
+            mismatches = verify_parity(self.forest, self._xgboost_predict)
+            if mismatches:
+                print(f"Native engine disagrees with XGBoost on {mismatches} rows, using XGBoost")
+                # Fields changed after the swap; each is one atomic assignment
+                self.decision_index = None
+                self.forest = None
+
+    def _xgboost_predict(self, features):
+        if self.estimator is not None:
+            return self.estimator.predict_proba(features)[:, 1]
+        return self.booster.inplace_predict(features, iteration_range=self.iteration_range)
+
+    def predict(self, features):
+        # Small inputs skip the sklearn wrapper / DMatrix entirely
+        forest = self.forest
+        if forest is not None and len(features) <= config.NATIVE_MAX_ROWS:
+            return forest.predict_proba(np.asarray(features, dtype=np.float32))
+
+        prob = self._xgboost_predict(features)
+        return prob
+
+    def explain(self, features):
+        shap_values = self.explainer.shap_values(features)
+        return shap_values
+
+    def decide(self, features):
+        """
+        Returns (buckets, early, trees): the decision bucket (index into
+        DECISIONS) of each row, whether it was settled before the last tree,
+        and the trees visited for it (None when the index is off).
+        """
+        index = self.decision_index
+        if index is None:
+            probs = np.asarray(self.predict(features), dtype=np.float64)
+            return np.searchsorted(DECISION_CUTOFFS, probs, side="right"), np.zeros(len(probs), dtype=bool), None
+        buckets, trees = index.decide(features)
+        return buckets, trees < index.forest.n_trees, trees
+
+    def approx_contributions(self, features):
+        """Saabas attributions from XGBoost itself (used when the native engine is off)."""
+        import xgboost as xgb
+        booster = self.booster
+        dmatrix = xgb.DMatrix(np.asarray(features, dtype=np.float32), feature_names=booster.feature_names)
+        contribs = booster.predict(dmatrix, pred_contribs=True, approx_contribs=True, iteration_range=self.iteration_range)
+        return contribs[:, :-1]  # last column is the bias
+
+    def score(self, X, explain, k):
+        # Fast tier on the native engine: prediction and attributions in one traversal
+        forest = self.forest
+        started = time.perf_counter()
+        if explain == "fast" and forest is not None:
+            probs, contribs = forest.predict_with_contributions(X)
+            _MODEL_STAGES["explain_fast"].observe(time.perf_counter() - started)
+            return probs, top_k_contributions(contribs, k)
+
+        probs = self.predict(X)
+        predicted = time.perf_counter()
+        _MODEL_STAGES["predict"].observe(predicted - started)
+        if explain == "none":
+            return probs, None
+
+        try:
+            if explain == "fast":
+                contribs = self.approx_contributions(X)
+            else:
+                contribs = self.explain(X)
+                if isinstance(contribs, list):
+                    contribs = contribs[0]
+            top = top_k_contributions(np.asarray(contribs).reshape(len(X), -1), k)
+            _MODEL_STAGES[f"explain_{explain}"].observe(time.perf_counter() - predicted)
+            return probs, top
+        except Exception as e:
+            print(f"SHAP Error: {e}")
+            return probs, None
+
+def file_signature(path):
+    # A bundle directory changes when its metadata.json is replaced
+    if os.path.isdir(path):
+        path = os.path.join(path, METADATA_FILE)
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+def compile_model(model, iteration_range):
+    """
+    Flattens the booster into NumPy arrays for the native engine and checks it
+    against XGBoost. Returns None (XGBoost path) if disabled or not identical.
+    """
+    if config.INFERENCE_ENGINE != "native":
+        return None
+    try:
+        forest = CompiledForest.from_booster(model.get_booster(), iteration_range)
+        mismatches = verify_parity(forest, lambda X: model.predict_proba(X)[:, 1])
+        if mismatches:
+            print(f"Native engine disagrees with XGBoost on {mismatches} rows, using XGBoost")
+            return None
+        print(f"Native engine compiled ({forest.n_trees} trees, {len(forest.feature)} nodes)")
+        return forest
+    except Exception as e:
+        print(f"Native engine unavailable: {e}")
+        return None
+
+def compile_decision_index(forest):
+    """
+    Early-exit decision index on the native engine, checked against full
+    scoring. Returns None (score every tree) if disabled or not identical.
+    """
+    if forest is None or not config.DECISION_INDEX_ENABLED:
+        return None
+    try:
+        index = DecisionIndex(forest, DECISION_CUTOFFS)
+        mismatches = verify_decisions(index)
+        if mismatches:
+            print(f"Decision index disagrees with full scoring on {mismatches} rows, not using it")
+            return None
+        return index
+    except Exception as e:
+        print(f"Decision index unavailable: {e}")
+        return None
+
+def model_version(path):
+    """Version of the artifact at `path` (as build_model reports it) without loading the model."""
+    if file_signature(path) is None:
+        raise FileNotFoundError(f"Model not found at {path}")
+    if is_bundle(path):
+        with open(os.path.join(path, METADATA_FILE)) as f:
+            return json.load(f)["model_version"]
+    return file_sha256(path)[:16]
+
+def build_model(path):
+    """Loads the artifact at `path` (bundle directory or pickle) for serving."""
+    signature = file_signature(path)
+    if signature is None:
+        raise FileNotFoundError(f"Model not found at {path}")
+
+    if is_bundle(path):
+        bundle = load_bundle(path)
+        forest = bundle.forest if config.INFERENCE_ENGINE == "native" else None
+        return LoadedModel(forest, bundle.metadata["model_version"], path, signature,
+                           bundle.iteration_range, len(bundle.features), bundle=bundle)
+
+    import joblib
+    with open(path, "rb") as f:
+        raw = f.read()
+    model = joblib.load(io.BytesIO(raw))
+    # Content hash identifies the model in cache keys
+    version = hashlib.sha256(raw).hexdigest()[:16]
+    booster = model.get_booster()
+    # predict_proba only uses trees up to best_iteration when early stopping was used
+    best_iteration = getattr(model, "best_iteration", None)
+    iteration_range = (0, best_iteration + 1) if best_iteration is not None else (0, booster.num_boosted_rounds())
+    forest = compile_model(model, iteration_range)
+    return LoadedModel(forest, version, path, signature, iteration_range, int(model.n_features_in_),
+                       estimator=model, booster=booster)
+
+def warm_up(state, levels=EXPLAIN_LEVELS):
+    # One inference per tier so lazy initialisation (XGBoost predictor, SHAP
+    # buffers) happens before real traffic needs it
+    X = np.zeros((1, state.n_features), dtype=np.float32)
+    for explain in levels:
+        state.score(X, explain, 3)
 
 class CreditModel:
-    def __init__(self):
-        self.model = None
-        self.explainer = None
-        self.load_model()
+    """
+    Serves the current model generation and manages its lifecycle: background
+    start-up load, warm-up, hot reload (file watcher or admin call) and atomic
+    swap. Readers take `self._state` once per call; a reload builds the next
+    LoadedModel off to the side and replaces the reference in one assignment.
+
+    It also holds the challengers (name -> Challenger), swapped the same way.
+    Challengers never answer requests; app/core/shadow.py loads and scores
+    them on the champion's traffic off the request path.
+    """
+    def __init__(self, path=None):
+        self.path = path or config.MODEL_PATH
+        self.cache = PredictionCache(config.CACHE_MAX_SIZE, config.CACHE_TTL_SECONDS)
+        self._state = None
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher = None
+        self.reloading = False
+        self.reloads = 0
+        self.last_error = None
+        self.load_seconds = None
+        self.challengers = {}
+        self.challenger_errors = {}
+        # /predict/decision rows, across model generations
+        self.decision_stats = {"rows": 0, "early_exits": 0, "indexed_rows": 0, "trees_visited": 0}
+        self._stats_lock = threading.Lock()
+
+    # Convenience accessors for the current generation
+    @property
+    def ready(self):
+        return self._state is not None
+
+    @property
+    def model(self):
+        state = self._state
+        return state.model if state else None
 
-    def load_model(self):
-        if os.path.exists(MODEL_PATH):
+    @property
+    def explainer(self):
+        state = self._state
+        return state.explainer if state else None
+
+    @property
+    def forest(self):
+        state = self._state
+        return state.forest if state else None
+
+    @property
+    def version(self):
+        state = self._state
+        return state.version if state else None
+
+    def current(self):
+        state = self._state
+        if state is None:
+            raise ModelNotReady("Model not loaded")
+        return state
+
+    def load_model(self, explainer=True):
+        """
+        Builds, warms up and swaps in the model from `self.path`. Blocks until
+        done; on failure the previous generation (if any) keeps serving.
+        With explainer=False the SHAP explainer is left to the first exact
+        request. Returns True when a new model was swapped in.
+        """
+        with self._reload_lock:
+            self.reloading = True
+            started = time.perf_counter()
             try:
-                self.model = joblib.load(MODEL_PATH)
-                print(f"Model loaded from {MODEL_PATH}")
-                # Initialize SHAP explainer
-                # For TreeExplainer with XGBoost, we might need the booster or the model itself
-                # If model is sklearn wrapper, use model.get_booster() or just model
-                self.explainer = shap.TreeExplainer(self.model)
+                state = build_model(self.path)
+                warm_up(state, ("none", "fast"))
+            except FileNotFoundError as e:
+                model_load_failures.inc()
+                self.last_error = str(e)
+                print(f"{e}. Prediction endpoints will fail until model is trained.")
+                return False
             except Exception as e:
+                model_load_failures.inc()
+                self.last_error = str(e)
                 print(f"Error loading model: {e}")
-        else:
-            print(f"Model not found at {MODEL_PATH}. Prediction endpoints will fail until model is trained.")
-
-    def predict(self, features: pd.DataFrame):
-        if not self.model:
-            self.load_model()
-            if not self.model:
-                raise Exception("Model not loaded")
-        
-        # Ensure features are in correct order (same as training)
-        # We might need to enforce column order here based on training time
-        # For now, assuming input DF has correct columns
-        
-        prob = self.model.predict_proba(features)[:, 1]
-        return prob
+                return False
+            finally:
+                self.reloading = False
 
-    def explain(self, features: pd.DataFrame):
-        if not self.explainer:
-            if not self.model:
-                self.load_model()
-            if self.model:
-                self.explainer = shap.TreeExplainer(self.model)
-        
-        if not self.explainer:
-            raise Exception("Explainer not initialized")
+            if self._state is not None:
+                self.reloads += 1
+            self._state = state
+            self.cache.clear()
+            drift_monitor.activate(state.version, state.drift_reference)
+            self.last_error = None
+            self.load_seconds = time.perf_counter() - started
+            model_load_duration.observe(self.load_seconds)
+            print(f"Model loaded from {self.path} (version {state.version}, {self.load_seconds:.3f}s)")
 
-        shap_values = self.explainer.shap_values(features)
-        return shap_values
+            # Serving already; now build the SHAP explainer for exact explanations
+            try:
+                state.prepare(explainer)
+                if explainer:
+                    warm_up(state, ("exact",))
+            except Exception as e:
+                print(f"Explainer warm-up failed: {e}")
+            return True
+
+    def load_challenger(self, path, name=None):
+        """
+        Adds the model at `path` as a challenger, replacing one with the same
+        name (default: its version). Returns the name. Only its version is
+        read here; the shadow scorer builds the model, and reports an error
+        if the file no longer holds that version. Challengers are not
+        hot-reloaded; load one again to replace it.
+        """
+        version = model_version(path)
+        name = name or version
+        self.challengers = {**self.challengers, name: Challenger(path, version, time.time())}
+        self.challenger_errors.pop(path, None)
+        print(f"Challenger {name} registered from {path} (version {version})")
+        return name
+
+    def remove_challenger(self, name):
+        challengers = dict(self.challengers)
+        if challengers.pop(name, None) is None:
+            return False
+        self.challengers = challengers
+        return True
+
+    def _load_challengers(self, paths):
+        for path in paths:
+            try:
+                self.load_challenger(path)
+            except Exception as e:
+                self.challenger_errors[path] = str(e)
+                print(f"Error loading challenger {path}: {e}")
+
+    def reload_async(self):
+        """Starts a background reload. Returns False if one is already running."""
+        if self._reload_lock.locked():
+            return False
+        threading.Thread(target=self.load_model, name="model-reload", daemon=True).start()
+        return True
+
+    def start(self, watch_interval=None):
+        """Loads the model in the background and starts the file watcher."""
+        self._stop.clear()
+        self.reload_async()
+        if config.CHALLENGER_PATHS:
+            threading.Thread(target=self._load_challengers, args=(config.CHALLENGER_PATHS,),
+                             name="challenger-load", daemon=True).start()
+        interval = config.MODEL_WATCH_INTERVAL if watch_interval is None else watch_interval
+        if interval > 0 and (self._watcher is None or not self._watcher.is_alive()):
+            self._watcher = threading.Thread(target=self._watch, args=(interval,), name="model-watcher", daemon=True)
+            self._watcher.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _watch(self, interval):
+        pending = None
+        while not self._stop.wait(interval):
+            signature = file_signature(self.path)
+            state = self._state
+            if signature is None or (state is not None and signature == state.signature):
+                pending = None
+                continue
+            # Only reload once the file has stopped changing for one interval,
+            # so a half-written artifact is never picked up
+            if signature == pending and not self._reload_lock.locked():
+                print(f"Model file changed, reloading {self.path}")
+                self.reload_async()
+                pending = None
+            else:
+                pending = signature
+
+    def status(self):
+        state = self._state
+        return {
+            "ready": state is not None,
+            "model_version": state.version if state else None,
+            "model_path": self.path,
+            "loaded_at": state.loaded_at if state else None,
+            "load_seconds": self.load_seconds,
+            "native_engine": bool(state and state.forest is not None),
+            "explainer_ready": bool(state and state.explainer_ready),
+            "artifact": "bundle" if state and state.bundle is not None else ("pickle" if state else None),
+            "reloading": self.reloading,
+            "reloads": self.reloads,
+            "last_error": self.last_error,
+            "challengers": {name: {"version": c.version, "path": c.path, "loaded_at": c.loaded_at}
+                            for name, c in self.challengers.items()},
+            "challenger_errors": dict(self.challenger_errors),
+        }
+
+    def predict(self, features):
+        """
+        Default probability for each row. `features` is a DataFrame or an
+        array-like in training column order.
+        """
+        return self.current().predict(features)
+
+    def explain(self, features):
+        return self.current().explain(features)
+
+    def decide(self, features):
+        """
+        Decision bucket (index into DECISIONS) of each row, from the early-exit
+        decision index when available. Same result as bucketing predict().
+        Returns (buckets, early): `early` marks rows settled before the last tree.
+        """
+        buckets, early, trees = self.current().decide(np.asarray(features, dtype=np.float32))
+        n_early = int(np.count_nonzero(early))
+        decision_exits.inc("early", amount=n_early)
+        decision_exits.inc("full", amount=len(buckets) - n_early)
+        with self._stats_lock:
+            self.decision_stats["rows"] += len(buckets)
+            self.decision_stats["early_exits"] += n_early
+            if trees is not None:
+                self.decision_stats["indexed_rows"] += len(buckets)
+                self.decision_stats["trees_visited"] += int(trees.sum())
+        return buckets, early
+
+    def decision_index_stats(self):
+        state = self._state
+        index = state.decision_index if state else None
+        stats = dict(self.decision_stats)
+        return {
+            "enabled": config.DECISION_INDEX_ENABLED,
+            "active": index is not None,
+            "model_version": state.version if state else None,
+            "trees": index.forest.n_trees if index else None,
+            "walk_max_rows": index.MAX_ROWS if index else None,
+            **stats,
+            "early_exit_rate": stats["early_exits"] / stats["rows"] if stats["rows"] else None,
+            "mean_trees_visited": stats["trees_visited"] / stats["indexed_rows"] if stats["indexed_rows"] else None,
+        }
+
+    def score(self, features, explain="exact", k=3, cache=True):
+        """
+        Probabilities plus the top-k contributing features for each row.
+        Returns (probs, top) where top is (indices, values) from
+        top_k_contributions, or None when explain="none" or the explanation failed.
+        Rows seen before (same model version) are served from the cache;
+        cache=False bypasses it (synthetic rows that would only evict real ones).
+        """
+        if explain not in EXPLAIN_LEVELS:
+            raise ValueError(f"Unknown explain level: {explain}")
+        state = self.current()
+        X = np.asarray(features, dtype=np.float32)
+        if not (cache and self.cache.enabled):
+            return state.score(X, explain, k)
+
+        X = canonical_rows(X)
+        prefix = (state.version, explain, k)
+        keys = [prefix + (row.tobytes(),) for row in X]
+        cached = [self.cache.get(key) for key in keys]
+        missing = [i for i, hit in enumerate(cached) if hit is None]
+
+        if missing:
+            probs, top = state.score(X[missing], explain, k)
+            if explain != "none" and top is None:
+                # Explanation failed: cache nothing and let the caller fall back
+                out = np.array([0.0 if entry is None else entry[0] for entry in cached], dtype=np.float32)
+                out[missing] = probs
+                return out, None
+            for j, i in enumerate(missing):
+                entry = (probs[j], None if top is None else (top[0][j], top[1][j]))
+                cached[i] = entry
+                self.cache.put(keys[i], entry)
+
+        probs = np.array([entry[0] for entry in cached], dtype=np.float32)
+        if explain == "none":
+            return probs, None
+        return probs, (np.stack([entry[1][0] for entry in cached]), np.stack([entry[1][1] for entry in cached]))
 
 credit_model = CreditModel()
@@ -0,0 +1,153 @@
+from collections import namedtuple
+import numpy as np
+
+# Declarative rule table for the alternative-data (/apply) heuristic scorer.
+#
+# The score is a weighted sum of the applicant's scores plus capped savings and
+# rent bonuses; the risk probability is 1 - score / 100 and is banded into a
+# decision. Factor rules add positive/negative factors and credit-coach
+# recommendations when a field is above/below a threshold. Everything is
+# evaluated column-wise with NumPy, so N applications cost a handful of array
+# operations instead of N passes through a chain of `if` statements.
+
+# Bump when the table below changes; recorded with every audited decision
+RULES_VERSION = "1"
+
+# term = field * weight, or field / divisor when set; capped at `cap` if given.
+# Terms are summed in table order (float addition order matters for parity).
+ScoreTerm = namedtuple("ScoreTerm", ["field", "weight", "divisor", "cap"], defaults=(1.0, None, None))
+
+# Fires `positive` when field > above, otherwise `negative` / `recommendation`
+# when field < below. Messages may be None.
+FactorRule = namedtuple(
+    "FactorRule",
+    ["field", "above", "positive", "below", "negative", "recommendation"],
+    defaults=(None, None, None, None, None),
+)
+
+# Upper bound (exclusive) of the risk probability, decision, risk level
+DecisionBand = namedtuple("DecisionBand", ["upper", "decision", "risk_level"])
+
+SCORE_TERMS = (
+    ScoreTerm("transaction_score", weight=0.30),
+    ScoreTerm("utility_payment_score", weight=0.25),
+    ScoreTerm("business_activity_score", weight=0.25),
+    # 50,000 savings adds the full 10 points
+    ScoreTerm("savings_balance", divisor=5000, cap=10),
+    # Max 10 points
+    ScoreTerm("rent_payment_score", weight=0.10),
+)
+MAX_SCORE = 100
+
+DECISION_BANDS = (
+    DecisionBand(0.30, "APPROVED", "LOW"),
+    DecisionBand(0.60, "MANUAL_REVIEW", "MEDIUM"),
+    DecisionBand(np.inf, "REJECTED", "HIGH"),
+)
+
+FACTOR_RULES = (
+    # Income thresholds adjusted for the Indian context
+    FactorRule("monthly_income",
+               above=25000, positive="Strong income stability",
+               below=10000, negative="Low monthly income",
+               recommendation="Consider adding a co-applicant to boost income eligibility."),
+    FactorRule("transaction_score",
+               above=75, positive="Excellent transaction history",
+               below=50, negative="Irregular cash flow",
+               recommendation="Maintain a consistent balance and avoid frequent overdrafts."),
+    FactorRule("utility_payment_score",
+               above=80, positive="Consistent bill payments",
+               below=50, negative=" missed utility payments",
+               recommendation="Automate your utility bill payments to improve reliability score."),
+    FactorRule("savings_balance",
+               above=20000, positive="Healthy savings buffer",
+               below=5000, recommendation="Try to build a savings buffer of at least ₹10,000."),
+    FactorRule("rent_payment_score",
+               above=80, positive="Timely rent payments"),
+)
+
+# Added when no positive factor fired for a low-risk applicant
+FALLBACK_POSITIVE = "Balanced financial profile"
+FALLBACK_POSITIVE_LEVEL = "LOW"
+# Added when no recommendation fired
+FALLBACK_RECOMMENDATION = "Continue exploring credit builder products."
+
+RULE_FIELDS = sorted({t.field for t in SCORE_TERMS} | {r.field for r in FACTOR_RULES})
+
+
+def weighted_scores(columns):
+    """Heuristic score per row (before the MAX_SCORE cap)."""
+    total = None
+    for term in SCORE_TERMS:
+        x = columns[term.field]
+        value = x / term.divisor if term.divisor is not None else x * term.weight
+        if term.cap is not None:
+            # fmin matches Python's min(cap, value) for NaN inputs too
+            value = np.fmin(term.cap, value)
+        total = value if total is None else total + value
+    return total
+
+
+def _factor_masks(columns, levels):
+    """
+    Bit masks of the messages each row receives: bit k of `positive` is set
+    when rule k's positive factor fired, and so on.
+    """
+    n = len(levels)
+    positive = np.zeros(n, dtype=np.int64)
+    negative = np.zeros(n, dtype=np.int64)
+    recommend = np.zeros(n, dtype=np.int64)
+    for k, rule in enumerate(FACTOR_RULES):
+        x = columns[rule.field]
+        high = x > rule.above if rule.above is not None else np.zeros(n, dtype=bool)
+        low = ~high & (x < rule.below) if rule.below is not None else np.zeros(n, dtype=bool)
+        bit = np.int64(1) << k
+        if rule.positive is not None:
+            positive |= np.where(high, bit, 0)
+        if rule.negative is not None:
+            negative |= np.where(low, bit, 0)
+        if rule.recommendation is not None:
+            recommend |= np.where(low, bit, 0)
+    # Fallbacks use the bit after the last rule
+    fallback = np.int64(1) << len(FACTOR_RULES)
+    positive |= np.where((positive == 0) & (levels == FALLBACK_POSITIVE_LEVEL), fallback, 0)
+    recommend |= np.where(recommend == 0, fallback, 0)
+    return positive, negative, recommend
+
+
+def _expand(masks, attr, fallback=None):
+    # Rows share few distinct message combinations; build each list once.
+    # Rows with the same combination share the list object, so treat it as read-only.
+    messages = [getattr(rule, attr) for rule in FACTOR_RULES] + [fallback]
+    uniques, inverse = np.unique(masks, return_inverse=True)
+    lists = [[m for k, m in enumerate(messages) if int(u) >> k & 1] for u in uniques]
+    return [lists[i] for i in inverse.ravel().tolist()]
+
+
+def evaluate(columns):
+    """
+    Scores N applications. `columns` maps each field in RULE_FIELDS to a
+    float64 array of length N. Returns a dict of per-row lists: decision,
+    risk_probability (rounded to 2 places), risk_level, top_positive_factors,
+    top_negative_factors and recommendations.
+    """
+    columns = {f: np.asarray(columns[f], dtype=np.float64) for f in RULE_FIELDS}
+
+    score = np.fmin(MAX_SCORE, weighted_scores(columns))
+    risk = np.fmax(0.0, np.fmin(1.0, 1.0 - (score / 100.0)))
+
+    band = np.searchsorted([b.upper for b in DECISION_BANDS], risk, side="right")
+    decisions = np.array([b.decision for b in DECISION_BANDS], dtype=object)[band]
+    levels = np.array([b.risk_level for b in DECISION_BANDS], dtype=object)[band]
+
+    positive, negative, recommend = _factor_masks(columns, levels)
+
+    return {
+        "decision": decisions.tolist(),
+        # Python's round, not np.round, which rounds some halves differently
+        "risk_probability": [round(p, 2) for p in risk.tolist()],
+        "risk_level": levels.tolist(),
+        "top_positive_factors": _expand(positive, "positive", FALLBACK_POSITIVE),
+        "top_negative_factors": _expand(negative, "negative"),
+        "recommendations": _expand(recommend, "recommendation", FALLBACK_RECOMMENDATION),
+    }
@@ -0,0 +1,247 @@
+import multiprocessing
+import os
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from app.core import config
+from app.core.model import credit_model
+
+# Champion/challenger shadow scoring.
+#
+# Handlers pass the rows they scored (raw features, training column order)
+# and the champion's probabilities to submit(), which only appends them to a
+# bounded deque: no model work and no locks on the request path, and nothing
+# at all while there are no challengers. A background thread drains the
+# queue every SHADOW_INTERVAL_MS in batches of up to SHADOW_BATCH_SIZE rows,
+# has each challenger score the whole batch (probability only) and folds the
+# comparison into fixed-size stats per challenger:
+#
+#   agreement   share of rows where both models reach the same decision
+#   flips       champion decision -> challenger decision counts
+#   delta       challenger minus champion probability: mean, RMSE, max |delta|
+#               and a histogram of |delta|
+#
+# Stats restart when the champion or that challenger changes version. When
+# the queue is full new submissions are dropped and counted, never waited on.
+#
+# Challengers score in a separate process at the lowest OS priority (the
+# idle scheduling class on Linux, nice 19 elsewhere), which loads and owns
+# the challenger models; the server only knows their paths and versions.
+# In a thread of the server process, even a low-priority one, challenger
+# work would hold the GIL and delay requests whenever the OS preempted it;
+# in its own process it only gets CPU time requests leave idle. The server-side thread just batches, waits and counts.
+
+# Upper bounds of the |delta| histogram bins
+DELTA_BINS = (0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0)
+
+
+# Challenger models of the scoring process: path -> (version the server
+# registered, model actually built from the path) (set by _predict)
+_worker_models = {}
+
+
+def _init_worker():
+    # Linux: only runs when no other process wants the CPU
+    if hasattr(os, "SCHED_IDLE"):
+        try:
+            os.sched_setscheduler(0, os.SCHED_IDLE, os.sched_param(0))
+            return
+        except OSError:
+            pass
+    if hasattr(os, "nice"):
+        os.nice(19)
+
+
+def _predict(path, version, X):
+    # Builds the model once per version the server registered from this path.
+    # The file may hold another version by now; that model is not the
+    # challenger the server reports, so its batches fail instead of being
+    # counted under the requested version. Keyed by the requested version, not
+    # the built one, so such a file is not rebuilt on every batch either.
+    from app.core.model import build_model
+    cached = _worker_models.get(path)
+    if cached is None or cached[0] != version:
+        cached = _worker_models[path] = (version, build_model(path))
+    state = cached[1]
+    if state.version != version:
+        raise ValueError(f"{path} now holds version {state.version}, not {version}; load the challenger again")
+    # Slices the native engine takes, rather than XGBoost's thread pool
+    step = config.NATIVE_MAX_ROWS
+    probs = np.concatenate([state.predict(X[i:i + step]) for i in range(0, len(X), step)])
+    return probs.astype(np.float64)
+
+
+class _Comparison:
+    """Running comparison of one challenger version against one champion version."""
+
+    def __init__(self, champion_version, challenger_version):
+        self.champion_version = champion_version
+        self.challenger_version = challenger_version
+        self.started_at = time.time()
+        self.rows = 0
+        self.agree = 0
+        self.flips = Counter()
+        self.delta_sum = 0.0
+        self.delta_sq_sum = 0.0
+        self.abs_delta_sum = 0.0
+        self.abs_delta_max = 0.0
+        self.histogram = np.zeros(len(DELTA_BINS), dtype=np.int64)
+
+    def add(self, champion_probs, challenger_probs, champion_decisions, challenger_decisions):
+        delta = challenger_probs - champion_probs
+        abs_delta = np.abs(delta)
+        self.rows += len(delta)
+        self.delta_sum += float(delta.sum())
+        self.delta_sq_sum += float(np.dot(delta, delta))
+        self.abs_delta_sum += float(abs_delta.sum())
+        self.abs_delta_max = max(self.abs_delta_max, float(abs_delta.max()))
+        bins = np.minimum(np.searchsorted(DELTA_BINS, abs_delta, side="left"), len(DELTA_BINS) - 1)
+        self.histogram += np.bincount(bins, minlength=len(DELTA_BINS))
+        for a, b in zip(champion_decisions, challenger_decisions):
+            if a == b:
+                self.agree += 1
+            else:
+                self.flips[(a, b)] += 1
+
+    def report(self):
+        n = self.rows
+        labels = [f"<={b}" for b in DELTA_BINS]
+        return {
+            "champion_version": self.champion_version,
+            "challenger_version": self.challenger_version,
+            "since": self.started_at,
+            "rows": n,
+            "agreement_rate": self.agree / n if n else None,
+            "decision_flips": {f"{a}->{b}": c for (a, b), c in self.flips.most_common()},
+            "mean_delta": self.delta_sum / n if n else None,
+            "mean_abs_delta": self.abs_delta_sum / n if n else None,
+            "rmse": float(np.sqrt(self.delta_sq_sum / n)) if n else None,
+            "max_abs_delta": self.abs_delta_max if n else None,
+            "abs_delta_histogram": dict(zip(labels, self.histogram.tolist())),
+        }
+
+
+class ShadowMonitor:
+    def __init__(self, model, batch_size=256, interval_ms=200, max_queue=10000):
+        self.model = model
+        self.batch_size = batch_size
+        self.interval = interval_ms / 1000.0
+        self.max_queue = max_queue
+        self.decide = None
+        self._queue = deque()
+        self._comparisons = {}
+        self._lock = threading.Lock()  # guards _comparisons against report()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pool = None
+        self.submitted = 0
+        self.dropped = 0
+        self.errors = 0
+        self.last_error = None
+
+    def start(self, decide):
+        """Starts the worker; `decide(prob) -> label` is the decision rule compared."""
+        self.decide = decide
+        self._stop.clear()
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="shadow-scorer", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def submit(self, X, probs, version):
+        """
+        Queues rows the champion (`version`) scored for comparison. `X` is one
+        raw row or a 2-D batch, `probs` its champion probabilities.
+        Costs a deque append; does nothing without challengers.
+        """
+        if not self.model.challengers:
+            return
+        if len(self._queue) >= self.max_queue:
+            self.dropped += 1
+            return
+        self._queue.append((version, X, probs))
+        self.submitted += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            while self._queue and not self._stop.is_set():
+                self._process(self._take())
+
+    def _take(self):
+        # Up to batch_size rows scored by one champion version
+        version = self._queue[0][0]
+        items = []
+        rows = 0
+        while self._queue and rows < self.batch_size and self._queue[0][0] == version:
+            _, X, probs = self._queue.popleft()
+            X = np.atleast_2d(X)
+            items.append((X, np.atleast_1d(probs)))
+            rows += len(X)
+        X = np.concatenate([x for x, _ in items])
+        probs = np.concatenate([p for _, p in items]).astype(np.float64)
+        return version, X, probs
+
+    def _process(self, batch):
+        version, X, champion = batch
+        challengers = self.model.challengers
+        if not challengers or self.decide is None:
+            return
+        if self._pool is None:
+            # spawn, not fork: the server runs threads
+            self._pool = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"),
+                                             initializer=_init_worker)
+        features = X.astype(np.float32)
+        champion_decisions = [self.decide(p) for p in champion]
+        for name, state in challengers.items():
+            try:
+                challenger = self._pool.submit(_predict, state.path, state.version, features).result()
+            except Exception as e:
+                self.errors += 1
+                self.last_error = f"{name}: {e}"
+                continue
+            decisions = [self.decide(p) for p in challenger]
+            with self._lock:
+                comparison = self._comparisons.get(name)
+                if (comparison is None or comparison.champion_version != version
+                        or comparison.challenger_version != state.version):
+                    comparison = self._comparisons[name] = _Comparison(version, state.version)
+                comparison.add(champion, challenger, champion_decisions, decisions)
+
+    def report(self):
+        challengers = self.model.challengers
+        with self._lock:
+            # Comparisons of removed challengers are dropped here
+            for name in [n for n in self._comparisons if n not in challengers]:
+                del self._comparisons[name]
+            comparisons = {name: c.report() for name, c in self._comparisons.items()}
+        return {
+            "champion_version": self.model.version,
+            "challengers": {
+                name: comparisons.get(name) or {"challenger_version": state.version, "rows": 0}
+                for name, state in challengers.items()
+            },
+            "queued": len(self._queue),
+            "submitted": self.submitted,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "last_error": self.last_error,
+        }
+
+
+shadow_monitor = ShadowMonitor(
+    credit_model,
+    batch_size=config.SHADOW_BATCH_SIZE,
+    interval_ms=config.SHADOW_INTERVAL_MS,
+    max_queue=config.SHADOW_MAX_QUEUE,
+)
@@ -1,8 +1,37 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from app.api.endpoints import router as api_router
+from app.core.model import credit_model
+from app.core.batcher import prediction_batcher
+from app.core.executor import model_executor
+from app.core.shadow import shadow_monitor
+from app.core.audit import audit_log
+from app.core.evaluation import SCORE_BINS, get_decision, live_metrics
+from app.core import config
+from app.core.metrics import CONTENT_TYPE, MetricsMiddleware, registry
 
-app = FastAPI(title="AI Credit Scoring API", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Model loads in the background so the server accepts connections right
+    # away; scoring endpoints answer 503 until /api/v1/ready reports ready.
+    credit_model.start()
+    model_executor.start()
+    shadow_monitor.start(get_decision)
+    if config.AUDIT_ENABLED:
+        audit_log.start()
+        # Live model metrics resume from the outcomes already on record
+        live_metrics.load(audit_log.outcome_histogram(SCORE_BINS))
+    yield
+    credit_model.stop()
+    await prediction_batcher.stop()
+    model_executor.stop()
+    shadow_monitor.stop()
+    # Flushes decisions still queued for the audit log
+    audit_log.stop()
+
+app = FastAPI(title="AI Credit Scoring API", version="1.0.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -12,8 +41,16 @@ app.add_middleware(
     allow_headers=["*"], # Allows all headers
 )
 
+# Outermost, so request timings include CORS handling and validation
+app.add_middleware(MetricsMiddleware)
+
 app.include_router(api_router, prefix="/api/v1")
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics, summed over all workers when CREDIT_METRICS_DIR is set."""
+    return PlainTextResponse(registry.render(), media_type=CONTENT_TYPE)
+
 @app.get("/")
-def read_root():
+async def read_root():
     return {"message": "Welcome to the AI Credit Scoring API v2"}
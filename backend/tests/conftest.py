@@ -0,0 +1,33 @@
+import os
+
+import joblib
+import pytest
+
+from app.core.forest import CompiledForest
+
+# Keep test runs off the deployment's audit database and metrics directory.
+# Must run before app.core.config is imported.
+os.environ.setdefault("CREDIT_AUDIT_ENABLED", "0")
+os.environ.setdefault("CREDIT_METRICS_DIR", "")
+os.environ.setdefault("CREDIT_IDEMPOTENCY_BACKEND", "memory")
+
+
+MODEL_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "app", "model", "model.pkl")
+
+
+@pytest.fixture(scope="module")
+def model_path():
+    return MODEL_PATH
+
+
+@pytest.fixture(scope="module")
+def model(model_path):
+    return joblib.load(model_path)
+
+
+@pytest.fixture(scope="module")
+def forest(model):
+    best_iteration = getattr(model, "best_iteration", None)
+    booster = model.get_booster()
+    end = best_iteration + 1 if best_iteration is not None else booster.num_boosted_rounds()
+    return CompiledForest.from_booster(booster, (0, end))
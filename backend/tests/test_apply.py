@@ -0,0 +1,229 @@
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.rules import RULE_FIELDS, evaluate
+from app.main import app
+
+# The /apply heuristic pinned to the outputs of the original if/elif
+# implementation (before the rule table in app/core/rules.py), at and around
+# every threshold of the score bands and factor rules. /apply, /apply/batch
+# and rules.evaluate must all reproduce them exactly.
+
+BASE = {
+    "applicant_type": "individual",
+    "monthly_income": 15000.0,
+    "transaction_score": 60,
+    "utility_payment_score": 60,
+    "business_activity_score": 60,
+    "savings_balance": 10000.0,
+    "rent_payment_score": 50,
+}
+
+# name, fields changed from BASE, then the expected decision, risk_probability,
+# risk_level, top_positive_factors, top_negative_factors, recommendations
+CASES = [
+    ('reference', {},
+     'MANUAL_REVIEW', 0.45, 'MEDIUM',
+     [],
+     [],
+     ['Continue exploring credit builder products.']),
+    ('income_above_25000', {'monthly_income': 25000.01},
+     'MANUAL_REVIEW', 0.45, 'MEDIUM',
+     ['Strong income stability'],
+     [],
+     ['Continue exploring credit builder products.']),
+    ('income_at_25000', {'monthly_income': 25000.0},
+     'MANUAL_REVIEW', 0.45, 'MEDIUM',
+     [],
+     [],
+     ['Continue exploring credit builder products.']),
+    ('income_at_10000', {'monthly_income': 10000.0},
+     'MANUAL_REVIEW', 0.45, 'MEDIUM',
+     [],
+     [],
+     ['Continue exploring credit builder products.']),
+    ('income_below_10000', {'monthly_income': 9999.99},
+     'MANUAL_REVIEW', 0.45, 'MEDIUM',
+     [],
+     ['Low monthly income'],
+     ['Consider adding a co-applicant to boost income eligibility.']),
+    ('transaction_at_75', {'transaction_score': 75},
+     'MANUAL_REVIEW', 0.41, 'MEDIUM',
+     [],
+     [],
+     ['Continue exploring credit builder products.']),
+    ('transaction_76', {'transaction_score': 76},
+     'MANUAL_REVIEW', 0.4, 'MEDIUM',
+     ['Excellent transaction history'],
+     [],
+     ['Continue exploring credit builder products.']),
+    ('transaction_at_50', {'transaction_score': 50},
+     'MANUAL_REVIEW', 0.48, 'MEDIUM',
+     [],
+     [],
+     ['Continue exploring credit builder products.']),
+    ('transaction_49', {'transaction_score': 49},
+     'MANUAL_REVIEW', 0.48, 'MEDIUM',
+     [],
+     ['Irregular cash flow'],
+     ['Maintain a consistent balance and avoid frequent overdrafts.']),
+    ('utility_at_80', {'utility_payment_score': 80},
+     'MANUAL_REVIEW', 0.4, 'MEDIUM',
+     [],
+     [],
+     ['Continue exploring credit builder products.']),
+    ('utility_81', {'utility_payment_score': 81},
+     'MANUAL_REVIEW', 0.4, 'MEDIUM',
+     ['Consistent bill payments'],
+     [],
+     ['Continue exploring credit builder products.']),
+    ('utility_at_50', {'utility_payment_score': 50},
+     'MANUAL_REVIEW', 0.47, 'MEDIUM',
+     [],
+     [],
+     ['Continue exploring credit builder products.']),
+    ('utility_49', {'utility_payment_score': 49},
+     'MANUAL_REVIEW', 0.48, 'MEDIUM',
+     [],
+     [' missed utility payments'],
+     ['Automate your utility bill payments to improve reliability score.']),
+    ('savings_above_20000', {'savings_balance': 20000.01},
+     'MANUAL_REVIEW', 0.43, 'MEDIUM',
+     ['Healthy savings buffer'],
+     [],
+     ['Continue exploring credit builder products.']),
+    ('savings_at_20000', {'savings_balance': 20000.0},
+     'MANUAL_REVIEW', 0.43, 'MEDIUM',
+     [],
+     [],
+     ['Continue exploring credit builder products.']),
+    ('savings_at_5000', {'savings_balance': 5000.0},
+     'MANUAL_REVIEW', 0.46, 'MEDIUM',
+     [],
+     [],
+     ['Continue exploring credit builder products.']),
+    ('savings_below_5000', {'savings_balance': 4999.99},
+     'MANUAL_REVIEW', 0.46, 'MEDIUM',
+     [],
+     [],
+     ['Try to build a savings buffer of at least ₹10,000.']),
+    ('savings_cap', {'savings_balance': 1000000000.0},
+     'MANUAL_REVIEW', 0.37, 'MEDIUM',
+     ['Healthy savings buffer'],
+     [],
+     ['Continue exploring credit builder products.']),
+    ('rent_at_80', {'rent_payment_score': 80},
+     'MANUAL_REVIEW', 0.42, 'MEDIUM',
+     [],
+     [],
+     ['Continue exploring credit builder products.']),
+    ('rent_81', {'rent_payment_score': 81},
+     'MANUAL_REVIEW', 0.42, 'MEDIUM',
+     ['Timely rent payments'],
+     [],
+     ['Continue exploring credit builder products.']),
+    ('risk_at_0_30', {'transaction_score': 100, 'utility_payment_score': 100, 'business_activity_score': 60, 'savings_balance': 0.0, 'rent_payment_score': 0},
+     'MANUAL_REVIEW', 0.3, 'MEDIUM',
+     ['Excellent transaction history', 'Consistent bill payments'],
+     [],
+     ['Try to build a savings buffer of at least ₹10,000.']),
+    ('risk_below_0_30', {'transaction_score': 100, 'utility_payment_score': 100, 'business_activity_score': 60, 'savings_balance': 5.0, 'rent_payment_score': 0},
+     'APPROVED', 0.3, 'LOW',
+     ['Excellent transaction history', 'Consistent bill payments'],
+     [],
+     ['Try to build a savings buffer of at least ₹10,000.']),
+    ('risk_at_0_60', {'transaction_score': 50, 'utility_payment_score': 50, 'business_activity_score': 50, 'savings_balance': 0.0, 'rent_payment_score': 0},
+     'REJECTED', 0.6, 'HIGH',
+     [],
+     [],
+     ['Try to build a savings buffer of at least ₹10,000.']),
+    ('risk_below_0_60', {'transaction_score': 50, 'utility_payment_score': 50, 'business_activity_score': 50, 'savings_balance': 5.0, 'rent_payment_score': 0},
+     'MANUAL_REVIEW', 0.6, 'MEDIUM',
+     [],
+     [],
+     ['Try to build a savings buffer of at least ₹10,000.']),
+    ('low_risk_no_positive_factor', {'monthly_income': 15000.0, 'transaction_score': 75, 'utility_payment_score': 80, 'business_activity_score': 100, 'savings_balance': 20000.0, 'rent_payment_score': 80},
+     'APPROVED', 0.2, 'LOW',
+     ['Balanced financial profile'],
+     [],
+     ['Continue exploring credit builder products.']),
+    ('score_capped_at_100', {'monthly_income': 90000.0, 'transaction_score': 100, 'utility_payment_score': 100, 'business_activity_score': 100, 'savings_balance': 100000.0, 'rent_payment_score': 100},
+     'APPROVED', 0.0, 'LOW',
+     ['Strong income stability', 'Excellent transaction history', 'Consistent bill payments', 'Healthy savings buffer', 'Timely rent payments'],
+     [],
+     ['Continue exploring credit builder products.']),
+    ('all_zero', {'monthly_income': 0.0, 'transaction_score': 0, 'utility_payment_score': 0, 'business_activity_score': 0, 'savings_balance': 0.0, 'rent_payment_score': 0},
+     'REJECTED', 1.0, 'HIGH',
+     [],
+     ['Low monthly income', 'Irregular cash flow', ' missed utility payments'],
+     ['Consider adding a co-applicant to boost income eligibility.', 'Maintain a consistent balance and avoid frequent overdrafts.', 'Automate your utility bill payments to improve reliability score.', 'Try to build a savings buffer of at least ₹10,000.']),
+    ('negative_savings', {'savings_balance': -50000.0},
+     'MANUAL_REVIEW', 0.57, 'MEDIUM',
+     [],
+     [],
+     ['Try to build a savings buffer of at least ₹10,000.']),
+]
+
+FIELDS = ("decision", "risk_probability", "risk_level", "top_positive_factors", "top_negative_factors",
+          "recommendations")
+
+
+def application(prefix, case):
+    name, overrides = case[0], case[1]
+    return {"application_id": f"{prefix}-{name}", **BASE, **overrides}
+
+
+def expected(prefix, case):
+    return {"application_id": f"{prefix}-{case[0]}", **dict(zip(FIELDS, case[2:]))}
+
+
+@pytest.fixture(scope="module")
+def client():
+    # No lifespan: /apply needs neither the model nor the background workers
+    return TestClient(app)
+
+
+@pytest.mark.parametrize("case", CASES, ids=[c[0] for c in CASES])
+def test_apply_matches_baseline(client, case):
+    response = client.post("/api/v1/apply", json=application("single", case))
+    assert response.status_code == 200
+    assert response.json() == expected("single", case)
+
+
+def test_apply_batch_matches_baseline(client):
+    response = client.post("/api/v1/apply/batch",
+                           json={"applications": [application("batch", case) for case in CASES]})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["scored"] == len(CASES) and body["failed"] == 0
+    for i, (item, case) in enumerate(zip(body["results"], CASES)):
+        assert item == {"index": i, "result": expected("batch", case)}, case[0]
+
+
+def test_evaluate_matches_baseline():
+    rows = [{**BASE, **case[1]} for case in CASES]
+    result = evaluate({f: np.array([row[f] for row in rows], dtype=np.float64) for f in RULE_FIELDS})
+    for i, case in enumerate(CASES):
+        assert {f: result[f][i] for f in FIELDS} == dict(zip(FIELDS, case[2:])), case[0]
+
+
+def test_apply_batch_is_idempotent(client):
+    first, second = application("idem", CASES[0]), application("idem", CASES[1])
+    changed = {**first, "savings_balance": first["savings_balance"] + 1}
+    single = client.post("/api/v1/apply", json=second)
+    assert single.status_code == 200
+
+    response = client.post("/api/v1/apply/batch", json={"applications": [first, first, second, changed]})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["results"][0] == {"index": 0, "result": expected("idem", CASES[0])}
+    # Repeated within the batch, and already submitted through /apply
+    assert body["results"][1] == {"index": 1, "result": expected("idem", CASES[0]), "replayed": True}
+    assert body["results"][2] == {"index": 2, "result": single.json(), "replayed": True}
+    assert body["results"][3]["errors"][0]["field"] == "application_id"
+    assert (body["scored"], body["replayed"], body["failed"]) == (3, 2, 1)
+
+    replay = client.post("/api/v1/apply", json=first)
+    assert replay.headers.get("Idempotent-Replayed") == "true"
+    assert replay.json() == expected("idem", CASES[0])
@@ -0,0 +1,32 @@
+import sqlite3
+
+from app.core.audit import AuditLog
+from app.core.metrics import audit_dropped, registry
+
+
+def _records(n):
+    return [("APPROVED", 0.1, "LOW", f"app-{i}", "v1", {"i": i}, {"decision": "APPROVED"}) for i in range(n)]
+
+
+def test_bulk_request_takes_one_queue_slot(tmp_path):
+    log = AuditLog(str(tmp_path / "audit.db"), max_queue=2, batch_size=500)
+    assert log.record_many("apply", _records(20000))
+    assert log.record("apply", "APPROVED", 0.1, "LOW", application_id="single")
+    assert log.dropped == 0
+
+    log.start()
+    log.stop()
+    assert log.written == 20001
+    assert log.batches == 41  # transactions stay within batch_size rows
+    count = sqlite3.connect(log.path).execute("SELECT count(*) FROM decisions").fetchone()[0]
+    assert count == 20001
+
+
+def test_full_queue_drops_whole_request_and_counts_it(tmp_path):
+    log = AuditLog(str(tmp_path / "audit.db"), max_queue=1)
+    before = registry.collect()[audit_dropped.offset]
+    assert log.record_many("predict", _records(10))
+    assert not log.record_many("predict", _records(250))
+    assert not log.record("predict", "APPROVED")
+    assert log.dropped == 251
+    assert registry.collect()[audit_dropped.offset] - before == 251
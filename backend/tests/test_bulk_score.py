@@ -0,0 +1,21 @@
+import numpy as np
+import pandas as pd
+
+from app.bulk_score import to_features
+from app.core.features import FEATURES, feature_index
+
+FILLS = {"MonthlyIncome": 5400.0, "NumberOfDependents": 0.0}
+
+
+def test_to_features_fills_like_training():
+    df = pd.DataFrame({f: [1.0, np.nan] for f in FEATURES})
+    X = to_features(df, np.float64, FILLS)
+    assert X[1, feature_index("MonthlyIncome")] == 5400.0
+    assert X[1, feature_index("NumberOfDependents")] == 0.0
+    assert np.isnan(X[1, feature_index("DebtRatio")])  # no training fill: left to the trees
+    assert np.all(X[0] == 1.0)
+
+
+def test_to_features_without_fill_values_keeps_nan():
+    df = pd.DataFrame({f: [np.nan] for f in FEATURES})
+    assert np.isnan(to_features(df)).all()
@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+from app.core import model as model_module
+from app.core.evaluation import DECISION_CUTOFFS
+from app.core.forest import DecisionIndex, verify_decisions
+from app.core.model import build_model, compile_decision_index
+from test_forest import extreme_rows, nan_rows, random_rows
+
+# The early-exit decision index (app/core/forest.py DecisionIndex) must give
+# exactly the decision of fully scoring a row and thresholding it, whichever
+# path decides it: the tree-by-tree walk, the full scoring of inputs above
+# MAX_ROWS, or LoadedModel.decide without an index.
+
+
+@pytest.fixture(scope="module")
+def index(forest):
+    return DecisionIndex(forest, DECISION_CUTOFFS)
+
+
+def full_buckets(forest, X):
+    return np.searchsorted(DECISION_CUTOFFS, forest.predict_proba(X).astype(np.float64), side="right")
+
+
+def near_cutoff_rows(forest, n, seed=3):
+    """The rows closest to each cutoff out of a much larger random sample."""
+    X = random_rows(forest, n * 20, seed)
+    probs = forest.predict_proba(X).astype(np.float64)
+    per_cutoff = -(-n // len(DECISION_CUTOFFS))
+    picks = np.concatenate([np.argsort(np.abs(probs - c))[:per_cutoff] for c in DECISION_CUTOFFS])
+    return X[picks[:n]]
+
+
+def walk(index, X):
+    # Inputs of at most MAX_ROWS rows take the early-exit walk
+    parts = [index.decide(X[i:i + index.MAX_ROWS]) for i in range(0, len(X), index.MAX_ROWS)]
+    return np.concatenate([p[0] for p in parts]), np.concatenate([p[1] for p in parts])
+
+
+@pytest.mark.parametrize("rows", [random_rows, nan_rows, extreme_rows, near_cutoff_rows])
+def test_walk_matches_full_scoring(forest, index, rows):
+    X = rows(forest, 3000)
+    buckets, trees = walk(index, X)
+    assert np.array_equal(buckets, full_buckets(forest, X))
+    assert trees.max() <= forest.n_trees
+
+
+def test_walk_exits_early(forest, index):
+    _, trees = walk(index, random_rows(forest, 500))
+    assert np.count_nonzero(trees < forest.n_trees) > 0
+
+
+def test_inputs_above_max_rows_are_scored_in_full(forest, index):
+    X = near_cutoff_rows(forest, index.MAX_ROWS + 1)
+    buckets, trees = index.decide(X)
+    assert np.array_equal(buckets, full_buckets(forest, X))
+    assert np.all(trees == forest.n_trees)
+
+
+def test_verify_decisions_finds_no_mismatches(index):
+    assert verify_decisions(index) == 0
+
+
+@pytest.fixture(scope="module")
+def loaded(model_path):
+    state = build_model(model_path)
+    state.prepare(explainer=False)
+    assert state.decision_index is not None
+    return state
+
+
+def test_loaded_model_decide_matches_predict(loaded):
+    X = np.concatenate([near_cutoff_rows(loaded.forest, 200), nan_rows(loaded.forest, 200)])
+    expected = np.searchsorted(DECISION_CUTOFFS, np.asarray(loaded.predict(X), dtype=np.float64), side="right")
+    for i in range(0, len(X), 3):
+        buckets, early, trees = loaded.decide(X[i:i + 3])
+        assert np.array_equal(buckets, expected[i:i + 3])
+        assert np.array_equal(early, trees < loaded.forest.n_trees)
+
+
+def test_loaded_model_without_index_falls_back_to_predict(loaded, monkeypatch):
+    monkeypatch.setattr(loaded, "decision_index", None)
+    X = near_cutoff_rows(loaded.forest, 50)
+    buckets, early, trees = loaded.decide(X)
+    assert np.array_equal(buckets, full_buckets(loaded.forest, X))
+    assert not early.any() and trees is None
+
+
+def test_index_that_fails_verification_is_not_used(forest, monkeypatch):
+    monkeypatch.setattr(model_module, "verify_decisions", lambda index: 1)
+    assert compile_decision_index(forest) is None
@@ -0,0 +1,128 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api import endpoints
+from app.core import executor as executor_module
+from app.core.executor import DeadlineExceeded, ModelExecutor, Overloaded
+from app.main import app
+
+# Admission control of the model pool (app/core/executor.py): a full queue
+# is rejected at once with 429, a call that misses its deadline fails with
+# 503 and is never computed, both with Retry-After; process workers reload
+# once per model version the server moves to.
+
+APPLICATION = {
+    "RevolvingUtilizationOfUnsecuredLines": 0.5, "age": 40, "NumberOfTime3059DaysPastDueNotWorse": 0,
+    "DebtRatio": 0.3, "MonthlyIncome": 5000.0, "NumberOfOpenCreditLinesAndLoans": 5,
+    "NumberOfTimes90DaysLate": 0, "NumberRealEstateLoansOrLines": 1,
+    "NumberOfTime6089DaysPastDueNotWorse": 0, "NumberOfDependents": 1,
+}
+
+
+class BlockingModel:
+    """Stands in for credit_model: each call waits until released."""
+    version = "v1"
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.started = threading.Event()
+        self.calls = 0
+
+    def current(self):
+        return self
+
+    def score(self, X, explain, k=3, cache=True):
+        self.calls += 1
+        self.started.set()
+        self.release.wait(10)
+        return np.zeros(len(X), dtype=np.float32), None
+
+
+@pytest.fixture
+def blocking(monkeypatch):
+    model = BlockingModel()
+    monkeypatch.setattr(executor_module, "credit_model", model)
+    yield model
+    model.release.set()
+
+
+def occupy(pool, model):
+    """Starts a call that holds the pool's only worker until the model is released."""
+    thread = threading.Thread(target=pool.score_sync, args=(np.zeros((1, 10)), "none"), kwargs={"deadline": time.monotonic() + 10})
+    thread.start()
+    assert model.started.wait(5)
+    return thread
+
+
+def test_full_queue_is_rejected(blocking):
+    pool = ModelExecutor(workers=1, max_queue=0, timeout=5.0)
+    thread = occupy(pool, blocking)
+    with pytest.raises(Overloaded):
+        pool.score_sync(np.zeros((1, 10)), "none")
+    assert pool.stats()["rejected"] == 1
+    blocking.release.set()
+    thread.join(5)
+    assert pool.stats()["completed"] == 1
+    pool.stop()
+
+
+def test_call_queued_past_its_deadline_is_never_computed(blocking):
+    pool = ModelExecutor(workers=1, max_queue=1, timeout=5.0)
+    thread = occupy(pool, blocking)
+    with pytest.raises(DeadlineExceeded):
+        pool.score_sync(np.zeros((1, 10)), "none", deadline=time.monotonic() + 0.05)
+    blocking.release.set()
+    thread.join(5)
+    assert blocking.calls == 1
+    assert pool.stats()["expired"] == 1
+    pool.stop()
+
+
+def test_running_call_past_its_deadline_fails(blocking):
+    pool = ModelExecutor(workers=1, max_queue=0, timeout=0.05)
+    with pytest.raises(DeadlineExceeded):
+        pool.score_sync(np.zeros((1, 10)), "none")
+    pool.stop()
+
+
+@pytest.mark.parametrize("max_queue, timeout, status", [(0, 5.0, 429), (1, 0.05, 503)])
+def test_http_status_and_retry_after(blocking, monkeypatch, max_queue, timeout, status):
+    pool = ModelExecutor(workers=1, max_queue=max_queue, timeout=timeout)
+    monkeypatch.setattr(endpoints, "model_executor", pool)
+    thread = occupy(pool, blocking)
+    response = TestClient(app).post("/api/v1/predict/batch?explain=none", json={"applications": [APPLICATION]})
+    assert response.status_code == status
+    assert "Retry-After" in response.headers
+    blocking.release.set()
+    thread.join(5)
+    pool.stop()
+
+
+class WorkerModel:
+    """Stands in for a process worker's model, whose file is already ahead of the server."""
+    def __init__(self):
+        self.version = "on-disk"
+        self.loads = 0
+
+    def load_model(self):
+        self.loads += 1
+
+    def score(self, X, explain, k=3, cache=True):
+        return np.zeros(len(X), dtype=np.float32), None
+
+
+def test_worker_reloads_once_per_served_version(monkeypatch):
+    worker = WorkerModel()
+    monkeypatch.setattr(executor_module, "_worker_model", worker)
+    monkeypatch.setattr(executor_module, "_worker_requested", None)
+    for _ in range(5):
+        executor_module._score(np.zeros((1, 10)), "none", 3, None, "served")
+    assert worker.loads == 1
+    # The server reloads onto the file's version: nothing left to load
+    for _ in range(5):
+        executor_module._score(np.zeros((1, 10)), "none", 3, None, "on-disk")
+    assert worker.loads == 1
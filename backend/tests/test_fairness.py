@@ -0,0 +1,44 @@
+import numpy as np
+
+from app.core.fairness import DECISIONS, GROUPS, SOURCES, FairnessMonitor, _OVERALL, group_rows
+
+
+def test_sources_do_not_share_counters():
+    # Medium income on both scales, adult age
+    predict_rows = set(group_rows("predict", income=5000, age=40))
+    assert not predict_rows & set(group_rows("apply", income=20000, age=40))
+    apply_rows = set(group_rows("apply", income=20000))  # /apply has no age
+
+    monitor = FairnessMonitor()
+    monitor.record("predict", "Approve", 0.1, income=5000, age=40)
+    monitor.record_many("apply", ["REJECTED"], [0.7], incomes=[20000])
+    counters = monitor.counters()
+    for source, rows, other in (("predict", predict_rows, apply_rows), ("apply", apply_rows, predict_rows)):
+        assert all(counters[row, DECISIONS] == 1 for row in rows), source
+        assert all(GROUPS[row][0] == source for row in rows if row < len(GROUPS))
+    assert np.count_nonzero(counters[:, DECISIONS]) == len(predict_rows | apply_rows)
+
+    snapshot = monitor.snapshot()
+    assert snapshot["decisions"] == 2
+    predict, apply = snapshot["sources"]["predict"], snapshot["sources"]["apply"]
+    assert (predict["decisions"], predict["approval_rate"]) == (1, 1.0)
+    assert (apply["decisions"], apply["approval_rate"]) == (1, 0.0)
+    assert predict["default_rate_by_income"]["Medium"] == 0.1
+    assert apply["default_rate_by_income"]["Medium"] == 0.7
+    assert predict["groups"]["age"]["Adult (25-60)"]["decisions"] == 1
+    assert apply["groups"]["age"]["Adult (25-60)"]["decisions"] == 0
+
+
+def test_record_and_record_many_agree():
+    one, many = FairnessMonitor(), FairnessMonitor()
+    rows = [("apply", "APPROVED", 0.2, 9000, None), ("apply", "REJECTED", 0.8, 30000, None),
+            ("predict", "Review", 0.4, 2000, 70), ("predict", "Approve", 0.1, float("nan"), 22)]
+    for source, decision, prob, income, age in rows:
+        one.record(source, decision, prob, income=income, age=age)
+    for source in SOURCES:
+        batch = [r for r in rows if r[0] == source]
+        ages = None if source == "apply" else [r[4] for r in batch]
+        many.record_many(source, [r[1] for r in batch], [r[2] for r in batch],
+                         incomes=[r[3] for r in batch], ages=ages)
+    np.testing.assert_allclose(one.counters(), many.counters())
+    assert set(_OVERALL) == set(SOURCES)
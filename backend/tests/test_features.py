@@ -0,0 +1,31 @@
+import numpy as np
+
+from app.api.endpoints import CreditApplication
+from app.core.features import FEATURES, FIELDS, feature_index, feature_pipeline
+
+ROW = {
+    "RevolvingUtilizationOfUnsecuredLines": 0.3, "age": 40, "NumberOfTime3059DaysPastDueNotWorse": 1,
+    "DebtRatio": 0.25, "MonthlyIncome": 5000.0, "NumberOfOpenCreditLinesAndLoans": 5,
+    "NumberOfTimes90DaysLate": 0, "NumberRealEstateLoansOrLines": 1,
+    "NumberOfTime6089DaysPastDueNotWorse": 2, "NumberOfDependents": 3,
+}
+
+
+def test_records_in_model_order():
+    apps = [CreditApplication(**ROW), CreditApplication(**{**ROW, "age": 70})]
+    X = feature_pipeline.records(apps)
+    assert X.shape == (2, len(FEATURES)) and X.dtype == np.float64
+    assert X[0].tolist() == [float(ROW[f]) for f in FIELDS]
+    assert X[1, feature_index("age")] == 70
+    assert feature_pipeline.records([]).shape == (0, len(FEATURES))
+
+
+def test_fill_replaces_only_named_features_and_copies():
+    X = np.full((2, len(FEATURES)), np.nan)
+    X[0] = 1.0
+    filled = feature_pipeline.fill(X, {"MonthlyIncome": 5400.0})
+    assert filled[1, feature_index("MonthlyIncome")] == 5400.0
+    assert np.isnan(filled[1, feature_index("DebtRatio")])
+    assert np.all(filled[0] == 1.0)
+    assert np.isnan(X[1]).all()  # input untouched
+    assert feature_pipeline.fill(X, {}) is X
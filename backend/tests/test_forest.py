@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+import xgboost as xgb
+
+# Parity of the native engine (app/core/forest.py) with XGBoost on the
+# shipped model: probabilities must match bit for bit, path attributions
+# must match XGBoost's approx_contribs up to float32 rounding.
+
+
+def random_rows(forest, n, seed=0):
+    """Rows on, just below and just above every split threshold, and in between."""
+    rng = np.random.default_rng(seed)
+    X = np.empty((n, forest.n_features), dtype=np.float32)
+    for f in range(forest.n_features):
+        thresholds = forest.threshold[(forest.feature == f) & ~np.isnan(forest.threshold)]
+        picks = rng.choice(thresholds, size=n)
+        mode = rng.integers(0, 4, size=n)
+        X[:, f] = np.select(
+            [mode == 0, mode == 1, mode == 2],
+            [picks, np.nextafter(picks, np.float32(-np.inf)), picks * rng.uniform(0.0, 3.0, size=n)],
+            default=np.nextafter(picks, np.float32(np.inf)),
+        )
+    return X
+
+
+def nan_rows(forest, n, seed=1):
+    X = random_rows(forest, n, seed)
+    rng = np.random.default_rng(seed)
+    X[rng.random(X.shape) < 0.3] = np.nan
+    X[0] = np.nan  # every feature missing
+    return X
+
+
+def extreme_rows(forest, n, seed=2):
+    rng = np.random.default_rng(seed)
+    values = np.array([0.0, -0.0, -1.0, 1e-30, -1e30, 1e30, np.finfo(np.float32).max,
+                       -np.finfo(np.float32).max, np.inf, -np.inf], dtype=np.float32)
+    return rng.choice(values, size=(n, forest.n_features))
+
+
+def xgb_proba(model, X):
+    return model.predict_proba(X)[:, 1].astype(np.float32)
+
+
+@pytest.mark.parametrize("rows", [random_rows, nan_rows, extreme_rows])
+def test_probabilities_bit_identical(model, forest, rows):
+    X = rows(forest, 20000)
+    expected = xgb_proba(model, X)
+    actual = forest.predict_proba(X)
+    assert actual.dtype == np.float32
+    assert np.array_equal(actual.view(np.int32), expected.view(np.int32))
+
+
+def test_single_rows_bit_identical(model, forest):
+    X = nan_rows(forest, 200)
+    expected = xgb_proba(model, X)
+    for i in range(len(X)):
+        assert forest.predict_proba(X[i]).view(np.int32)[0] == expected[i:i + 1].view(np.int32)[0]
+
+
+@pytest.mark.parametrize("rows", [random_rows, nan_rows])
+def test_fast_contributions_match_approx_contribs(model, forest, rows):
+    X = rows(forest, 5000)
+    probs, contribs = forest.predict_with_contributions(X)
+
+    booster = model.get_booster()
+    dmatrix = xgb.DMatrix(X, feature_names=booster.feature_names, missing=np.nan)
+    best_iteration = getattr(model, "best_iteration", None)
+    iteration_range = (0, best_iteration + 1) if best_iteration is not None else (0, 0)
+    expected = booster.predict(dmatrix, pred_contribs=True, approx_contribs=True, iteration_range=iteration_range)
+
+    assert np.array_equal(probs.view(np.int32), xgb_proba(model, X).view(np.int32))
+    np.testing.assert_allclose(contribs, expected[:, :-1], rtol=0, atol=1e-5)
@@ -0,0 +1,99 @@
+import threading
+
+import pytest
+
+from app.core.idempotency import IdempotencyConflict, IdempotencyLayer, MemoryStore
+
+PAYLOAD = {"application_id": "a-1", "monthly_income": 15000.0}
+
+
+def test_identical_payload_is_replayed():
+    layer = IdempotencyLayer(MemoryStore())
+    calls = []
+    first = layer.run("a-1", PAYLOAD, lambda: calls.append(1) or {"decision": "APPROVED"})
+    again = layer.run("a-1", dict(PAYLOAD), lambda: calls.append(1) or {"decision": "REJECTED"})
+    assert first == ({"decision": "APPROVED"}, False)
+    assert again == ({"decision": "APPROVED"}, True)
+    assert len(calls) == 1
+    assert (layer.computed, layer.replayed) == (1, 1)
+
+
+def test_different_payload_is_rejected():
+    layer = IdempotencyLayer(MemoryStore())
+    layer.run("a-1", PAYLOAD, lambda: {"decision": "APPROVED"})
+    with pytest.raises(IdempotencyConflict):
+        layer.run("a-1", {**PAYLOAD, "monthly_income": 1.0}, lambda: {"decision": "REJECTED"})
+    assert layer.conflicts == 1
+
+
+def test_concurrent_duplicates_collapse_into_one_computation():
+    layer = IdempotencyLayer(MemoryStore())
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return {"decision": "APPROVED"}
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(layer.run("a-1", PAYLOAD, compute)))
+    leader.start()
+    assert started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(layer.run("a-1", PAYLOAD, compute)))
+                 for _ in range(4)]
+    for t in followers:
+        t.start()
+    while layer.collapsed < 4:
+        threading.Event().wait(0.01)
+    release.set()
+    for t in [leader] + followers:
+        t.join(5)
+
+    assert len(calls) == 1
+    assert sorted(replayed for _, replayed in results) == [False, True, True, True, True]
+    assert all(result == {"decision": "APPROVED"} for result, _ in results)
+
+
+class _SlowStore(MemoryStore):
+    def __init__(self):
+        super().__init__()
+        self.reading, self.release = threading.Event(), threading.Event()
+
+    def get(self, key):
+        if key == "slow":
+            self.reading.set()
+            self.release.wait(5)
+        return super().get(key)
+
+
+def test_store_lookup_does_not_block_other_keys():
+    store = _SlowStore()
+    layer = IdempotencyLayer(store)
+    slow = threading.Thread(target=layer.run, args=("slow", PAYLOAD, lambda: {}))
+    slow.start()
+    assert store.reading.wait(5)
+    results = []
+    fast = threading.Thread(target=lambda: results.append(layer.run("fast", PAYLOAD, lambda: {"decision": "APPROVED"})))
+    fast.start()
+    fast.join(2)
+    finished = not fast.is_alive()
+    store.release.set()
+    slow.join(5)
+    fast.join(5)
+    # The fast key finished while the slow key's lookup was still blocked
+    assert finished
+    assert results == [({"decision": "APPROVED"}, False)]
+
+
+class _ReadOnlyStore(MemoryStore):
+    def put(self, key, fp, result):
+        raise OSError("disk full")
+
+
+def test_failed_store_write_still_returns_the_result():
+    layer = IdempotencyLayer(_ReadOnlyStore())
+    assert layer.run("a-1", PAYLOAD, lambda: {"decision": "APPROVED"}) == ({"decision": "APPROVED"}, False)
+    assert layer.store_errors == 1
+    assert layer.stats()["in_flight"] == 0
@@ -0,0 +1,92 @@
+import time
+
+import joblib
+import numpy as np
+import pytest
+
+from app.core.model import CreditModel
+from test_forest import nan_rows, random_rows
+
+# Cached scoring (CreditModel.score with app/core/model.py PredictionCache)
+# must return exactly what scoring the rows again would, and must never
+# serve a result computed by an earlier model generation.
+
+
+@pytest.fixture(scope="module")
+def credit(model_path):
+    credit = CreditModel(model_path)
+    assert credit.load_model()
+    return credit
+
+
+@pytest.fixture
+def rows(credit):
+    credit.cache.clear()
+    return np.concatenate([random_rows(credit.forest, 40), nan_rows(credit.forest, 40)])
+
+
+def assert_same(a, b):
+    probs_a, top_a = a
+    probs_b, top_b = b
+    assert probs_a.dtype == probs_b.dtype == np.float32
+    assert np.array_equal(probs_a, probs_b)
+    if top_a is None or top_b is None:
+        assert top_a is None and top_b is None
+        return
+    assert np.array_equal(top_a[0], top_b[0])
+    assert np.array_equal(top_a[1], top_b[1])
+
+
+@pytest.mark.parametrize("explain", ["exact", "fast", "none"])
+def test_hit_returns_exactly_the_miss(credit, rows, explain):
+    miss = credit.score(rows, explain, k=3)
+    hits = credit.cache.hits
+    hit = credit.score(rows, explain, k=3)
+    assert credit.cache.hits - hits == len(rows)
+    assert_same(hit, miss)
+    assert_same(hit, credit.score(rows, explain, k=3, cache=False))
+
+
+def test_partial_hit_keeps_row_order(credit, rows):
+    credit.score(rows[::2], "exact", k=3)
+    mixed = credit.score(rows, "exact", k=3)
+    assert_same(mixed, credit.score(rows, "exact", k=3, cache=False))
+
+
+def test_explain_level_and_k_are_cached_separately(credit, rows):
+    credit.score(rows, "fast", k=3)
+    misses = credit.cache.misses
+    credit.score(rows, "exact", k=3)
+    credit.score(rows, "fast", k=2)
+    assert credit.cache.misses - misses == 2 * len(rows)
+
+
+def test_reload_empties_cache(credit, rows):
+    credit.score(rows, "exact", k=3)
+    assert credit.cache.stats()["size"] == len(rows)
+    reloads = credit.reloads
+    assert credit.reload_async()
+    deadline = time.monotonic() + 60
+    while credit.reloads == reloads and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert credit.reloads == reloads + 1
+    assert credit.cache.stats()["size"] == 0
+
+
+def test_version_change_empties_cache(model_path, rows, tmp_path):
+    credit = CreditModel(model_path)
+    assert credit.load_model(explainer=False)
+    credit.score(rows, "fast", k=3)
+    before = credit.version
+
+    # Same trees, different bytes: a new version scoring identically
+    path = tmp_path / "model.pkl"
+    joblib.dump(joblib.load(model_path).set_params(n_jobs=1), path)
+    credit.path = str(path)
+    assert credit.load_model(explainer=False)
+    assert credit.version != before
+    assert credit.cache.stats()["size"] == 0
+
+    misses = credit.cache.misses
+    credit.score(rows, "fast", k=3)
+    assert credit.cache.misses - misses == len(rows)
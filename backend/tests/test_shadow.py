@@ -0,0 +1,92 @@
+import shutil
+import time
+
+import joblib
+import pytest
+
+from app.core.evaluation import get_decision
+from app.core.model import Challenger, CreditModel, build_model
+from app.core.shadow import ShadowMonitor
+from test_forest import random_rows
+
+# Challengers (app/core/shadow.py): the server registers only a path and a
+# version, the shadow process loads the model, and every comparison it
+# reports is for the version the server registered.
+
+
+@pytest.fixture
+def challenger_path(model_path, tmp_path):
+    path = tmp_path / "challenger.pkl"
+    shutil.copy(model_path, path)
+    return str(path)
+
+
+@pytest.fixture
+def monitor():
+    credit = CreditModel()
+    monitor = ShadowMonitor(credit, interval_ms=10)
+    monitor.start(get_decision)
+    yield monitor
+    monitor.stop()
+
+
+def wait_for(monitor, condition, timeout=60):
+    deadline = time.monotonic() + timeout
+    while not condition(monitor.report()) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return monitor.report()
+
+
+def replace(path):
+    # Same trees, different bytes: another version
+    joblib.dump(joblib.load(path).set_params(n_jobs=1), path)
+
+
+def test_challenger_is_registered_by_metadata(challenger_path):
+    credit = CreditModel()
+    name = credit.load_challenger(challenger_path)
+    challenger = credit.challengers[name]
+    assert isinstance(challenger, Challenger)
+    assert name == challenger.version == build_model(challenger_path).version
+    assert credit.status()["challengers"][name]["path"] == challenger_path
+
+
+def test_results_are_tagged_with_registered_version(monitor, challenger_path, forest):
+    name = monitor.model.load_challenger(challenger_path, "candidate")
+    registered = monitor.model.challengers[name].version
+    X = random_rows(forest, 100)
+    monitor.submit(X, forest.predict_proba(X), "champion")
+    report = wait_for(monitor, lambda r: r["challengers"][name]["rows"] or r["errors"])
+    comparison = report["challengers"][name]
+    assert report["errors"] == 0
+    assert comparison["challenger_version"] == registered
+    assert comparison["champion_version"] == "champion"
+    assert comparison["rows"] == 100
+    assert comparison["agreement_rate"] == 1.0
+
+    # The shadow process keeps the model it built for the registered version
+    replace(challenger_path)
+    monitor.submit(X, forest.predict_proba(X), "champion")
+    report = wait_for(monitor, lambda r: r["challengers"][name]["rows"] > 100 or r["errors"])
+    assert report["errors"] == 0
+    assert report["challengers"][name]["challenger_version"] == registered
+    assert report["challengers"][name]["rows"] == 200
+
+    # Registering it again picks up the new version
+    monitor.model.load_challenger(challenger_path, "candidate")
+    assert monitor.model.challengers[name].version != registered
+    monitor.submit(X, forest.predict_proba(X), "champion")
+    report = wait_for(monitor, lambda r: r["challengers"][name]["challenger_version"] != registered)
+    assert report["challengers"][name]["challenger_version"] == monitor.model.challengers[name].version
+    assert report["challengers"][name]["rows"] == 100
+
+
+def test_file_replaced_before_first_batch_is_not_scored(monitor, challenger_path, forest):
+    name = monitor.model.load_challenger(challenger_path)
+    replace(challenger_path)
+    X = random_rows(forest, 100)
+    monitor.submit(X, forest.predict_proba(X), "champion")
+    report = wait_for(monitor, lambda r: r["errors"])
+    assert report["errors"] == 1
+    assert "load the challenger again" in report["last_error"]
+    assert report["challengers"][name] == {"challenger_version": name, "rows": 0}
@@ -0,0 +1,268 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+import sys
+import numpy as np
+import pandas as pd
+
+# Feature selection and missing-value fill are shared with the serving code
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+from app.core.features import FEATURES, FeaturePipeline
+
+# Staged, cacheable training pipeline used by train_model.py.
+#
+#   dataset    raw CSV -> typed columnar cache: one .npy per column, downcast
+#              to the smallest dtype that holds every value exactly (count
+#              columns become int8/int16, float columns float32 where that is
+#              lossless), memory-mapped on later runs instead of re-parsing
+#   prepare    missing-value fill + stratified train/test split
+#   resample   SMOTE oversampling of the training split (skipped when class
+#              imbalance is handled with scale_pos_weight instead)
+#   train      XGBoost (hist) fit with early stopping on the test split
+#
+# Every stage is keyed by a hash of its inputs: the upstream stage's key, its
+# own parameters and, for the dataset, the SHA-256 of the file contents. A
+# stage whose key already has an artifact in the cache directory is loaded
+# instead of recomputed, so changing e.g. only the XGBoost parameters re-runs
+# training but not parsing, splitting or SMOTE.
+
+# Bump when a stage's output format or logic changes, to invalidate old artifacts
+CACHE_FORMAT_VERSION = 1
+
+STAGE_META_FILE = "stage.json"
+
+
+def stage_key(inputs):
+    """Content hash of a stage's inputs (JSON-serializable)."""
+    blob = json.dumps({"format": CACHE_FORMAT_VERSION, **inputs}, sort_keys=True, default=str)
+    return hashlib.sha256(blob.encode()).hexdigest()[:16]
+
+
+class StageCache:
+    """Runs stages, reusing artifacts whose input hash is unchanged, and times them."""
+
+    def __init__(self, root, force=False):
+        self.root = os.path.abspath(root)
+        self.force = force
+        self.timings = []  # (stage, seconds, cached)
+
+    def run(self, name, inputs, compute, save, load):
+        """
+        Returns (value, key). `compute()` builds the value, `save(value, dir)`
+        writes it to an artifact directory and `load(dir)` reads it back.
+        """
+        key = stage_key(inputs)
+        path = os.path.join(self.root, f"{name}-{key}")
+        started = time.perf_counter()
+        if not self.force and os.path.exists(os.path.join(path, STAGE_META_FILE)):
+            value = load(path)
+            self.timings.append((name, time.perf_counter() - started, True))
+            return value, key
+
+        value = compute()
+        os.makedirs(self.root, exist_ok=True)
+        # Written next to its final name and renamed, so an interrupted run
+        # never leaves an artifact that looks complete
+        tmp = tempfile.mkdtemp(prefix=f".{name}-", dir=self.root)
+        try:
+            save(value, tmp)
+            with open(os.path.join(tmp, STAGE_META_FILE), "w") as f:
+                json.dump({"stage": name, "key": key, "inputs": inputs,
+                           "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())}, f, indent=2, default=str)
+            shutil.rmtree(path, ignore_errors=True)
+            os.rename(tmp, path)
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        self.timings.append((name, time.perf_counter() - started, False))
+        return value, key
+
+    def skip(self, name):
+        self.timings.append((name, 0.0, None))
+
+    @contextmanager
+    def timed(self, name):
+        """Times an uncached step (evaluation, export) alongside the stages."""
+        started = time.perf_counter()
+        yield
+        self.timings.append((name, time.perf_counter() - started, False))
+
+    def report(self):
+        lines = []
+        total = 0.0
+        for name, seconds, cached in self.timings:
+            state = "skipped" if cached is None else "cached" if cached else "computed"
+            lines.append(f"  {name:<10} {seconds:8.2f}s  {state}")
+            total += seconds
+        lines.append(f"  {'total':<10} {total:8.2f}s")
+        return "\n".join(lines)
+
+    def summary(self):
+        """Stage timings for the bundle metadata."""
+        return {name: {"seconds": round(seconds, 3), "cached": cached} for name, seconds, cached in self.timings}
+
+
+def save_arrays(arrays, path):
+    for name, array in arrays.items():
+        np.save(os.path.join(path, f"{name}.npy"), np.ascontiguousarray(array))
+    with open(os.path.join(path, "arrays.json"), "w") as f:
+        json.dump(list(arrays), f)
+
+
+def load_arrays(path, mmap_mode=None):
+    with open(os.path.join(path, "arrays.json")) as f:
+        names = json.load(f)
+    return {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode) for name in names}
+
+
+# --- dataset -----------------------------------------------------------------
+
+def _downcast(values):
+    """Smallest dtype that represents every value of a numeric column exactly."""
+    values = np.asarray(values)
+    if values.dtype.kind in "iub":
+        return pd.to_numeric(pd.Series(values), downcast="integer").to_numpy()
+    values = values.astype(np.float64)
+    present = values[~np.isnan(values)]
+    if len(present) == len(values) and np.array_equal(present, np.round(present)):
+        return pd.to_numeric(pd.Series(present.astype(np.int64)), downcast="integer").to_numpy()
+    as_float32 = values.astype(np.float32)
+    if np.array_equal(as_float32.astype(np.float64), values, equal_nan=True):
+        return as_float32
+    return values
+
+
+def read_typed_csv(path):
+    """Parses the raw CSV once into {column: downcast array}."""
+    # round_trip parses each number to the same float64 Python (and so the
+    # API) would, rather than pandas' faster approximate parser
+    df = pd.read_csv(path, float_precision="round_trip")
+    if "Unnamed: 0" in df.columns:
+        df = df.drop(columns=["Unnamed: 0"])
+    return {column: _downcast(df[column].to_numpy()) for column in df.columns}
+
+
+def dataset_stage(cache, data_path, data_hash):
+    """Typed columnar copy of the raw CSV, memory-mapped when cached."""
+    return cache.run(
+        "dataset",
+        {"data_sha256": data_hash},
+        compute=lambda: read_typed_csv(data_path),
+        save=save_arrays,
+        load=lambda path: load_arrays(path, mmap_mode="r"),
+    )
+
+
+# --- prepare -----------------------------------------------------------------
+
+def fill_values(dataset):
+    """
+    Replacements for missing values: the median MonthlyIncome and 0
+    NumberOfDependents. Exported with the bundle so offline scoring fills the
+    same way.
+    """
+    income = np.asarray(dataset["MonthlyIncome"], dtype=np.float64)
+    return {"MonthlyIncome": float(np.nanmedian(income)), "NumberOfDependents": 0.0}
+
+
+def prepare_stage(cache, dataset, dataset_key, features, target, test_size=0.2, random_state=42):
+    """
+    Selects the model inputs and fills missing values (MonthlyIncome with the
+    median, NumberOfDependents with 0) through the serving FeaturePipeline,
+    then makes the stratified train/test split. `features` must be the
+    serving FEATURES. Returns float64 arrays X_train, X_test, y_train, y_test.
+    """
+    if tuple(features) != FEATURES:
+        raise ValueError("prepare_stage builds the serving FEATURES; got a different feature list")
+
+    def compute():
+        from sklearn.model_selection import train_test_split
+
+        names = [name for name in dataset if name != target]
+        pipeline = FeaturePipeline(names)
+        raw = np.column_stack([np.asarray(dataset[name], dtype=np.float64) for name in names])
+        X = pipeline.fill(pipeline.matrix(raw, np.float64), fill_values(dataset))
+        y = np.asarray(dataset[target], dtype=np.int8)
+        X_train, X_test, y_train, y_test = train_test_split(
+            X, y, test_size=test_size, random_state=random_state, stratify=y
+        )
+        return {"X_train": X_train, "X_test": X_test, "y_train": y_train, "y_test": y_test}
+
+    return cache.run(
+        "prepare",
+        {"dataset": dataset_key, "features": features, "target": target,
+         "test_size": test_size, "random_state": random_state},
+        compute=compute,
+        save=save_arrays,
+        load=load_arrays,
+    )
+
+
+# --- resample ----------------------------------------------------------------
+
+def smote_stage(cache, prepared, prepared_key, random_state=42):
+    def compute():
+        from imblearn.over_sampling import SMOTE
+
+        X, y = SMOTE(random_state=random_state).fit_resample(prepared["X_train"], prepared["y_train"])
+        return {"X": X, "y": y}
+
+    return cache.run(
+        "resample",
+        {"prepare": prepared_key, "method": "smote", "random_state": random_state},
+        compute=compute,
+        save=save_arrays,
+        load=load_arrays,
+    )
+
+
+def scale_pos_weight(y):
+    """Negative/positive ratio, the usual XGBoost weight for the minority class."""
+    y = np.asarray(y).astype(bool)
+    return float((~y).sum() / max(int(y.sum()), 1))
+
+
+# --- train -------------------------------------------------------------------
+
+MODEL_FILE = "model.ubj"
+
+
+def train_stage(cache, X, y, X_eval, y_eval, feature_names, params, upstream_key, nthread=None):
+    """
+    Fits an XGBClassifier with early stopping on (X_eval, y_eval). `params`
+    are the model parameters; `nthread` only affects speed (hist training is
+    deterministic for any thread count), so it is not part of the cache key.
+    """
+    import xgboost as xgb
+
+    def compute():
+        model = xgb.XGBClassifier(**params, n_jobs=nthread)
+        # DataFrames so the booster records the feature names (the bundle schema)
+        model.fit(
+            pd.DataFrame(X, columns=feature_names), y,
+            eval_set=[(pd.DataFrame(X_eval, columns=feature_names), y_eval)],
+            verbose=False,
+        )
+        return model
+
+    def save(model, path):
+        model.save_model(os.path.join(path, MODEL_FILE))
+
+    def load(path):
+        # The saved model keeps the booster (and best iteration) but not the
+        # constructor parameters, which the bundle metadata records
+        model = xgb.XGBClassifier(**params, n_jobs=nthread)
+        model.load_model(os.path.join(path, MODEL_FILE))
+        return model
+
+    return cache.run(
+        "train",
+        {"data": upstream_key, "features": feature_names, "params": params, "xgboost_version": xgb.__version__},
+        compute=compute,
+        save=save,
+        load=load,
+    )
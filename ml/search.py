@@ -0,0 +1,252 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+
+from pipeline import StageCache, load_arrays, save_arrays, train_stage, scale_pos_weight
+from train_model import (CACHE_DIR, DATA_PATH, FEATURES, RANDOM_STATE, XGB_PARAMS,
+                         evaluate_and_export, load_prepared, training_set)
+
+# Hyperparameter search: successive halving over random configurations.
+#
+# The training split is divided once more into fit and validation rows and
+# quantized: every feature is cut at up to MAX_BIN quantiles of the fit rows
+# and stored as uint8 bin indices. That matrix is written to the stage cache
+# and memory-mapped by every worker process, so the pool shares one copy
+# through the page cache and XGBoost's own sketching is trivial (each feature
+# has at most MAX_BIN distinct values, which hist keeps as its bins).
+#
+# Rung 0 trains every candidate for MIN_ROUNDS boosting rounds; each later
+# rung keeps the best 1/ETA by validation AUC and multiplies the budget by
+# ETA. Trials also early-stop, and a trial that stopped before its budget has
+# converged, so its score is carried to the next rung instead of retrained.
+# The winner is refit on the regular training set (as train_model.py does)
+# and exported as a bundle next to the leaderboard.
+
+MAX_BIN = 256
+VALID_SIZE = 0.2
+ETA = 3
+MIN_ROUNDS = 20
+MAX_ROUNDS = 540
+EARLY_STOPPING_ROUNDS = 20
+
+# name: (kind, low, high); "log" samples uniformly in log space
+SEARCH_SPACE = {
+    "max_depth": ("int", 3, 8),
+    "learning_rate": ("log", 0.02, 0.3),
+    "min_child_weight": ("log", 1.0, 32.0),
+    "subsample": ("float", 0.6, 1.0),
+    "colsample_bytree": ("float", 0.6, 1.0),
+    "reg_lambda": ("log", 0.1, 10.0),
+    "gamma": ("float", 0.0, 2.0),
+}
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "search_results")
+
+
+def sample_configs(n, seed):
+    rng = np.random.default_rng(seed)
+    configs = []
+    for _ in range(n):
+        config = {}
+        for name, (kind, low, high) in SEARCH_SPACE.items():
+            if kind == "int":
+                config[name] = int(rng.integers(low, high + 1))
+            elif kind == "log":
+                config[name] = float(np.exp(rng.uniform(np.log(low), np.log(high))))
+            else:
+                config[name] = float(rng.uniform(low, high))
+        configs.append(config)
+    return configs
+
+
+def rung_budgets(min_rounds=MIN_ROUNDS, max_rounds=MAX_ROUNDS, eta=ETA):
+    budgets = [min_rounds]
+    while budgets[-1] * eta <= max_rounds:
+        budgets.append(budgets[-1] * eta)
+    return budgets
+
+
+def quantize(X_fit, X_valid, max_bin=MAX_BIN):
+    """uint8 bin indices of both matrices, cut at quantiles of the fit rows."""
+    fit = np.empty(X_fit.shape, dtype=np.uint8)
+    valid = np.empty(X_valid.shape, dtype=np.uint8)
+    for f in range(X_fit.shape[1]):
+        values = np.unique(X_fit[:, f])
+        if len(values) <= max_bin:
+            edges = values[1:]
+        else:
+            edges = np.unique(np.quantile(X_fit[:, f], np.linspace(0, 1, max_bin + 1)[1:-1]))
+        fit[:, f] = np.searchsorted(edges, X_fit[:, f], side="right")
+        valid[:, f] = np.searchsorted(edges, X_valid[:, f], side="right")
+    return fit, valid
+
+
+def search_data_stage(cache, prepared, prepared_key, imbalance, max_bin=MAX_BIN):
+    """Quantized fit/validation matrices carved from the training split."""
+    def compute():
+        from sklearn.model_selection import train_test_split
+
+        X_fit, X_valid, y_fit, y_valid = train_test_split(
+            prepared["X_train"], prepared["y_train"], test_size=VALID_SIZE,
+            random_state=RANDOM_STATE, stratify=prepared["y_train"]
+        )
+        if imbalance == "smote":
+            # Only the fit rows are oversampled; validation stays real
+            from imblearn.over_sampling import SMOTE
+            X_fit, y_fit = SMOTE(random_state=RANDOM_STATE).fit_resample(X_fit, y_fit)
+        fit, valid = quantize(X_fit, X_valid, max_bin)
+        return {"X_fit": fit, "y_fit": y_fit, "X_valid": valid, "y_valid": y_valid}
+
+    return cache.run(
+        "quantize",
+        {"prepare": prepared_key, "imbalance": imbalance, "max_bin": max_bin,
+         "valid_size": VALID_SIZE, "random_state": RANDOM_STATE},
+        compute=compute,
+        save=save_arrays,
+        load=lambda path: load_arrays(path, mmap_mode="r"),
+    )
+
+
+# --- worker processes ----------------------------------------------------------
+
+_worker = {}
+
+
+def _init_worker(data_path, max_bin, base_params):
+    import xgboost as xgb
+
+    arrays = load_arrays(data_path, mmap_mode="r")
+    train = xgb.QuantileDMatrix(arrays["X_fit"], arrays["y_fit"], max_bin=max_bin, nthread=1)
+    _worker["train"] = train
+    _worker["valid"] = xgb.QuantileDMatrix(arrays["X_valid"], arrays["y_valid"], ref=train, nthread=1)
+    _worker["params"] = base_params
+
+
+def _run_trial(trial, config, rounds, nthread):
+    import xgboost as xgb
+
+    started = time.perf_counter()
+    params = {**_worker["params"], **config, "nthread": nthread}
+    booster = xgb.train(
+        params, _worker["train"], num_boost_round=rounds,
+        evals=[(_worker["valid"], "valid")], early_stopping_rounds=EARLY_STOPPING_ROUNDS, verbose_eval=False,
+    )
+    return {
+        "trial": trial,
+        "auc": float(booster.best_score),
+        "best_rounds": int(booster.best_iteration) + 1,
+        "trained_rounds": int(booster.num_boosted_rounds()),
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def successive_halving(executor, configs, budgets, workers, eta=ETA):
+    """Runs the rungs; returns every trial's latest result, best first."""
+    cpus = os.cpu_count() or 1
+    latest = {}
+    survivors = list(range(len(configs)))
+    for rung, budget in enumerate(budgets):
+        # Trials that early-stopped below their previous budget have converged
+        pending = [t for t in survivors if t not in latest or latest[t]["trained_rounds"] >= latest[t]["budget"]]
+        for t in survivors:
+            if t not in pending:
+                latest[t].update(rung=rung, budget=budget)
+        # Fewer trials than workers late in the search: give each more threads
+        nthread = max(1, cpus // max(1, min(workers, len(pending))))
+        started = time.perf_counter()
+        futures = [executor.submit(_run_trial, t, configs[t], budget, nthread) for t in pending]
+        for future in as_completed(futures):
+            result = future.result()
+            latest[result["trial"]] = {**result, "rung": rung, "budget": budget}
+        ranked = sorted(survivors, key=lambda t: latest[t]["auc"], reverse=True)
+        best = latest[ranked[0]]
+        print(f"Rung {rung}: {len(pending)}/{len(survivors)} trials x {budget} rounds "
+              f"in {time.perf_counter() - started:.1f}s, best AUC {best['auc']:.4f} (trial {best['trial']})")
+        survivors = ranked[:max(1, len(survivors) // eta)]
+    return sorted(latest.values(), key=lambda r: (r["rung"], r["auc"]), reverse=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Hyperparameter search; exports the best model as a bundle.")
+    parser.add_argument("--data", default=DATA_PATH, help="Training CSV")
+    parser.add_argument("--out", default=RESULTS_DIR, help="Directory for the leaderboard (and bundle)")
+    parser.add_argument("--bundle", default=None, help="Winner bundle directory (default: <out>/bundle)")
+    parser.add_argument("--cache-dir", default=CACHE_DIR, help="Stage artifact cache")
+    parser.add_argument("--trials", type=int, default=81, help="Random configurations in the first rung")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes")
+    parser.add_argument("--min-rounds", type=int, default=MIN_ROUNDS, help="Boosting rounds in the first rung")
+    parser.add_argument("--max-rounds", type=int, default=MAX_ROUNDS, help="Boosting rounds cap for the last rung")
+    parser.add_argument("--eta", type=int, default=ETA, help="Halving rate: keep 1/eta per rung")
+    parser.add_argument("--imbalance", choices=["smote", "weight"], default="smote",
+                        help="Oversample the minority class with SMOTE, or weight it with scale_pos_weight")
+    parser.add_argument("--seed", type=int, default=RANDOM_STATE, help="Sampling seed")
+    parser.add_argument("--force", action="store_true", help="Recompute every stage, ignoring the cache")
+    args = parser.parse_args(argv)
+    if args.eta < 2:
+        parser.error("--eta must be at least 2")
+
+    cache = StageCache(args.cache_dir, force=args.force)
+    data_hash, prepared, prepared_key, fills = load_prepared(cache, args.data)
+    search_data, search_key = search_data_stage(cache, prepared, prepared_key, args.imbalance)
+
+    base_params = {
+        "objective": XGB_PARAMS["objective"],
+        "eval_metric": XGB_PARAMS["eval_metric"],
+        "tree_method": "hist",
+        "max_bin": MAX_BIN,
+        "seed": args.seed,
+    }
+    if args.imbalance == "weight":
+        base_params["scale_pos_weight"] = scale_pos_weight(search_data["y_fit"])
+
+    configs = sample_configs(args.trials, args.seed)
+    budgets = rung_budgets(args.min_rounds, args.max_rounds, args.eta)
+    print(f"Searching {len(configs)} configurations over rungs {budgets} with {args.workers} workers...")
+    with cache.timed("search"):
+        with ProcessPoolExecutor(
+            max_workers=args.workers,
+            initializer=_init_worker,
+            initargs=(os.path.join(cache.root, f"quantize-{search_key}"), MAX_BIN, base_params),
+        ) as executor:
+            results = successive_halving(executor, configs, budgets, args.workers, args.eta)
+
+    leaderboard = [{**r, "params": configs[r["trial"]]} for r in results]
+    winner = leaderboard[0]
+    os.makedirs(args.out, exist_ok=True)
+    with open(os.path.join(args.out, "leaderboard.json"), "w") as f:
+        json.dump({
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "training_data_hash": data_hash,
+            "imbalance": args.imbalance,
+            "budgets": budgets,
+            "seed": args.seed,
+            "trials": leaderboard,
+        }, f, indent=2)
+
+    print("Top trials (validation AUC at their last rung):")
+    for r in leaderboard[:10]:
+        params = ", ".join(f"{k}={v:.3g}" if isinstance(v, float) else f"{k}={v}" for k, v in r["params"].items())
+        print(f"  #{r['trial']:<4} rung {r['rung']}  AUC {r['auc']:.4f}  rounds {r['best_rounds']:<4} {params}")
+
+    # Refit the winner on the full training set, early-stopping on the test split like train_model.py
+    X_train, y_train, train_key, extra_params = training_set(cache, prepared, prepared_key, args.imbalance)
+    params = {**XGB_PARAMS, **winner["params"], **extra_params, "n_estimators": budgets[-1]}
+    print(f"Training winner (trial {winner['trial']})...")
+    model, _ = train_stage(cache, X_train, y_train, prepared["X_test"], prepared["y_test"], FEATURES,
+                           params, train_key)
+    evaluate_and_export(
+        cache, model, prepared, data_hash, args.bundle or os.path.join(args.out, "bundle"),
+        {"imbalance": args.imbalance,
+         "search": {"trial": winner["trial"], "validation_auc": winner["auc"], "trials": len(configs)}},
+        fills,
+    )
+
+    print("Stage timings:")
+    print(cache.report())
+
+
+if __name__ == "__main__":
+    main()
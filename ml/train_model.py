@@ -1,84 +1,129 @@
-import pandas as pd
-import numpy as np
-import xgboost as xgb
-import joblib
+import argparse
 import os
-from sklearn.model_selection import train_test_split
-from imblearn.over_sampling import SMOTE
+import sys
+
+from pipeline import StageCache, dataset_stage, fill_values, prepare_stage, smote_stage, train_stage, scale_pos_weight
+
+# The bundle exporter lives with the serving code so both sides share one format
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+from app.core.bundle import export_bundle, file_sha256
+from app.core.evaluation import evaluation_report
+from app.core.drift import reference_histograms
+from app.core.features import FEATURES as MODEL_FEATURES
 
 # Configuration
 DATA_PATH = r"c:/Users/parik/OneDrive/Desktop/barclays/ml/credit.xls"
-MODEL_PATH = r"c:/Users/parik/OneDrive/Desktop/barclays/backend/app/model/model.pkl"
-
-# Load Data
-print(f"Loading data from {DATA_PATH}...")
-try:
-    df = pd.read_csv(DATA_PATH)
-except Exception as e:
-    print(f"Error loading CSV: {e}")
-    # Try with different encoding or delimiter if needed, but assuming standard CSV based on inspection
-    exit(1)
-
-# Basic Preprocessing
-print("Preprocessing data...")
-# Drop Unnamed column if exists
-if 'Unnamed: 0' in df.columns:
-    df = df.drop(columns=['Unnamed: 0'])
-
-# Handle Missing Values
-# Fill MonthlyIncome with median
-df['MonthlyIncome'] = df['MonthlyIncome'].fillna(df['MonthlyIncome'].median())
-# Fill NumberOfDependents with mode (0)
-df['NumberOfDependents'] = df['NumberOfDependents'].fillna(0)
-
-# Feature Selection
-target = 'SeriousDlqin2yrs'
-features = [
-    'RevolvingUtilizationOfUnsecuredLines',
-    'age',
-    'NumberOfTime30-59DaysPastDueNotWorse',
-    'DebtRatio',
-    'MonthlyIncome',
-    'NumberOfOpenCreditLinesAndLoans',
-    'NumberOfTimes90DaysLate',
-    'NumberRealEstateLoansOrLines',
-    'NumberOfTime60-89DaysPastDueNotWorse',
-    'NumberOfDependents'
-]
-
-X = df[features]
-y = df[target]
-
-# Train/Test Split
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
-
-# Handle Imbalance with SMOTE
-print("Applying SMOTE...")
-smote = SMOTE(random_state=42)
-X_train_resampled, y_train_resampled = smote.fit_resample(X_train, y_train)
-
-# Train XGBoost Model
-print("Training XGBoost model...")
-model = xgb.XGBClassifier(
-    objective='binary:logistic',
-    n_estimators=100,
-    learning_rate=0.1,
-    max_depth=5,
-    random_state=42,
-    eval_metric='auc',
-    early_stopping_rounds=10
-)
-
-model.fit(
-    X_train_resampled, 
-    y_train_resampled, 
-    eval_set=[(X_test, y_test)], 
-    verbose=True
-)
-
-# Save Model
-print(f"Saving model to {MODEL_PATH}...")
-os.makedirs(os.path.dirname(MODEL_PATH), exist_ok=True)
-joblib.dump(model, MODEL_PATH)
-
-print("Model training complete!")
+BUNDLE_PATH = r"c:/Users/parik/OneDrive/Desktop/barclays/backend/app/model/bundle"
+# Stage artifacts (typed dataset, split, SMOTE output, fitted model), keyed by input hash
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache")
+
+TARGET = 'SeriousDlqin2yrs'
+# Model inputs, in order; defined once with the serving code
+FEATURES = list(MODEL_FEATURES)
+
+TEST_SIZE = 0.2
+RANDOM_STATE = 42
+
+XGB_PARAMS = {
+    "objective": "binary:logistic",
+    "n_estimators": 100,
+    "learning_rate": 0.1,
+    "max_depth": 5,
+    "tree_method": "hist",
+    "random_state": RANDOM_STATE,
+    "eval_metric": "auc",
+    "early_stopping_rounds": 10,
+}
+
+
+def load_prepared(cache, data_path):
+    """Typed dataset + filled, split arrays. Returns (data_hash, prepared, prepared_key, fills)."""
+    print(f"Loading data from {data_path}...")
+    with cache.timed("hash"):
+        data_hash = file_sha256(data_path)
+    dataset, dataset_key = dataset_stage(cache, data_path, data_hash)
+
+    print("Preprocessing data...")
+    prepared, prepared_key = prepare_stage(cache, dataset, dataset_key, FEATURES, TARGET,
+                                           test_size=TEST_SIZE, random_state=RANDOM_STATE)
+    return data_hash, prepared, prepared_key, fill_values(dataset)
+
+
+def training_set(cache, prepared, prepared_key, imbalance):
+    """Training rows for the chosen imbalance handling: (X, y, key, extra XGBoost params)."""
+    if imbalance == "smote":
+        print("Applying SMOTE...")
+        resampled, key = smote_stage(cache, prepared, prepared_key, random_state=RANDOM_STATE)
+        return resampled["X"], resampled["y"], key, {}
+    cache.skip("resample")
+    return (prepared["X_train"], prepared["y_train"], prepared_key,
+            {"scale_pos_weight": scale_pos_weight(prepared["y_train"])})
+
+
+def evaluate_and_export(cache, model, prepared, data_hash, bundle_path, training, fills=None):
+    """
+    Test-split evaluation report + bundle export. `training` goes in the
+    metadata, `fills` (missing-value replacements) in the schema.
+    """
+    X_test, y_test = prepared["X_test"], prepared["y_test"]
+
+    # Reference distribution for drift monitoring, from the real (pre-SMOTE) training rows
+    drift_reference = reference_histograms(prepared["X_train"], FEATURES)
+
+    # Evaluate on the held-out split (it is also the early-stopping set)
+    print("Evaluating on test split...")
+    with cache.timed("evaluate"):
+        report = evaluation_report(
+            y_test,
+            model.predict_proba(X_test)[:, 1],
+            dataset={"name": "test_split", "test_size": TEST_SIZE, "random_state": RANDOM_STATE,
+                     "training_data_hash": data_hash},
+        )
+    print(f"AUC {report['auc']:.4f}, precision {report['precision']:.4f}, recall {report['recall']:.4f}")
+
+    # Save Model Bundle (booster + memory-mappable tree arrays + schema + metadata + evaluation)
+    print(f"Saving model bundle to {bundle_path}...")
+    with cache.timed("export"):
+        metadata = export_bundle(
+            model,
+            bundle_path,
+            target=TARGET,
+            training_data_hash=data_hash,
+            metrics={"validation_auc": float(model.best_score)},
+            evaluation=report,
+            drift_reference=drift_reference,
+            fill_values=fills,
+            extra_metadata={"training": {**training, "stages": cache.summary()}},
+        )
+    print(f"Bundle version {metadata['model_version']} ({metadata['n_trees']} trees)")
+    return metadata
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the credit risk model and export a model bundle.")
+    parser.add_argument("--data", default=DATA_PATH, help="Training CSV")
+    parser.add_argument("--bundle", default=BUNDLE_PATH, help="Output bundle directory")
+    parser.add_argument("--cache-dir", default=CACHE_DIR, help="Stage artifact cache")
+    parser.add_argument("--nthread", type=int, default=None, help="XGBoost threads (default: all cores)")
+    parser.add_argument("--imbalance", choices=["smote", "weight"], default="smote",
+                        help="Oversample the minority class with SMOTE, or weight it with scale_pos_weight")
+    parser.add_argument("--force", action="store_true", help="Recompute every stage, ignoring the cache")
+    args = parser.parse_args(argv)
+
+    cache = StageCache(args.cache_dir, force=args.force)
+    data_hash, prepared, prepared_key, fills = load_prepared(cache, args.data)
+    X_train, y_train, train_key, extra_params = training_set(cache, prepared, prepared_key, args.imbalance)
+
+    print(f"Training XGBoost model ({args.imbalance})...")
+    model, _ = train_stage(cache, X_train, y_train, prepared["X_test"], prepared["y_test"], FEATURES,
+                           {**XGB_PARAMS, **extra_params}, train_key, nthread=args.nthread)
+
+    evaluate_and_export(cache, model, prepared, data_hash, args.bundle, {"imbalance": args.imbalance}, fills)
+
+    print("Stage timings:")
+    print(cache.report())
+    print("Model training complete!")
+
+
+if __name__ == "__main__":
+    main()